@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0003_alter_auditlog_user'),
+        ('core', '0010_organization_custom_background_color_and_more'),
+        ('customers', '0004_customer_dni'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['organization', 'created_at'], name='audit_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['organization', 'action', 'created_at'], name='audit_org_action_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['customer', 'created_at'], name='audit_customer_created_idx'),
+        ),
+    ]
@@ -43,6 +43,13 @@ class AuditLog(TenantAwareModel):
         verbose_name = "Log de Auditoría"
         verbose_name_plural = "Logs de Auditoría"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['organization', 'created_at'], name='audit_org_created_idx'),
+            # Reportes por tipo de acción (ej: WA_SENT, STAMP_ADD)
+            models.Index(fields=['organization', 'action', 'created_at'], name='audit_org_action_idx'),
+            # Actividad en el detalle del cliente
+            models.Index(fields=['customer', 'created_at'], name='audit_customer_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.organization.name} - {self.action} - {self.resource} ({self.created_at})"
@@ -1,11 +1,12 @@
 from .models import AuditLog
 
-def log_action(request, action, resource, description, customer=None):
+def build_audit_log(request, action, resource, description, customer=None):
     """
-    Registra una acción en el log de auditoría.
+    Construye (sin guardar) un registro de auditoría, para inserciones masivas
+    con AuditLog.objects.bulk_create. Retorna None si no hay tenant.
     """
     if not hasattr(request, 'tenant') or not request.tenant:
-        return
+        return None
 
     # Obtener IP
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -14,7 +15,7 @@ def log_action(request, action, resource, description, customer=None):
     else:
         ip = request.META.get('REMOTE_ADDR')
 
-    AuditLog.objects.create(
+    return AuditLog(
         organization=request.tenant,
         user=request.user if request.user.is_authenticated else None,
         customer=customer,
@@ -23,3 +24,11 @@ def log_action(request, action, resource, description, customer=None):
         description=description,
         ip_address=ip
     )
+
+def log_action(request, action, resource, description, customer=None):
+    """
+    Registra una acción en el log de auditoría.
+    """
+    entry = build_audit_log(request, action, resource, description, customer=customer)
+    if entry is not None:
+        entry.save()
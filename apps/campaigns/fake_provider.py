@@ -0,0 +1,74 @@
+"""
+API de WhatsApp falsa (estilo UltraMsg) para benchmarks y pruebas locales
+del despachador y del circuit breaker, sin salir de la máquina:
+
+    server, url = start_fake_provider(latency_ms=50, error_rate=0.3)
+    NotificationConfig(..., whatsapp_api_url=url, whatsapp_token='x')
+    ...
+    server.shutdown()
+
+Los parámetros se pueden cambiar en caliente (server.latency_ms = 15000
+simula un endpoint colgado, server.error_rate = 1 uno caído).
+"""
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive: permite medir la reutilización de conexiones
+    wbufsize = 64 * 1024  # Cabeceras y cuerpo en un solo envío (sin esperas de Nagle/ACK retrasado)
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            fail = server.random.random() < server.error_rate
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000)
+
+        status, body = (server.error_status, b'{"error": "fake provider error"}') if fail else (200, b'{"sent": "true"}')
+        with server.lock:
+            server.errors += int(fail)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeProvider(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0, error_rate=0, error_status=500, seed=1):
+        super().__init__(('127.0.0.1', 0), FakeProviderHandler)
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset_counters()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/messages/chat"
+
+    def reset_counters(self):
+        self.requests, self.errors, self.connections = 0, 0, set()
+
+    def shutdown(self):
+        super().shutdown()
+        self.server_close()
+
+
+def start_fake_provider(latency_ms=0, error_rate=0, error_status=500, seed=1):
+    """Levanta el servidor en un thread. Retorna (servidor, url)."""
+    server = FakeProvider(latency_ms=latency_ms, error_rate=error_rate, error_status=error_status, seed=seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.url
@@ -1,6 +1,7 @@
 
 from django import forms
 
+from apps.customers.stats import INACTIVE_DAYS
 from .models import MarketingCampaign, NotificationConfig
 
 class CampaignForm(forms.ModelForm):
@@ -13,7 +14,10 @@ class CampaignForm(forms.ModelForm):
             'channel': forms.Select(attrs={'class': 'form-select'}),
             'subject': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Solo para Email'}),
             'content': forms.Textarea(attrs={'class': 'form-control', 'rows': 4}),
-            'target_segment': forms.Select(choices=[('ALL', 'Todos los Clientes Activos')], attrs={'class': 'form-select'}),
+            'target_segment': forms.Select(choices=[
+                ('ALL', 'Todos los Clientes Activos'),
+                ('INACTIVE', f'Inactivos (más de {INACTIVE_DAYS} días sin venir)'),
+            ], attrs={'class': 'form-select'}),
             'scheduled_at': forms.DateTimeInput(attrs={'class': 'form-control', 'type': 'datetime-local'}),
         }
     
@@ -0,0 +1,194 @@
+"""
+Salud de los proveedores de envío (ProviderHealth) y circuit breaker.
+
+El despachador de la bandeja de salida registra cada lote por negocio y
+canal: latencias (histograma con los buckets de core.metrics), errores y
+timeouts. Tras NOTIFICATION_CIRCUIT_THRESHOLD fallos consecutivos (o con una
+tasa de error reciente >= NOTIFICATION_CIRCUIT_ERROR_RATE) el circuito se
+abre: durante NOTIFICATION_CIRCUIT_COOLDOWN segundos los
+mensajes de ese negocio y canal se difieren sin intentar el envío, así un
+endpoint colgado no consume threads ni timeouts. Al vencer, un único envío
+de prueba (semiabierto, reclamado con un UPDATE condicionado para que lo
+haga un solo worker) decide si se cierra o vuelve a abrirse.
+"""
+import logging
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import models, transaction
+
+from apps.core.metrics import LATENCY_BUCKETS_MS, bucket_index, histogram_percentile, merge_histograms
+from .models import ProviderHealth
+
+logger = logging.getLogger(__name__)
+
+# Envíos mínimos en la ventana para abrir el circuito por tasa de error
+CIRCUIT_MIN_VOLUME = 20
+
+
+def load_health(keys):
+    """Filas de salud existentes para las llaves (negocio, canal), en una consulta"""
+    keys = set(keys)
+    if not keys:
+        return {}
+    rows = ProviderHealth.objects.filter(
+        organization_id__in={org for org, _ in keys}, channel__in={channel for _, channel in keys}
+    )
+    return {(row.organization_id, row.channel): row for row in rows if (row.organization_id, row.channel) in keys}
+
+
+def _start_probe(row, now):
+    """
+    Pasa el circuito a semiabierto si el cooldown venció (o si una prueba
+    anterior quedó colgada más que el lease). True si este worker la ganó.
+    """
+    stale = now - timedelta(seconds=settings.NOTIFICATION_CLAIM_LEASE)
+    won = ProviderHealth.objects.filter(pk=row.pk).filter(
+        models.Q(state='OPEN', opened_until__lte=now) | models.Q(state='HALF_OPEN', opened_until__lte=stale)
+    ).update(state='HALF_OPEN', opened_until=now)
+    if won:
+        row.state, row.opened_until = 'HALF_OPEN', now
+    return bool(won)
+
+
+def gate(messages, health, now):
+    """
+    Aplica el circuito a los mensajes reclamados. Retorna (permitidos,
+    {(negocio, canal): (espera, [mensajes])}) con los que deben esperar.
+    """
+    allowed, deferred, probing = [], {}, set()
+    for message in messages:
+        key = (message.organization_id, message.channel)
+        row = health.get(key)
+        if row is None or row.state == 'CLOSED':
+            allowed.append(message)
+            continue
+        if row.state == 'OPEN' and row.opened_until and row.opened_until > now:
+            wait = (row.opened_until - now).total_seconds()
+        elif key not in probing and _start_probe(row, now):
+            # Un solo envío de prueba
+            probing.add(key)
+            allowed.append(message)
+            continue
+        else:
+            wait = settings.NOTIFICATION_CIRCUIT_PROBE_WAIT
+        deferred.setdefault(key, (wait, []))[1].append(message)
+    return allowed, deferred
+
+
+def _endpoint(channel, config):
+    if channel == 'WHATSAPP':
+        return (config.whatsapp_api_url if config else '')[:500]
+    return f"smtp://{settings.EMAIL_HOST}:{settings.EMAIL_PORT}"
+
+
+def record_health(outcomes, configs, now):
+    """
+    Acumula los resultados de un lote en ProviderHealth y mueve el circuito.
+    `outcomes` son tuplas (mensaje, error, permanente, ms); los errores
+    permanentes (canal sin configurar) no son culpa del proveedor.
+    """
+    grouped = {}
+    for outcome in outcomes:
+        message, _, permanent, _ = outcome
+        if not permanent:
+            grouped.setdefault((message.organization_id, message.channel), []).append(outcome)
+    if not grouped:
+        return
+
+    with transaction.atomic():
+        # Crear las filas que falten y bloquearlas (varios workers pueden registrar a la vez)
+        ProviderHealth.objects.bulk_create(
+            [ProviderHealth(organization_id=org, channel=channel, window_started_at=now) for org, channel in grouped],
+            ignore_conflicts=True,
+        )
+        rows = {
+            (row.organization_id, row.channel): row
+            for row in ProviderHealth.objects.select_for_update().filter(
+                organization_id__in={org for org, _ in grouped}, channel__in={channel for _, channel in grouped}
+            )
+        }
+
+        window = timedelta(seconds=settings.NOTIFICATION_HEALTH_WINDOW)
+        for key, items in grouped.items():
+            row = rows[key]
+            row.endpoint = _endpoint(key[1], configs.get(key[0]))
+            if now - row.window_started_at > window:
+                row.window_started_at, row.window_successes, row.window_failures = now, 0, 0
+
+            histogram = [0] * len(LATENCY_BUCKETS_MS)
+            succeeded = tripped = False
+            for _, error, _, ms in items:
+                histogram[bucket_index(ms)] += 1
+                row.total_ms += ms
+                row.max_ms = max(row.max_ms, ms)
+                if error is None:
+                    succeeded = True
+                    row.successes += 1
+                    row.window_successes += 1
+                    row.consecutive_failures = 0
+                    row.last_success_at = now
+                else:
+                    row.failures += 1
+                    row.window_failures += 1
+                    row.consecutive_failures += 1
+                    tripped = tripped or row.consecutive_failures >= settings.NOTIFICATION_CIRCUIT_THRESHOLD
+                    row.last_failure_at = now
+                    row.last_error = str(error)[:1000]
+                    if isinstance(error, requests.Timeout):
+                        row.timeouts += 1
+            row.latency_histogram = merge_histograms(row.latency_histogram, histogram)
+
+            window_total = row.window_successes + row.window_failures
+            if window_total >= CIRCUIT_MIN_VOLUME and row.error_rate >= settings.NOTIFICATION_CIRCUIT_ERROR_RATE:
+                tripped = True
+
+            if row.state == 'HALF_OPEN':
+                if succeeded:
+                    # Ventana nueva: los errores previos a la apertura no cuentan
+                    logger.info(f"Circuito {key[1]} del negocio {key[0]} cerrado")
+                    row.state, row.opened_until = 'CLOSED', None
+                    row.window_started_at, row.window_successes, row.window_failures = now, 1, 0
+                else:
+                    _open(row, now)  # Falló el envío de prueba
+            elif row.state == 'CLOSED' and tripped:
+                _open(row, now)
+            row.save()
+
+
+def _open(row, now):
+    row.state = 'OPEN'
+    row.opened_until = now + timedelta(seconds=settings.NOTIFICATION_CIRCUIT_COOLDOWN)
+    row.trips += 1
+    logger.warning(
+        f"Circuito {row.channel} del negocio {row.organization_id} abierto "
+        f"({row.consecutive_failures} fallos consecutivos, tasa de error {row.error_rate:.0%}): {row.last_error}"
+    )
+
+
+def summarize_health(row):
+    """Métricas derivadas de una fila para el monitor del superadmin"""
+    sent = row.successes + row.failures
+    return {
+        'row': row,
+        'avg_ms': row.total_ms / sent if sent else None,
+        'p50': histogram_percentile(row.latency_histogram, 50),
+        'p95': histogram_percentile(row.latency_histogram, 95),
+        'error_rate': row.error_rate,
+        'window_total': row.window_successes + row.window_failures,
+    }
+
+
+def is_unhealthy(summary):
+    """Circuito no cerrado, tasa de error reciente alta o p95 lento"""
+    row = summary['row']
+    if row.state != 'CLOSED':
+        return True
+    if summary['window_total'] >= 5 and summary['error_rate'] >= settings.NOTIFICATION_HEALTH_ERROR_RATE:
+        return True
+    # p95 None = cae en el último bucket (sin límite superior)
+    p95 = summary['p95']
+    return bool(row.latency_histogram) and sum(row.latency_histogram) > 0 and (
+        p95 is None or p95 >= settings.NOTIFICATION_HEALTH_SLOW_MS
+    )
@@ -0,0 +1,137 @@
+import time
+
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+
+from apps.campaigns.fake_provider import start_fake_provider
+from apps.campaigns.models import NotificationConfig, NotificationOutbox
+from apps.campaigns.outbox import build_notification, dispatch_due, enqueue_notifications
+from apps.core.benchmarks import environment, rollback, write_results
+from apps.core.cache import invalidate_context
+from apps.core.models import Organization
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide mensajes por segundo del despachador de notificaciones contra una API de WhatsApp local '
+        '(campaigns.fake_provider) y el backend de correo en memoria. Todo se revierte al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto el de más clientes)')
+        parser.add_argument('--messages', type=int, default=400, help='Mensajes por ejecución')
+        parser.add_argument('--email-ratio', type=float, default=0.2, help='Fracción de mensajes por correo')
+        parser.add_argument('--workers', default='1,8', help='Threads a comparar, separados por coma')
+        parser.add_argument('--latency-ms', type=int, default=20, help='Latencia simulada del proveedor')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fracción de respuestas 500 del proveedor')
+        parser.add_argument('--timeout', type=float, help='Timeout HTTP (por defecto NOTIFICATION_HTTP_TIMEOUT)')
+        parser.add_argument('--rate', type=float, default=0, help='Límite por negocio y canal (0 = sin límite)')
+        parser.add_argument('--cooldown', type=int, default=1, help='Segundos de circuito abierto durante la medición')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--output', default='benchmark_notifications.json', help='Archivo JSON de resultados')
+
+    def handle(self, *args, **options):
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+        else:
+            organization = Organization.objects.annotate(n=Count('customer')).order_by('-n').first()
+        if organization is None:
+            raise CommandError('No hay negocios: ejecuta antes generate_load_data.')
+
+        server, api_url = start_fake_provider(latency_ms=options['latency_ms'], error_rate=options['error_rate'])
+
+        results = []
+        try:
+            for workers in [int(w) for w in options['workers'].split(',') if w.strip()]:
+                results.append(self.run(organization, server, workers, options))
+        finally:
+            server.shutdown()
+            # La configuración falsa se revirtió: que nadie la lea de la caché
+            invalidate_context('notifications', organization.pk)
+
+        write_results(options['output'], {
+            'benchmark': 'notifications',
+            'environment': environment(),
+            'organization': {'id': organization.pk, 'slug': organization.slug},
+            'latency_ms': options['latency_ms'],
+            'error_rate': options['error_rate'],
+            'results': results,
+        })
+        self.stdout.write(self.style.SUCCESS(f"Resultados en {options['output']}"))
+
+    def run(self, organization, server, workers, options):
+        total = options['messages']
+        emails = int(total * options['email_ratio'])
+        server.reset_counters()
+        mail.outbox = []
+        overrides = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+            'NOTIFICATION_RATE_LIMIT': options['rate'],
+            'NOTIFICATION_CIRCUIT_COOLDOWN': options['cooldown'],
+        }
+        if options['timeout']:
+            overrides['NOTIFICATION_HTTP_TIMEOUT'] = options['timeout']
+
+        with rollback(), override_settings(**overrides):
+            NotificationConfig.objects.update_or_create(
+                organization=organization,
+                defaults={'whatsapp_api_url': server.url, 'whatsapp_token': 'benchmark', 'email_enabled': True},
+            )
+            # Los mensajes reales del negocio no participan (y se restauran al revertir)
+            NotificationOutbox.objects.filter(organization=organization, status='PENDING').update(status='CANCELLED')
+            enqueue_notifications([
+                build_notification(
+                    organization.pk, 'EMAIL' if i < emails else 'WHATSAPP',
+                    f'cliente{i}@example.com' if i < emails else f'51900{i:06d}',
+                    f'Mensaje de prueba {i}', subject='Benchmark', kind='benchmark',
+                )
+                for i in range(total)
+            ])
+
+            latencies = []
+            counts = {'sent': 0, 'retry': 0, 'failed': 0, 'cancelled': 0, 'deferred': 0, 'circuit_open': 0}
+            start = time.perf_counter()
+            while True:
+                batch = dispatch_due(options['batch_size'], workers=workers, organization=organization)
+                if not batch['claimed']:
+                    # Diferidos por el límite o el circuito (nunca intentados): esperar a que venzan.
+                    # Los fallidos quedan para su reintento y no se esperan.
+                    if not NotificationOutbox.objects.filter(
+                        organization=organization, kind='benchmark', status='PENDING', attempts=0
+                    ).exists():
+                        break
+                    time.sleep(0.05)
+                    continue
+                for key in counts:
+                    counts[key] += batch[key]
+                latencies.extend(r['ms'] for r in batch['results'] if r['channel'] == 'WHATSAPP')
+            elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        result = {
+            'name': f'dispatch_workers_{workers}',
+            'workers': workers,
+            'messages': total,
+            'whatsapp': total - emails,
+            'emails': emails,
+            'wall_s': round(elapsed, 3),
+            'messages_per_s': round(counts['sent'] / elapsed, 1) if elapsed else None,
+            'whatsapp_ms': {
+                'median': round(latencies[len(latencies) // 2], 2) if latencies else None,
+                'p95': round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+            },
+            'http_requests': server.requests,
+            'http_errors': server.errors,
+            'http_connections': len(server.connections),
+            'emails_delivered': len(mail.outbox),
+            **counts,
+        }
+        self.stdout.write(
+            f"{workers} threads: {result['sent']} enviados en {result['wall_s']} s ({result['messages_per_s']}/s); "
+            f"{result['http_requests']} requests HTTP en {result['http_connections']} conexiones, "
+            f"{result['emails_delivered']} correos, fallidos {result['failed'] + result['retry']}, "
+            f"diferidos por circuito abierto {result['circuit_open']}"
+        )
+        return result
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.campaigns.outbox import dispatch_due, purge_sent
+
+
+class Command(BaseCommand):
+    help = (
+        'Envía las notificaciones pendientes de la bandeja de salida (WhatsApp/Email), con reintentos. '
+        'Ejecutar por cron cada minuto o como proceso permanente con --loop.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Mensajes reclamados por lote')
+        parser.add_argument('--workers', type=int, help='Envíos en paralelo (por defecto NOTIFICATION_WORKERS)')
+        parser.add_argument('--organization', type=int, help='Solo los mensajes de este negocio (ID)')
+        parser.add_argument('--loop', action='store_true', help='No terminar: seguir despachando')
+        parser.add_argument('--interval', type=float, default=5, help='Segundos de espera con la cola vacía (--loop)')
+        parser.add_argument(
+            '--purge-days', type=int, default=90,
+            help='Borra enviados/cancelados más antiguos (0 = no borrar). Es también la ventana de deduplicación.'
+        )
+
+    def handle(self, *args, **options):
+        if options['purge_days']:
+            purged = purge_sent(options['purge_days'])
+            if purged:
+                self.stdout.write(f'Mensajes antiguos borrados: {purged}')
+
+        totals = {'sent': 0, 'retry': 0, 'failed': 0, 'cancelled': 0, 'deferred': 0, 'circuit_open': 0}
+        try:
+            while True:
+                counts = dispatch_due(options['batch_size'], workers=options['workers'], organization=options['organization'])
+                for key in totals:
+                    totals[key] += counts[key]
+                # Lote lleno y no todo frenado (límite o circuito): quedan más en la cola
+                if counts['claimed'] >= options['batch_size'] and counts['deferred'] < counts['claimed']:
+                    continue
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Enviados: {totals['sent']}, reintento: {totals['retry']}, fallidos: {totals['failed']}, "
+            f"cancelados: {totals['cancelled']}, diferidos: {totals['deferred']} (circuito abierto: {totals['circuit_open']})"
+        ))
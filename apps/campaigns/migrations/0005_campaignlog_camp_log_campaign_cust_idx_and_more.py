@@ -0,0 +1,23 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0004_campaigntemplate'),
+        ('core', '0010_organization_custom_background_color_and_more'),
+        ('customers', '0004_customer_dni'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaignlog',
+            index=models.Index(fields=['campaign', 'customer'], name='camp_log_campaign_cust_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignlog',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['campaign'], name='camp_log_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:33
+
+import apps.core.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0005_campaignlog_camp_log_campaign_cust_idx_and_more'),
+        ('core', '0011_requestmetric'),
+        ('customers', '0005_customer_cust_org_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('WHATSAPP', 'WhatsApp'), ('EMAIL', 'Email')], max_length=10, verbose_name='Canal')),
+                ('kind', models.CharField(blank=True, max_length=30, verbose_name='Tipo')),
+                ('recipient', models.CharField(max_length=254, verbose_name='Destinatario')),
+                ('subject', models.CharField(blank=True, max_length=200, verbose_name='Asunto (Email)')),
+                ('body', models.TextField(verbose_name='Mensaje')),
+                ('dedupe_key', models.CharField(blank=True, max_length=191, null=True, unique=True, verbose_name='Llave de deduplicación')),
+                ('status', models.CharField(choices=[('PENDING', 'Pendiente'), ('SENT', 'Enviado'), ('FAILED', 'Fallido'), ('CANCELLED', 'Cancelado')], default='PENDING', max_length=10, verbose_name='Estado')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Próximo intento')),
+                ('claim_token', models.CharField(blank=True, max_length=32)),
+                ('last_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Enviado el')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='customers.customer', verbose_name='Cliente')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.organization', verbose_name='Organización')),
+            ],
+            options={
+                'verbose_name': 'Notificación en Cola',
+                'verbose_name_plural': 'Bandeja de Salida',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='camp_outbox_due_idx'), models.Index(fields=['claim_token'], name='camp_outbox_claim_idx')],
+            },
+            bases=(apps.core.models.FieldTrackerMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:38
+
+import apps.core.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0006_notificationoutbox'),
+        ('core', '0011_requestmetric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderHealth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('WHATSAPP', 'WhatsApp'), ('EMAIL', 'Email')], max_length=10, verbose_name='Canal')),
+                ('endpoint', models.CharField(blank=True, max_length=500, verbose_name='Endpoint')),
+                ('state', models.CharField(choices=[('CLOSED', 'Cerrado'), ('OPEN', 'Abierto'), ('HALF_OPEN', 'Semiabierto')], default='CLOSED', max_length=10, verbose_name='Estado')),
+                ('consecutive_failures', models.PositiveIntegerField(default=0, verbose_name='Fallos consecutivos')),
+                ('opened_until', models.DateTimeField(blank=True, null=True, verbose_name='Abierto hasta')),
+                ('trips', models.PositiveIntegerField(default=0, verbose_name='Aperturas')),
+                ('successes', models.PositiveIntegerField(default=0, verbose_name='Envíos correctos')),
+                ('failures', models.PositiveIntegerField(default=0, verbose_name='Envíos fallidos')),
+                ('timeouts', models.PositiveIntegerField(default=0, verbose_name='Timeouts')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Tiempo total (ms)')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Tiempo máximo (ms)')),
+                ('latency_histogram', models.JSONField(default=list, verbose_name='Histograma de latencia')),
+                ('window_started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('window_successes', models.PositiveIntegerField(default=0)),
+                ('window_failures', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, verbose_name='Último error')),
+                ('last_failure_at', models.DateTimeField(blank=True, null=True, verbose_name='Último fallo')),
+                ('last_success_at', models.DateTimeField(blank=True, null=True, verbose_name='Último envío correcto')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.organization', verbose_name='Organización')),
+            ],
+            options={
+                'verbose_name': 'Salud de Proveedor',
+                'verbose_name_plural': 'Salud de Proveedores',
+            },
+            bases=(apps.core.models.FieldTrackerMixin, models.Model),
+        ),
+        migrations.AddConstraint(
+            model_name='providerhealth',
+            constraint=models.UniqueConstraint(fields=('organization', 'channel'), name='camp_provider_health_unique'),
+        ),
+    ]
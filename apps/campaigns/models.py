@@ -1,5 +1,6 @@
 
 from django.db import models
+from django.utils import timezone
 from apps.core.models import TenantAwareModel
 from apps.customers.models import Customer
 from django.contrib.auth import get_user_model
@@ -60,6 +61,15 @@ class CampaignLog(TenantAwareModel):
     class Meta:
         verbose_name = "Log de Envío"
         verbose_name_plural = "Logs de Envíos"
+        indexes = [
+            # Clientes ya incluidos en una campaña
+            models.Index(fields=['campaign', 'customer'], name='camp_log_campaign_cust_idx'),
+            # Envíos pendientes (índice parcial; MySQL lo omite)
+            models.Index(
+                fields=['campaign'], name='camp_log_pending_idx',
+                condition=models.Q(status='PENDING')
+            ),
+        ]
 
 class CampaignTemplate(TenantAwareModel):
     """
@@ -113,3 +123,108 @@ class NotificationConfig(TenantAwareModel):
 
     def __str__(self):
         return f"Configuración: {self.organization.name}"
+
+
+class NotificationOutbox(TenantAwareModel):
+    """
+    Bandeja de salida de notificaciones automáticas (WhatsApp/Email).
+    Se escribe en la misma transacción que el evento que la origina y la
+    despacha después `manage.py dispatch_notifications`, con reintentos.
+    `dedupe_key` (única) evita enviar dos veces el mismo aviso.
+    """
+    CHANNEL_CHOICES = (
+        ('WHATSAPP', 'WhatsApp'),
+        ('EMAIL', 'Email'),
+    )
+    STATUS_CHOICES = (
+        ('PENDING', 'Pendiente'),
+        ('SENT', 'Enviado'),
+        ('FAILED', 'Fallido'),
+        ('CANCELLED', 'Cancelado'),
+    )
+
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, verbose_name="Canal")
+    kind = models.CharField(max_length=30, blank=True, verbose_name="Tipo")  # stamp_completed, birthday, ...
+    customer = models.ForeignKey(Customer, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications', verbose_name="Cliente")
+    recipient = models.CharField(max_length=254, verbose_name="Destinatario")
+    subject = models.CharField(max_length=200, blank=True, verbose_name="Asunto (Email)")
+    body = models.TextField(verbose_name="Mensaje")
+    # 191 caracteres: límite de índice único en MySQL con utf8mb4. NULL = sin deduplicar.
+    dedupe_key = models.CharField(max_length=191, unique=True, null=True, blank=True, verbose_name="Llave de deduplicación")
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING', verbose_name="Estado")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Intentos")
+    # También funciona como lease: al reclamar un mensaje se corre hacia adelante
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Próximo intento")
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True, verbose_name="Último error")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Enviado el")
+
+    class Meta:
+        verbose_name = "Notificación en Cola"
+        verbose_name_plural = "Bandeja de Salida"
+        indexes = [
+            # Mensajes vencidos para el worker (todos los negocios)
+            models.Index(fields=['status', 'next_attempt_at'], name='camp_outbox_due_idx'),
+            models.Index(fields=['claim_token'], name='camp_outbox_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} a {self.recipient} ({self.status})"
+
+
+class ProviderHealth(TenantAwareModel):
+    """
+    Salud del proveedor de envío de un negocio por canal (API de WhatsApp o
+    SMTP): contadores, histograma de latencia y estado del circuit breaker.
+    La actualiza el despachador de la bandeja de salida (campaigns.health).
+    """
+    STATE_CHOICES = (
+        ('CLOSED', 'Cerrado'),
+        ('OPEN', 'Abierto'),
+        ('HALF_OPEN', 'Semiabierto'),
+    )
+
+    channel = models.CharField(max_length=10, choices=NotificationOutbox.CHANNEL_CHOICES, verbose_name="Canal")
+    endpoint = models.CharField(max_length=500, blank=True, verbose_name="Endpoint")
+
+    # Circuit breaker: abierto = los envíos se difieren sin intentar hasta opened_until
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='CLOSED', verbose_name="Estado")
+    consecutive_failures = models.PositiveIntegerField(default=0, verbose_name="Fallos consecutivos")
+    opened_until = models.DateTimeField(null=True, blank=True, verbose_name="Abierto hasta")
+    trips = models.PositiveIntegerField(default=0, verbose_name="Aperturas")
+
+    # Acumulado desde que existe la fila
+    successes = models.PositiveIntegerField(default=0, verbose_name="Envíos correctos")
+    failures = models.PositiveIntegerField(default=0, verbose_name="Envíos fallidos")
+    timeouts = models.PositiveIntegerField(default=0, verbose_name="Timeouts")
+    total_ms = models.FloatField(default=0, verbose_name="Tiempo total (ms)")
+    max_ms = models.FloatField(default=0, verbose_name="Tiempo máximo (ms)")
+    latency_histogram = models.JSONField(default=list, verbose_name="Histograma de latencia")
+
+    # Ventana reciente (NOTIFICATION_HEALTH_WINDOW) para la tasa de error
+    window_started_at = models.DateTimeField(default=timezone.now)
+    window_successes = models.PositiveIntegerField(default=0)
+    window_failures = models.PositiveIntegerField(default=0)
+
+    last_error = models.TextField(blank=True, verbose_name="Último error")
+    last_failure_at = models.DateTimeField(null=True, blank=True, verbose_name="Último fallo")
+    last_success_at = models.DateTimeField(null=True, blank=True, verbose_name="Último envío correcto")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Salud de Proveedor"
+        verbose_name_plural = "Salud de Proveedores"
+        constraints = [
+            models.UniqueConstraint(fields=['organization', 'channel'], name='camp_provider_health_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} de {self.organization_id} ({self.state})"
+
+    @property
+    def error_rate(self):
+        """Tasa de error de la ventana reciente (None sin envíos)"""
+        total = self.window_successes + self.window_failures
+        return self.window_failures / total if total else None
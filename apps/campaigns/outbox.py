@@ -0,0 +1,336 @@
+"""
+Bandeja de salida de notificaciones automáticas (NotificationOutbox).
+
+Los servicios encolan los mensajes con `enqueue_notifications` dentro de su
+propia transacción: si la transacción se revierte, el mensaje desaparece con
+ella, y ningún request espera a la API de WhatsApp o al SMTP. El worker
+(`manage.py dispatch_notifications`) los envía después:
+
+- Reclama un lote corriendo `next_attempt_at` (lease) con un token propio,
+  así varios workers no envían el mismo mensaje y uno caído no lo bloquea.
+  Los resultados se guardan solo si el mensaje sigue con ese token, y no se
+  empiezan envíos pasada la mitad del lease (los que faltan vuelven a la
+  cola): un lote lento no se cruza con el worker que lo reclame después.
+- Si el envío falla reintenta con backoff exponencial hasta
+  NOTIFICATION_MAX_ATTEMPTS; luego queda FAILED con el último error.
+- `dedupe_key` es única: encolar dos veces el mismo aviso (ej: tarjeta
+  completada) es un no-op (INSERT ... ON CONFLICT DO NOTHING / INSERT IGNORE).
+  La deduplicación dura lo que se conserven los mensajes (`--purge-days`).
+
+Cada lote se envía en paralelo (NOTIFICATION_WORKERS threads) sobre una
+sesión HTTP por proveedor y una sola conexión SMTP. Un token bucket por
+negocio y canal limita el ritmo: lo que excede el límite vuelve a la cola
+para más tarde en lugar de ocupar un thread esperando. Los threads solo
+hacen red; los resultados se guardan desde el thread principal.
+
+Antes de enviar, el circuit breaker de cada negocio y canal (campaigns.health)
+difiere sin intentar los mensajes de proveedores caídos.
+"""
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import models
+from django.utils import timezone
+
+from apps.core.cache import get_context_data
+from .health import gate, load_health, record_health
+from .models import NotificationConfig, NotificationOutbox
+from .utils import NotificationNotConfigured, deliver_email, deliver_whatsapp
+
+logger = logging.getLogger(__name__)
+
+CONFIG_SCOPE = 'notifications'
+
+
+def get_notification_config(organization_id):
+    """NotificationConfig del negocio (o None), cacheada por versión del scope 'notifications'"""
+    return get_context_data(
+        CONFIG_SCOPE, organization_id,
+        lambda: NotificationConfig.objects.filter(organization_id=organization_id).first()
+    )
+
+
+def build_notification(organization_id, channel, recipient, body, subject='', kind='', dedupe_key=None, customer=None):
+    """Construye (sin guardar) un mensaje de la bandeja de salida"""
+    return NotificationOutbox(
+        organization_id=organization_id,
+        channel=channel,
+        kind=kind,
+        customer=customer,
+        recipient=recipient,
+        subject=subject[:200],
+        body=body,
+        dedupe_key=dedupe_key,
+    )
+
+
+def enqueue_notifications(messages):
+    """
+    Inserta los mensajes en un solo INSERT. Los que repiten una dedupe_key
+    existente se descartan. Debe llamarse dentro de la transacción del evento.
+    """
+    messages = [m for m in messages if m is not None and m.recipient]
+    if messages:
+        NotificationOutbox.objects.bulk_create(messages, ignore_conflicts=True)
+    return len(messages)
+
+
+def retry_delay(attempts):
+    """Espera antes del siguiente intento: base * 2^(intentos-1), con tope"""
+    base = settings.NOTIFICATION_RETRY_BASE
+    return timedelta(seconds=min(base * 2 ** max(attempts - 1, 0), settings.NOTIFICATION_RETRY_MAX))
+
+
+def claim_due(batch_size=100, now=None, organization=None):
+    """
+    Reclama hasta `batch_size` mensajes vencidos. El UPDATE condicionado por
+    status/next_attempt_at hace que cada mensaje lo gane un solo worker; el
+    lease (NOTIFICATION_CLAIM_LEASE) lo libera si el worker muere a mitad.
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    # Se leen los IDs primero: MySQL no permite LIMIT en un UPDATE con subconsulta de la misma tabla
+    due = NotificationOutbox.objects.filter(status='PENDING', next_attempt_at__lte=now)
+    if organization is not None:
+        due = due.filter(organization=organization)
+    ids = list(due.order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size])
+    if not ids:
+        return []
+    NotificationOutbox.objects.filter(pk__in=ids, status='PENDING', next_attempt_at__lte=now).update(
+        claim_token=token,
+        next_attempt_at=now + timedelta(seconds=settings.NOTIFICATION_CLAIM_LEASE),
+        attempts=models.F('attempts') + 1,
+    )
+    return list(NotificationOutbox.objects.filter(claim_token=token, status='PENDING').order_by('pk'))
+
+
+class TokenBucket:
+    """Token bucket: `rate` mensajes por segundo con ráfagas de hasta `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Consume un token. Retorna 0 si había, o los segundos hasta el próximo."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+_buckets = {}
+
+
+def get_bucket(organization_id, channel):
+    """Bucket del negocio y canal (None si NOTIFICATION_RATE_LIMIT es 0)"""
+    rate, burst = settings.NOTIFICATION_RATE_LIMIT, settings.NOTIFICATION_RATE_BURST
+    if not rate:
+        return None
+    bucket = _buckets.get((organization_id, channel))
+    if bucket is None or (bucket.rate, bucket.burst) != (rate, max(burst, 1)):
+        bucket = _buckets[(organization_id, channel)] = TokenBucket(rate, burst)
+    return bucket
+
+
+def _throttle(messages):
+    """
+    Separa los mensajes que caben en el límite de su negocio y canal de los
+    que deben esperar. Retorna (listos, {(negocio, canal): (espera, [mensajes])}).
+    """
+    ready, deferred = [], {}
+    for message in messages:
+        key = (message.organization_id, message.channel)
+        if key in deferred:
+            deferred[key][1].append(message)
+            continue
+        bucket = get_bucket(*key)
+        wait = bucket.take() if bucket else 0
+        if wait:
+            deferred[key] = (wait, [message])
+        else:
+            ready.append(message)
+    return ready, deferred
+
+
+def _release(deferred, now, token):
+    """Devuelve a la cola los mensajes que no se intentaron (límite, circuito o lease), sin contar el intento"""
+    for wait, messages in deferred.values():
+        NotificationOutbox.objects.filter(pk__in=[m.pk for m in messages], claim_token=token).update(
+            claim_token='',
+            next_attempt_at=now + timedelta(seconds=wait),
+            attempts=models.F('attempts') - 1,
+        )
+
+
+def deliver(message, config, connection=None):
+    """Envía un mensaje por su canal. Lanza excepción si falla."""
+    if config is None:
+        raise NotificationNotConfigured("El negocio no tiene configuración de notificaciones")
+    if message.channel == 'WHATSAPP':
+        deliver_whatsapp(config, message.recipient, message.body)
+    else:
+        deliver_email(config, message.recipient, message.subject, message.body, connection=connection)
+
+
+def _attempt(message, config, connection=None, deadline=None):
+    """
+    Un envío. Retorna (mensaje, error, permanente, ms), o None sin intentarlo
+    si ya pasó `deadline` (time.monotonic()); nunca lanza.
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        return None
+    start = time.perf_counter()
+    error, permanent = None, False
+    try:
+        deliver(message, config, connection=connection)
+    except NotificationNotConfigured as exc:
+        error, permanent = exc, True
+    except Exception as exc:
+        error = exc
+    return message, error, permanent, (time.perf_counter() - start) * 1000
+
+
+def _send_emails(messages, configs, deadline=None):
+    """Envía los correos del lote por una sola conexión SMTP (no es thread-safe: van en serie)"""
+    connection = get_connection(fail_silently=False, timeout=settings.NOTIFICATION_SMTP_TIMEOUT)
+    try:
+        connection.open()
+    except Exception as exc:
+        return [(message, exc, False, 0) for message in messages]
+    try:
+        return [_attempt(message, configs[message.organization_id], connection, deadline) for message in messages]
+    finally:
+        connection.close()
+
+
+def _record(outcomes, now, token):
+    """
+    Guarda el resultado de los intentos: los enviados en un solo UPDATE, los
+    fallidos uno a uno (cada uno con su próximo intento). Solo se escriben los
+    mensajes que siguen reclamados con `token`; retorna los IDs cuyo lease
+    venció y ya reclamó otro worker.
+    """
+    lost = []
+    sent = [message.pk for message, error, _, _ in outcomes if error is None]
+    if sent:
+        mine = NotificationOutbox.objects.filter(pk__in=sent, claim_token=token)
+        if mine.count() != len(sent):
+            lost.extend(set(sent) - set(mine.values_list('pk', flat=True)))
+        mine.update(status='SENT', sent_at=now, last_error='', claim_token='')
+    for message, error, permanent, _ in outcomes:
+        if error is None:
+            message.status = 'SENT'
+            continue
+        message.last_error = str(error)[:1000]
+        if permanent:
+            message.status = 'CANCELLED'
+        elif message.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            message.status = 'FAILED'
+        else:
+            message.next_attempt_at = now + retry_delay(message.attempts)
+        message.claim_token = ''
+        updated = NotificationOutbox.objects.filter(pk=message.pk, claim_token=token).update(
+            status=message.status, last_error=message.last_error,
+            next_attempt_at=message.next_attempt_at, claim_token='',
+        )
+        if not updated:
+            lost.append(message.pk)
+    return lost
+
+
+def dispatch_due(batch_size=100, now=None, workers=None, organization=None):
+    """
+    Envía un lote de mensajes vencidos: WhatsApp en paralelo, correos en serie
+    por una conexión SMTP. Ningún envío ocurre dentro de una transacción.
+
+    Retorna los contadores {'claimed', 'sent', 'retry', 'failed', 'cancelled',
+    'deferred', 'circuit_open', 'lost_lease'} y en 'results' un dict por mensaje intentado:
+    {'id', 'organization_id', 'channel', 'recipient', 'status', 'error', 'ms'}.
+    """
+    counts = {
+        'claimed': 0, 'sent': 0, 'retry': 0, 'failed': 0, 'cancelled': 0, 'deferred': 0, 'circuit_open': 0,
+        'lost_lease': 0, 'results': [],
+    }
+    messages = claim_due(batch_size, now=now, organization=organization)
+    counts['claimed'] = len(messages)
+    if not messages:
+        return counts
+    token = messages[0].claim_token
+    # Pasada la mitad del lease no se empiezan envíos (cada uno dura a lo más el timeout del proveedor)
+    deadline = time.monotonic() + settings.NOTIFICATION_CLAIM_LEASE / 2
+
+    configs = {pk: get_notification_config(pk) for pk in {m.organization_id for m in messages}}
+    now = timezone.now()
+    allowed, blocked = gate(messages, load_health((m.organization_id, m.channel) for m in messages), now)
+    ready, deferred = _throttle(allowed)
+    for group in (blocked, deferred):
+        if group:
+            _release(group, now, token)
+    counts['circuit_open'] = sum(len(group) for _, group in blocked.values())
+    counts['deferred'] = counts['circuit_open'] + sum(len(group) for _, group in deferred.values())
+
+    whatsapp = [m for m in ready if m.channel == 'WHATSAPP']
+    emails = [m for m in ready if m.channel != 'WHATSAPP']
+    workers = workers or settings.NOTIFICATION_WORKERS
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        email_future = pool.submit(_send_emails, emails, configs, deadline) if emails else None
+        for outcome in pool.map(lambda m: _attempt(m, configs[m.organization_id], deadline=deadline), whatsapp):
+            outcomes.append(outcome)
+        if email_future is not None:
+            outcomes.extend(email_future.result())
+
+    now = timezone.now()
+    attempted = {outcome[0].pk for outcome in outcomes if outcome is not None}
+    outcomes = [outcome for outcome in outcomes if outcome is not None]
+    late = [m for m in ready if m.pk not in attempted]
+    if late:
+        _release({'late': (0, late)}, now, token)
+        counts['deferred'] += len(late)
+        logger.warning(f"{len(late)} notificaciones sin enviar al pasar la mitad del lease: vuelven a la cola")
+    lost = _record(outcomes, now, token)
+    if lost:
+        counts['lost_lease'] = len(lost)
+        logger.warning(
+            f"Lease vencido: {len(lost)} notificaciones ya las reclamó otro worker; no se guardó su resultado: {sorted(lost)}"
+        )
+    record_health(outcomes, configs, now)
+
+    for message, error, _, ms in outcomes:
+        if error is not None and message.status != 'CANCELLED':
+            logger.warning(f"Notificación {message.pk} ({message.channel} a {message.recipient}) falló: {error}")
+        status = 'retry' if message.status == 'PENDING' else message.status.lower()
+        counts[status] += 1
+        counts['results'].append({
+            'id': message.pk,
+            'organization_id': message.organization_id,
+            'channel': message.channel,
+            'recipient': message.recipient,
+            'status': message.status,
+            'error': str(error) if error is not None else '',
+            'ms': round(ms, 1),
+        })
+    return counts
+
+
+def purge_sent(days):
+    """Borra los mensajes enviados o cancelados hace más de `days` días"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = NotificationOutbox.objects.filter(
+        status__in=['SENT', 'CANCELLED'], created_at__lt=cutoff
+    ).delete()
+    return deleted
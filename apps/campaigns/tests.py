@@ -1,3 +1,232 @@
-from django.test import TestCase
+import logging
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.core.models import Organization
+from . import outbox
+from .fake_provider import start_fake_provider
+from .models import NotificationConfig, NotificationOutbox, ProviderHealth
+from .outbox import build_notification, claim_due, dispatch_due, enqueue_notifications, retry_delay
+
+User = get_user_model()
+
+
+def create_organization(name):
+    owner = User.objects.create_user(username=f'{name}-owner', password='x', is_owner=True)
+    return Organization.objects.create(name=name, owner=owner)
+
+
+@override_settings(
+    NOTIFICATION_RATE_LIMIT=0, NOTIFICATION_CLAIM_LEASE=300,
+    NOTIFICATION_MAX_ATTEMPTS=3, NOTIFICATION_RETRY_BASE=60, NOTIFICATION_RETRY_MAX=3600,
+)
+class NotificationOutboxTests(TestCase):
+    """Bandeja de salida: reclamo con lease, reintentos y deduplicación"""
+
+    def setUp(self):
+        self.organization = create_organization('Outbox')
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationConfig.objects.create(
+                organization=self.organization, whatsapp_api_url='http://provider.invalid/messages', whatsapp_token='t'
+            )
+
+    def enqueue(self, count=1, dedupe_key=None):
+        return enqueue_notifications([
+            build_notification(self.organization.pk, 'WHATSAPP', f'5199900{i}', 'Hola', dedupe_key=dedupe_key)
+            for i in range(count)
+        ])
+
+    def later(self, seconds):
+        return timezone.now() + timedelta(seconds=seconds)
+
+    def test_dedupe_key_is_noop(self):
+        self.enqueue(dedupe_key='stamp_completed:1')
+        self.enqueue(dedupe_key='stamp_completed:1')
+        self.enqueue()
+        self.enqueue()
+
+        self.assertEqual(NotificationOutbox.objects.filter(dedupe_key='stamp_completed:1').count(), 1)
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+
+    def test_claim_is_exclusive_until_lease_expires(self):
+        self.enqueue()
+
+        first = claim_due()
+        self.assertEqual(len(first), 1)
+        self.assertEqual(first[0].attempts, 1)
+        self.assertEqual(claim_due(), [])
+        self.assertEqual(claim_due(now=self.later(299)), [])
+
+        # Worker caído: al vencer el lease otro lo reclama con su propio token
+        second = claim_due(now=self.later(301))
+        self.assertEqual([m.pk for m in second], [first[0].pk])
+        self.assertEqual(second[0].attempts, 2)
+        self.assertNotEqual(second[0].claim_token, first[0].claim_token)
+
+    def test_sent_message_is_not_claimed_again(self):
+        self.enqueue()
+
+        with mock.patch('apps.campaigns.outbox.deliver_whatsapp') as deliver:
+            counts = dispatch_due()
+            self.assertEqual(dispatch_due(now=self.later(3600))['claimed'], 0)
+
+        self.assertEqual(counts['sent'], 1)
+        self.assertEqual(deliver.call_count, 1)
+        message = NotificationOutbox.objects.get()
+        self.assertEqual((message.status, message.claim_token), ('SENT', ''))
+        self.assertIsNotNone(message.sent_at)
+
+    def test_retry_delay_doubles_up_to_max(self):
+        self.assertEqual(
+            [retry_delay(n).total_seconds() for n in (1, 2, 3, 4)], [60, 120, 240, 480]
+        )
+        self.assertEqual(retry_delay(20).total_seconds(), 3600)
+
+    def test_failures_back_off_until_failed(self):
+        self.enqueue()
+
+        with mock.patch('apps.campaigns.outbox.deliver_whatsapp', side_effect=RuntimeError('proveedor caído')), \
+                self.assertLogs('apps.campaigns.outbox', 'WARNING'):
+            for attempt in (1, 2):
+                before = timezone.now()
+                counts = dispatch_due(now=self.later(attempt * 7200))
+                self.assertEqual(counts['retry'], 1)
+                message = NotificationOutbox.objects.get()
+                self.assertEqual((message.status, message.attempts, message.claim_token), ('PENDING', attempt, ''))
+                self.assertGreaterEqual(message.next_attempt_at, before + retry_delay(attempt))
+                self.assertLess(message.next_attempt_at, timezone.now() + retry_delay(attempt))
+                # Antes del próximo intento no se reclama
+                self.assertEqual(claim_due(now=before + retry_delay(attempt) - timedelta(seconds=1)), [])
+
+            counts = dispatch_due(now=self.later(3 * 7200))
+
+        self.assertEqual(counts['failed'], 1)
+        message = NotificationOutbox.objects.get()
+        self.assertEqual((message.status, message.attempts), ('FAILED', 3))
+        self.assertEqual(message.last_error, 'proveedor caído')
+        self.assertEqual(claim_due(now=self.later(10 * 7200)), [])
+
+    def test_result_is_not_recorded_after_losing_the_lease(self):
+        self.enqueue(2)
+
+        def reclaimed_meanwhile(outcomes, now, token):
+            # El lote tardó más que el lease y otro worker ya reclamó los mensajes
+            NotificationOutbox.objects.update(claim_token='otro-worker')
+            return record(outcomes, now, token)
+
+        record = outbox._record
+        with mock.patch('apps.campaigns.outbox.deliver_whatsapp', side_effect=[None, RuntimeError('timeout')]), \
+                mock.patch('apps.campaigns.outbox._record', side_effect=reclaimed_meanwhile), \
+                self.assertLogs('apps.campaigns.outbox', 'WARNING') as logs:
+            counts = dispatch_due(workers=1)
+
+        self.assertEqual(counts['lost_lease'], 2)
+        self.assertTrue(any('Lease vencido: 2 notificaciones' in line for line in logs.output))
+        for message in NotificationOutbox.objects.all():
+            self.assertEqual(
+                (message.status, message.claim_token, message.last_error, message.sent_at),
+                ('PENDING', 'otro-worker', '', None),
+            )
+
+    @override_settings(NOTIFICATION_CLAIM_LEASE=0)
+    def test_no_sends_start_after_half_the_lease(self):
+        self.enqueue(2)
+
+        with mock.patch('apps.campaigns.outbox.deliver_whatsapp') as deliver, \
+                self.assertLogs('apps.campaigns.outbox', 'WARNING'):
+            counts = dispatch_due()
+
+        deliver.assert_not_called()
+        self.assertEqual((counts['claimed'], counts['deferred'], counts['sent']), (2, 2, 0))
+        # Vuelven a la cola sin contar el intento
+        for message in NotificationOutbox.objects.all():
+            self.assertEqual((message.status, message.attempts, message.claim_token), ('PENDING', 0, ''))
+
+
+@override_settings(
+    NOTIFICATION_RATE_LIMIT=0, NOTIFICATION_CIRCUIT_THRESHOLD=3, NOTIFICATION_CIRCUIT_COOLDOWN=60,
+    NOTIFICATION_HTTP_TIMEOUT=2,
+)
+class CircuitBreakerTests(TestCase):
+    """Circuit breaker por negocio y canal contra la API falsa (campaigns.fake_provider)"""
+
+    def setUp(self):
+        self.server, url = start_fake_provider(error_rate=1)
+        self.addCleanup(self.server.shutdown)
+        # Los fallos y aperturas del circuito se registran como warnings esperados
+        logging.disable(logging.WARNING)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.organization = create_organization('Circuit')
+        # Al confirmar se invalida la configuración cacheada (la PK del negocio se reutiliza entre tests)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationConfig.objects.create(organization=self.organization, whatsapp_api_url=url, whatsapp_token='t')
+
+    def enqueue(self, count):
+        enqueue_notifications([
+            build_notification(self.organization.pk, 'WHATSAPP', f'519990{i:03d}', 'Hola') for i in range(count)
+        ])
+
+    def dispatch(self):
+        # Siempre después del backoff de los reintentos anteriores
+        return dispatch_due(now=timezone.now() + timedelta(days=1))
+
+    def health(self):
+        return ProviderHealth.objects.get(organization=self.organization, channel='WHATSAPP')
+
+    def open_circuit(self):
+        self.enqueue(3)
+        counts = self.dispatch()
+        self.assertEqual((counts['retry'], self.server.requests), (3, 3))
+        return self.health()
+
+    def expire_cooldown(self):
+        ProviderHealth.objects.update(opened_until=timezone.now() - timedelta(seconds=1))
+
+    def test_consecutive_failures_open_the_circuit(self):
+        health = self.open_circuit()
+
+        self.assertEqual((health.state, health.consecutive_failures, health.trips), ('OPEN', 3, 1))
+        self.assertGreater(health.opened_until, timezone.now() + timedelta(seconds=50))
+
+    def test_open_circuit_defers_without_calling_the_provider(self):
+        self.open_circuit()
+
+        counts = self.dispatch()
+
+        self.assertEqual((counts['claimed'], counts['circuit_open'], counts['deferred']), (3, 3, 3))
+        self.assertEqual(self.server.requests, 3)
+        # Diferidos sin gastar intentos
+        self.assertEqual(set(NotificationOutbox.objects.values_list('attempts', flat=True)), {1})
+
+    def test_half_open_probe_success_closes_the_circuit(self):
+        self.open_circuit()
+        self.expire_cooldown()
+        self.server.error_rate = 0
+
+        counts = self.dispatch()
+
+        # Un solo envío de prueba; el resto espera
+        self.assertEqual((counts['sent'], counts['circuit_open']), (1, 2))
+        self.assertEqual(self.server.requests, 4)
+        health = self.health()
+        self.assertEqual((health.state, health.consecutive_failures, health.opened_until), ('CLOSED', 0, None))
+
+        counts = self.dispatch()
+        self.assertEqual(counts['sent'], 2)
+        self.assertEqual(NotificationOutbox.objects.filter(status='SENT').count(), 3)
+
+    def test_half_open_probe_failure_reopens(self):
+        self.open_circuit()
+        self.expire_cooldown()
+
+        counts = self.dispatch()
+
+        self.assertEqual((counts['retry'], counts['circuit_open']), (1, 2))
+        self.assertEqual(self.server.requests, 4)
+        health = self.health()
+        self.assertEqual((health.state, health.trips), ('OPEN', 2))
+        self.assertGreater(health.opened_until, timezone.now())
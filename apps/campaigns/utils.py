@@ -1,17 +1,45 @@
 import requests
 import logging
+import threading
+from requests.adapters import HTTPAdapter
 from django.core.mail import send_mail
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
-def send_whatsapp_message(config, phone, message):
+# Una sesión HTTP (pool de conexiones keep-alive) por URL de API de WhatsApp
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_whatsapp_session(api_url):
+    """
+    Sesión compartida para la URL del proveedor: reutiliza conexiones TCP/TLS
+    entre mensajes y entre los threads del despachador.
+    """
+    session = _sessions.get(api_url)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(api_url)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(settings.NOTIFICATION_WORKERS, 1))
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _sessions[api_url] = session
+    return session
+
+class NotificationNotConfigured(Exception):
+    """El negocio no tiene configurado el canal: reintentar no sirve de nada"""
+
+
+def deliver_whatsapp(config, phone, message):
     """
     Envía un mensaje usando la API local configurada (estilo UltraMsg).
+    Lanza la excepción del envío (la bandeja de salida la registra y reintenta).
     """
     if not config.whatsapp_api_url or not config.whatsapp_token:
-        logger.warning(f"Configuración de WhatsApp incompleta para {config.organization.name}")
-        return False
+        raise NotificationNotConfigured("Configuración de WhatsApp incompleta")
 
     # Limpiar el teléfono (debería ser internacional sin +)
     clean_phone = ''.join(filter(str.isdigit, str(phone)))
@@ -22,15 +50,45 @@ def send_whatsapp_message(config, phone, message):
         'body': message
     }
 
+    # UltraMsg usa POST a la URL con token en el body o param
+    session = get_whatsapp_session(config.whatsapp_api_url)
+    response = session.post(config.whatsapp_api_url, data=payload, timeout=settings.NOTIFICATION_HTTP_TIMEOUT)
+    response.raise_for_status()
+
+
+def send_whatsapp_message(config, phone, message):
+    """
+    Envía un WhatsApp en el momento. Retorna True/False.
+    Las notificaciones automáticas pasan por la bandeja de salida (campaigns.outbox).
+    """
     try:
-        # UltraMsg usa POST a la URL con token en el body o param
-        response = requests.post(config.whatsapp_api_url, data=payload, timeout=10)
-        response.raise_for_status()
+        deliver_whatsapp(config, phone, message)
         return True
+    except NotificationNotConfigured:
+        logger.warning(f"Configuración de WhatsApp incompleta para {config.organization.name}")
+        return False
     except Exception as e:
-        logger.error(f"Error enviando WhatsApp a {clean_phone}: {str(e)}")
+        logger.error(f"Error enviando WhatsApp a {phone}: {str(e)}")
         return False
 
+def deliver_email(config, email, subject, message, connection=None):
+    """
+    Envía un correo electrónico. Lanza la excepción del envío.
+    `connection` permite reutilizar una conexión SMTP abierta para un lote.
+    """
+    if not config.email_enabled:
+        raise NotificationNotConfigured("Emails deshabilitados")
+
+    send_mail(
+        subject=subject,
+        message=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[email],
+        fail_silently=False,
+        connection=connection,
+    )
+
+
 def send_email_notification(config, email, subject, message):
     """
     Envía un correo electrónico si la organización lo tiene habilitado.
@@ -39,13 +97,7 @@ def send_email_notification(config, email, subject, message):
         return False
         
     try:
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[email],
-            fail_silently=False,
-        )
+        deliver_email(config, email, subject, message)
         return True
     except Exception as e:
         logger.error(f"Error enviando Email a {email}: {str(e)}")
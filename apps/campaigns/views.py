@@ -38,6 +38,7 @@ def notification_settings(request):
         'title': 'Notificaciones Automáticas (Engagement)'
     })
 from apps.customers.models import Customer
+from apps.customers.stats import inactive_q
 
 @login_required
 def campaign_list(request):
@@ -112,8 +113,10 @@ def campaign_send(request, pk):
         return redirect('campaigns:campaign_list')
         
     # Filtrar destinatarios según el segmento
-    # Por ahora solo soportamos ALL
     customers = Customer.objects.filter(organization=request.tenant, is_active=True)
+    if campaign.target_segment == 'INACTIVE':
+        # Última visita precalculada (customers.stats)
+        customers = customers.filter(inactive_q(request.tenant))
     
     if not customers.exists():
         messages.error(request, "No hay clientes destinatarios para enviar.")
@@ -5,4 +5,5 @@ class CoreConfig(AppConfig):
     name = 'apps.core'
 
     def ready(self):
+        import apps.core.checks
         import apps.core.signals
@@ -0,0 +1,115 @@
+"""
+Utilidades compartidas por los comandos de benchmark.
+
+Cada medición registra tiempo de pared, número de consultas SQL y pico de
+memoria (tracemalloc). Los resultados se guardan en JSON para comparar
+ejecuciones entre sí (`compare_results`).
+"""
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback():
+    """Ejecuta el bloque en una transacción que siempre se revierte"""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+def measure(func, repeat=3, isolate=True):
+    """
+    Ejecuta `func` `repeat` veces midiendo tiempo y consultas, y una vez más
+    con tracemalloc para el pico de memoria (no se mezcla con los tiempos).
+    Con `isolate` cada ejecución se revierte, así las vistas que escriben
+    (ej: campaign_send) miden siempre el mismo trabajo.
+    """
+    timings, queries, result = [], [], None
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            if isolate:
+                with rollback():
+                    result = func()
+            else:
+                result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(ctx.captured_queries))
+
+    tracemalloc.start()
+    try:
+        if isolate:
+            with rollback():
+                func()
+        else:
+            func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'runs': repeat,
+        'wall_ms': {
+            'min': round(min(timings), 2),
+            'median': round(statistics.median(timings), 2),
+            'max': round(max(timings), 2),
+        },
+        # La primera ejecución calienta cachés; la última refleja el estado estable
+        'queries': {'first': queries[0], 'last': queries[-1]},
+        'peak_memory_kb': round(peak / 1024, 1),
+    }, result
+
+
+def environment():
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+    }
+
+
+def write_results(path, payload):
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(payload, fh, indent=2, ensure_ascii=False)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+
+def compare_results(baseline, current):
+    """
+    Diferencias por benchmark entre dos archivos de resultados:
+    [(nombre, métrica, antes, después, variación %)].
+    """
+    before = {item['name']: item for item in baseline.get('results', [])}
+    rows = []
+    for item in current.get('results', []):
+        old = before.get(item['name'])
+        if not old:
+            continue
+        for label, getter in (
+            ('wall_ms', lambda r: r['wall_ms']['median']),
+            ('queries', lambda r: r['queries']['last']),
+            ('peak_memory_kb', lambda r: r['peak_memory_kb']),
+        ):
+            a, b = getter(old), getter(item)
+            change = round((b - a) / a * 100, 1) if a else None
+            rows.append((item['name'], label, a, b, change))
+    return rows
@@ -0,0 +1,349 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404
+
+# Centinela para distinguir "no está en caché" de un valor None cacheado
+MISSING = object()
+
+# Registro de todas las cachés creadas (para inspeccionar contadores)
+_registry = {}
+
+
+# Backends que viven en la memoria de cada proceso: no sirven como caché compartida
+LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def _shared_backend():
+    """
+    Backend compartido configurado en settings.TENANT_CACHE_BACKEND (o None).
+    Un alias de memoria local se ignora: cada proceso vería sus propias
+    versiones (ver checks.tenant_cache_backend_check).
+    """
+    alias = getattr(settings, 'TENANT_CACHE_BACKEND', None)
+    if not alias:
+        return None
+    backend = caches[alias]
+    return None if isinstance(backend, LOCAL_BACKENDS) else backend
+
+
+class TTLCache:
+    """
+    Caché en memoria del proceso con expiración (TTL).
+
+    Opcionalmente se respalda en un backend compartido de Django
+    (settings.TENANT_CACHE_BACKEND) para que varios procesos de Passenger
+    compartan los datos. Lleva contadores de aciertos y fallos.
+    """
+
+    def __init__(self, namespace, timeout=None, max_entries=5000):
+        self.namespace = namespace
+        self._timeout = timeout
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        _registry[namespace] = self
+
+    @property
+    def timeout(self):
+        if self._timeout is not None:
+            return self._timeout
+        return getattr(settings, 'TENANT_CACHE_TIMEOUT', 60)
+
+    def _backend(self):
+        return _shared_backend()
+
+    def _generation(self, backend):
+        """La generación cambia al limpiar la caché e invalida todas las llaves compartidas"""
+        return backend.get(f"{self.namespace}:gen", 0)
+
+    def _backend_key(self, backend, key):
+        if isinstance(key, (tuple, list)):
+            key = ':'.join(str(part) for part in key)
+        return f"{self.namespace}:{self._generation(backend)}:{key}"
+
+    def _store_local(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                self._purge()
+            self._data[key] = (time.monotonic() + self.timeout, value)
+
+    def _purge(self):
+        """Elimina expirados y, si sigue llena, las entradas más antiguas (FIFO)"""
+        now = time.monotonic()
+        for k in [k for k, (expires, _) in self._data.items() if expires <= now]:
+            del self._data[k]
+        while len(self._data) >= self.max_entries:
+            self._data.pop(next(iter(self._data)))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+        backend = self._backend()
+        if backend is not None:
+            value = backend.get(self._backend_key(backend, key), MISSING)
+            if value is not MISSING:
+                self._store_local(key, value)
+                with self._lock:
+                    self.hits += 1
+                    self.backend_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return MISSING
+
+    def set(self, key, value):
+        self._store_local(key, value)
+        backend = self._backend()
+        if backend is not None:
+            backend.set(self._backend_key(backend, key), value, self.timeout)
+
+    def get_or_set(self, key, loader):
+        value = self.get(key)
+        if value is MISSING:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        backend = self._backend()
+        if backend is not None:
+            backend.delete(self._backend_key(backend, key))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        backend = self._backend()
+        if backend is not None:
+            gen_key = f"{self.namespace}:gen"
+            if not backend.add(gen_key, 1, None):
+                try:
+                    backend.incr(gen_key)
+                except ValueError:
+                    backend.set(gen_key, 1, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'namespace': self.namespace,
+                'hits': self.hits,
+                'backend_hits': self.backend_hits,
+                'misses': self.misses,
+                'size': len(self._data),
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.backend_hits = self.misses = 0
+
+
+def cache_stats():
+    """Contadores de todas las cachés registradas"""
+    return [c.stats() for c in _registry.values()]
+
+
+# --- Resolución de Tenants ---
+
+tenant_cache = TTLCache('tenants')
+
+
+def _organization_queryset():
+    from .models import Organization
+    return Organization.objects.select_related('plan')
+
+
+def _copy(organization):
+    # Cada request recibe su propia copia para que las mutaciones (ej: formularios
+    # de configuración) no contaminen la instancia cacheada.
+    return copy.copy(organization) if organization is not None else None
+
+
+def get_organization_by_host(host):
+    """Organización asociada a un dominio (None si el dominio no está registrado)"""
+    def load():
+        from .models import Domain
+        domain = Domain.objects.filter(domain=host).select_related('organization__plan').first()
+        return domain.organization if domain else None
+
+    return _copy(tenant_cache.get_or_set(('host', host), load))
+
+
+def get_organization_by_slug(slug):
+    return _copy(tenant_cache.get_or_set(
+        ('slug', slug), lambda: _organization_queryset().filter(slug=slug).first()
+    ))
+
+
+def get_organization_by_id(pk):
+    return _copy(tenant_cache.get_or_set(
+        ('id', pk), lambda: _organization_queryset().filter(pk=pk).first()
+    ))
+
+
+def get_active_organization_or_404(slug):
+    """Equivalente cacheado de get_object_or_404(Organization, slug=slug, is_active=True)"""
+    organization = get_organization_by_slug(slug)
+    if organization is None or not organization.is_active:
+        raise Http404("Organización no encontrada")
+    return organization
+
+
+def invalidate_tenant_cache():
+    tenant_cache.clear()
+
+
+# --- Versiones por Tenant ---
+# Cada "scope" (ej: 'features') tiene un contador por organización que se
+# incrementa al escribir. Las entradas cacheadas incluyen la versión en su
+# llave, así que un incremento las deja obsoletas sin borrarlas una a una.
+#
+# Con backend compartido el contador vive ahí. Sin él, en la tabla
+# TenantVersion (una fila por tenant y scope): cada proceso lee todas las
+# versiones de un tenant en una consulta y las reutiliza durante
+# TENANT_VERSION_REFRESH segundos, así que ve los cambios de los demás
+# procesos con ese retraso como máximo (y los propios de inmediato).
+
+_versions = {}
+_versions_lock = threading.Lock()
+# tenant -> (vence, {scope: versión}) leído de TenantVersion
+_stored_versions = {}
+
+
+def _tenant_key(organization_id):
+    return str(organization_id)
+
+
+def _stored_tenant_versions(organization_id):
+    from .models import TenantVersion
+
+    tenant = _tenant_key(organization_id)
+    with _versions_lock:
+        entry = _stored_versions.get(tenant)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+    versions = dict(TenantVersion.objects.filter(tenant=tenant).values_list('scope', 'version'))
+    with _versions_lock:
+        _stored_versions[tenant] = (time.monotonic() + settings.TENANT_VERSION_REFRESH, versions)
+    return versions
+
+
+def _bump_stored_version(scope, organization_id):
+    from .models import TenantVersion
+
+    tenant = _tenant_key(organization_id)
+    rows = TenantVersion.objects.filter(tenant=tenant, scope=scope)
+    if not rows.update(version=F('version') + 1):
+        try:
+            with transaction.atomic():
+                # Parte del reloj (µs): si la fila se borra, no se repiten versiones ya cacheadas
+                TenantVersion.objects.create(tenant=tenant, scope=scope, version=time.time_ns() // 1000)
+        except IntegrityError:
+            rows.update(version=F('version') + 1)
+    with _versions_lock:
+        _stored_versions.pop(tenant, None)
+
+
+def get_tenant_version(scope, organization_id):
+    backend = _shared_backend()
+    if backend is not None:
+        return backend.get(f"version:{scope}:{organization_id}", 0)
+    return _stored_tenant_versions(organization_id).get(scope, 0)
+
+
+def bump_tenant_version(scope, organization_id):
+    backend = _shared_backend()
+    if backend is None:
+        # Al confirmar: otro proceso no debe ver la versión nueva con los datos viejos
+        transaction.on_commit(lambda: _bump_stored_version(scope, organization_id))
+        return
+
+    with _versions_lock:
+        version = _versions.get((scope, organization_id), 0) + 1
+        _versions[(scope, organization_id)] = version
+    key = f"version:{scope}:{organization_id}"
+    if not backend.add(key, 1, None):
+        try:
+            backend.incr(key)
+        except ValueError:
+            backend.set(key, version, None)
+
+
+# --- Snapshot de Feature Flags ---
+
+feature_cache = TTLCache('features')
+
+
+def get_enabled_features(organization_id):
+    """frozenset con las llaves de features habilitadas de la organización"""
+    if not organization_id:
+        return frozenset()
+
+    def load():
+        from .models import FeatureFlag
+        return frozenset(FeatureFlag.objects.filter(
+            organization_id=organization_id, is_enabled=True
+        ).values_list('feature_key', flat=True))
+
+    version = get_tenant_version('features', organization_id)
+    return feature_cache.get_or_set((organization_id, version), load)
+
+
+def invalidate_features(organization_id):
+    bump_tenant_version('features', organization_id)
+
+
+def invalidate_features_on_commit(organization_id):
+    """invalidate_features al confirmar la transacción (ver invalidate_context_on_commit)"""
+    transaction.on_commit(lambda: invalidate_features(organization_id))
+
+
+# --- Datos de los Context Processors ---
+# Listas pequeñas que se muestran en todas las páginas (cumpleañeros,
+# comunicados, límite de clientes, promociones). Las llaves incluyen la
+# versión del tenant correspondiente, que se incrementa al escribir.
+
+context_cache = TTLCache('context')
+
+GLOBAL_SCOPE = 'global'
+
+
+def invalidate_context(scope, organization_id=GLOBAL_SCOPE):
+    """Deja obsoletos los datos de contexto de un scope ('customers', 'limits', ...)"""
+    if organization_id:
+        bump_tenant_version(scope, organization_id)
+
+
+def invalidate_context_on_commit(scope, organization_id):
+    """
+    Igual que invalidate_context pero al confirmar la transacción, para que
+    nadie cachee (o etiquete con ETag) datos aún no confirmados con la versión nueva.
+    """
+    transaction.on_commit(lambda: invalidate_context(scope, organization_id))
+
+
+def get_context_data(scope, organization_id, loader, *extra):
+    """
+    Valor cacheado para (scope, organización, *extra) en la versión actual.
+    `extra` permite particionar la entrada (ej: la fecha local del tenant).
+    """
+    version = get_tenant_version(scope, organization_id)
+    return context_cache.get_or_set((scope, organization_id, version) + extra, loader)
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+
+from .cache import LOCAL_BACKENDS
+
+
+@register(Tags.caches)
+def tenant_cache_backend_check(app_configs, **kwargs):
+    """TENANT_CACHE_BACKEND debe ser un alias de CACHES compartido entre procesos"""
+    alias = getattr(settings, 'TENANT_CACHE_BACKEND', None)
+    if not alias:
+        return []
+    if alias not in settings.CACHES:
+        return [Warning(
+            f"TENANT_CACHE_BACKEND='{alias}' no existe en CACHES.",
+            hint='Define TENANT_CACHE_URL (redis:// o memcached://) o un alias compartido en CACHES.',
+            id='core.W001',
+        )]
+    if isinstance(caches[alias], LOCAL_BACKENDS):
+        return [Warning(
+            f"TENANT_CACHE_BACKEND='{alias}' es memoria local de cada proceso y se ignora.",
+            hint='Usa Redis o Memcached (TENANT_CACHE_URL) para compartir la caché entre procesos.',
+            id='core.W002',
+        )]
+    return []
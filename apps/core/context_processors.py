@@ -1,38 +1,63 @@
-from django.db import models
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from apps.superadmin.models import SystemAnnouncement
+from .cache import GLOBAL_SCOPE, get_context_data, get_organization_by_id
 
-def global_announcements(request):
+
+def get_active_announcements():
     """
-    Agrega comunicados activos al contexto de todas las páginas.
+    Comunicados publicados y no expirados (compartidos por todos los tenants).
+    La lista se cachea por versión global; la expiración se vuelve a
+    evaluar en cada request para no mostrar comunicados vencidos.
     """
-    if not request.user.is_authenticated:
-        return {}
+    def load():
+        return list(SystemAnnouncement.objects.filter(is_active=True).exclude(
+            expires_at__lte=timezone.now()
+        ))
 
-    # Filtrar comunicados por rol y estado
     now = timezone.now()
-    announcements = SystemAnnouncement.objects.filter(
-        is_active=True
-    ).filter(
-        models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now)
-    )
+    return [
+        announcement for announcement in get_context_data('announcements', GLOBAL_SCOPE, load)
+        if announcement.expires_at is None or announcement.expires_at > now
+    ]
 
-    if request.user.is_superuser:
+
+def _announcements_for(user):
+    announcements = get_active_announcements()
+
+    # Filtrar comunicados por rol
+    if user.is_superuser:
         # El superadmin ve todos
-        pass
-    else:
-        if request.user.is_owner:
-            announcements = announcements.filter(show_to_owners=True)
-        elif request.user.is_staff_member:
-            announcements = announcements.filter(show_to_staff=True)
-        else:
-            # Usuarios sin rol específico no ven comunicados (o ajustar según necesidad)
-            announcements = announcements.none()
+        return announcements
+    if user.is_owner:
+        return [a for a in announcements if a.show_to_owners]
+    if user.is_staff_member:
+        return [a for a in announcements if a.show_to_staff]
+    # Usuarios sin rol específico no ven comunicados (o ajustar según necesidad)
+    return []
+
+
+def global_announcements(request):
+    """
+    Agrega comunicados activos al contexto de todas las páginas.
+    """
+    if not request.user.is_authenticated:
+        return {}
 
+    user = request.user
     return {
-        'system_announcements': announcements
+        'system_announcements': SimpleLazyObject(lambda: _announcements_for(user))
     }
 
+
+def get_customer_limit(organization):
+    """Límite de clientes del negocio, cacheado por versión de límites"""
+    return get_context_data(
+        'limits', organization.pk,
+        lambda: organization.usage_limits.filter(limit_type='customers').first()
+    )
+
+
 def tenant_usage(request):
     """
     Agrega información del plan y uso de la organización al contexto global.
@@ -40,23 +65,27 @@ def tenant_usage(request):
     """
     if not request.user.is_authenticated or request.user.is_superuser:
         return {}
-    
-    org = request.user.organization
+
+    user = request.user
+    if not user.organization_id:
+        return {}
+
+    # El tenant del request ya viene resuelto (y cacheado) por el middleware
+    org = getattr(request, 'tenant', None)
+    if org is None or org.pk != user.organization_id:
+        org = get_organization_by_id(user.organization_id)
     if not org:
         return {}
-    
-    # Obtener el límite de clientes
-    from apps.core.models import UsageLimit
-    customer_limit = org.usage_limits.filter(limit_type='customers').first()
-    
-    # Solo mostrar el límite de clientes si el módulo CRM, Puntos o Sellos está activo
-    if customer_limit:
-        if not (request.user.has_feature_customers or 
-                request.user.has_feature_points or 
-                request.user.has_feature_stamps):
-            customer_limit = None
+
+    def load_customer_limit():
+        # Solo mostrar el límite de clientes si el módulo CRM, Puntos o Sellos está activo
+        if not (user.has_feature_customers or
+                user.has_feature_points or
+                user.has_feature_stamps):
+            return None
+        return get_customer_limit(org)
 
     return {
         'tenant_org': org,
-        'customer_limit': customer_limit,
+        'customer_limit': SimpleLazyObject(load_customer_limit),
     }
@@ -3,7 +3,13 @@ from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
 from functools import wraps
+import hashlib
+import threading
+
+from .cache import _shared_backend, get_tenant_version
 
 def owner_or_superuser_required(view_func):
     """
@@ -19,3 +25,97 @@ def owner_or_superuser_required(view_func):
         return redirect('core:dashboard')
         
     return _wrapped_view
+
+
+# --- Respuestas condicionales (ETag / 304) ---
+
+_etag_counters = {}
+_etag_lock = threading.Lock()
+
+
+def _count_etag(name, not_modified):
+    with _etag_lock:
+        counters = _etag_counters.setdefault(name, {'requests': 0, 'not_modified': 0})
+        counters['requests'] += 1
+        counters['not_modified'] += not_modified
+
+    # Con backend compartido los contadores suman todos los procesos
+    backend = _shared_backend()
+    if backend is not None:
+        for field in ('requests', 'not_modified') if not_modified else ('requests',):
+            key = f"etag:{name}:{field}"
+            if not backend.add(key, 1, None):
+                try:
+                    backend.incr(key)
+                except ValueError:
+                    backend.set(key, 1, None)
+
+
+def etag_stats():
+    """[{'view', 'requests', 'not_modified', 'hit_ratio'}] de las vistas con tenant_etag"""
+    backend = _shared_backend()
+    with _etag_lock:
+        names = sorted(_etag_counters)
+        local = {name: dict(counters) for name, counters in _etag_counters.items()}
+
+    rows = []
+    for name in names:
+        counters = local[name]
+        if backend is not None:
+            counters = {
+                field: backend.get(f"etag:{name}:{field}", counters[field])
+                for field in ('requests', 'not_modified')
+            }
+        requests = counters['requests']
+        rows.append({
+            'view': name,
+            'requests': requests,
+            'not_modified': counters['not_modified'],
+            'hit_ratio': round(counters['not_modified'] / requests, 4) if requests else 0,
+        })
+    return rows
+
+
+def tenant_etag(*scopes, key=None):
+    """
+    ETag a partir de las versiones del tenant (apps.core.cache) en `scopes`.
+    Si el navegador envía un If-None-Match vigente se responde 304 sin
+    ejecutar la vista (ni consultar sus tablas). `key(request)` agrega a la
+    etiqueta lo que también cambia la respuesta (ej: la fecha local o ?q=).
+
+    Las versiones son compartidas por todos los procesos (backend compartido o
+    tabla TenantVersion), así que dos procesos no etiquetan datos distintos
+    con el mismo número; sin backend un proceso puede tardar hasta
+    TENANT_VERSION_REFRESH segundos en ver el cambio de otro.
+    """
+    def decorator(view_func):
+        name = f"{view_func.__module__}.{view_func.__name__}"
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            organization_id = getattr(getattr(request, 'tenant', None), 'pk', None) or getattr(request.user, 'organization_id', None)
+            if not organization_id or request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            # Las versiones se leen antes de calcular la respuesta (una escritura
+            # concurrente deja la etiqueta vieja y el siguiente request recalcula)
+            parts = [name, organization_id] + [get_tenant_version(scope, organization_id) for scope in scopes]
+            if key is not None:
+                parts.append(key(request))
+            etag = 'W/"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+            if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                _count_etag(name, True)
+                response = HttpResponseNotModified()
+            else:
+                _count_etag(name, False)
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            # Siempre revalidar: el navegador reutiliza el cuerpo solo si recibe 304
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from apps.campaigns.models import MarketingCampaign
+from apps.core.benchmarks import compare_results, environment, load_results, measure, write_results
+from apps.core.models import Organization
+
+
+def benchmark_views(organization):
+    """(nombre, url) de las vistas clave del panel del negocio"""
+    views = [
+        ('card_list', reverse('stamps:card_list')),
+        ('customer_list', reverse('customers:customer_list')),
+        ('tenant_dashboard', reverse('core:dashboard')),
+        ('birthday_list', reverse('customers:birthday_list')),
+    ]
+    campaign = MarketingCampaign.objects.filter(organization=organization).exclude(status='SENT').first()
+    if campaign:
+        views.append(('campaign_send', reverse('campaigns:campaign_send', args=[campaign.pk])))
+    return views
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide las vistas clave con el cliente de pruebas de Django (tiempo, consultas y pico de memoria) '
+        'y guarda los resultados en JSON. Usar sobre datos de generate_load_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto el de más clientes)')
+        parser.add_argument('--repeat', type=int, default=5, help='Ejecuciones por vista')
+        parser.add_argument('--view', action='append', default=[], help='Limitar a una vista (repetible)')
+        parser.add_argument('--output', default='benchmark_views.json', help='Archivo JSON de resultados')
+        parser.add_argument('--baseline', help='Archivo JSON de una ejecución anterior para comparar')
+
+    def handle(self, *args, **options):
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+        else:
+            organization = Organization.objects.annotate(n=Count('customer')).order_by('-n').first()
+        if organization is None:
+            raise CommandError('No hay negocios: ejecuta antes generate_load_data.')
+
+        client = Client()
+        client.force_login(organization.owner)
+
+        views = benchmark_views(organization)
+        if options['view']:
+            views = [(name, url) for name, url in views if name in options['view']]
+
+        results = []
+        for name, url in views:
+            stats, response = measure(lambda: client.get(url), repeat=options['repeat'])
+            if response.status_code >= 400:
+                raise CommandError(f"{name} respondió {response.status_code}")
+            results.append({'name': name, 'url': url, 'status': response.status_code, **stats})
+            self.stdout.write(
+                f"{name:<18} {stats['wall_ms']['median']:>9.1f} ms  "
+                f"{stats['queries']['last']:>4} consultas  {stats['peak_memory_kb']:>9.1f} KB"
+            )
+
+        payload = {
+            'benchmark': 'views',
+            'environment': environment(),
+            'organization': {
+                'id': organization.pk,
+                'slug': organization.slug,
+                'customers': organization.customer_set.count(),
+            },
+            'results': results,
+        }
+        write_results(options['output'], payload)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {options['output']}"))
+
+        if options['baseline']:
+            self.stdout.write(self.style.MIGRATE_HEADING('\nComparación con la ejecución base:'))
+            for name, metric, before, after, change in compare_results(load_results(options['baseline']), payload):
+                change = f"{change:+.1f}%" if change is not None else 'n/a'
+                self.stdout.write(f"{name:<18} {metric:<15} {before:>10} -> {after:<10} ({change})")
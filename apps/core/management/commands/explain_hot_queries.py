@@ -0,0 +1,149 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.audit.models import AuditLog
+from apps.campaigns.models import CampaignLog, MarketingCampaign
+from apps.core.benchmarks import rollback
+from apps.core.models import Organization
+from apps.customers.birthdays import birthday_q
+from apps.customers.models import Customer
+from apps.loyalty.models import PointTransaction
+from apps.stamps.models import StampCard, StampPromotion, StampRequest, StampTransaction
+
+# Modelos cuyos Meta.indexes forman el paquete de índices de consultas calientes
+INDEXED_MODELS = (Customer, StampCard, StampTransaction, StampRequest, AuditLog, PointTransaction, CampaignLog)
+
+
+def hot_queries(organization):
+    """
+    Consultas calientes de las vistas, con valores representativos del negocio.
+    Retorna una lista de (etiqueta, queryset); omite las que no tienen datos.
+    """
+    today = timezone.localdate()
+    customer = Customer.objects.filter(organization=organization).exclude(phone_normalized__isnull=True).first()
+    promotion = StampPromotion.objects.filter(organization=organization).first()
+    campaign = MarketingCampaign.objects.filter(organization=organization).first()
+
+    queries = [
+        ('customer_list', Customer.objects.filter(organization=organization).order_by('-created_at')[:25]),
+        ('birthdays_today', Customer.objects.filter(birthday_q(today), organization=organization)),
+        ('birthdays_upcoming', Customer.objects.filter(
+            birthday_q(today + timedelta(days=1), today + timedelta(days=30)), organization=organization
+        )),
+        ('pending_requests', StampRequest.objects.filter(
+            organization=organization, status='PENDING'
+        ).order_by('-requested_at')),
+        ('stamps_today', StampTransaction.objects.filter(
+            organization=organization, created_at__date=today, action='ADD'
+        )),
+        ('active_cards', StampCard.objects.filter(
+            organization=organization, is_redeemed=False, is_completed=False
+        )),
+        ('audit_list', AuditLog.objects.filter(organization=organization).order_by('-created_at')[:50]),
+        ('audit_wa_sent', AuditLog.objects.filter(
+            organization=organization, action='WA_SENT', created_at__date__gte=today - timedelta(days=7)
+        ).values_list('customer_id', flat=True)),
+        ('points_today', PointTransaction.objects.filter(organization=organization, created_at__date=today)),
+    ]
+
+    if customer:
+        queries += [
+            ('customer_by_phone', Customer.objects.filter(
+                organization=organization, phone_normalized=customer.phone_normalized
+            )),
+            ('customer_activity', AuditLog.objects.filter(customer=customer).order_by('-created_at')),
+            ('points_balance', PointTransaction.objects.filter(customer=customer, transaction_type='EARN')),
+            ('pending_by_promotion', StampRequest.objects.filter(customer=customer, status='PENDING').values(
+                'promotion_id'
+            ).annotate(count=Count('id')).order_by()),
+        ]
+
+    if customer and promotion:
+        queries += [
+            ('stamp_cooldown', StampRequest.objects.filter(
+                customer=customer, promotion=promotion, status='PENDING',
+                requested_at__gte=timezone.now() - timedelta(hours=1)
+            )),
+            ('active_card', StampCard.objects.filter(
+                customer=customer, promotion=promotion, is_completed=False, is_redeemed=False
+            )),
+        ]
+
+    if campaign:
+        queries += [
+            ('campaign_recipients', CampaignLog.objects.filter(campaign=campaign).values_list('customer_id', flat=True)),
+            ('campaign_pending', CampaignLog.objects.filter(campaign=campaign, status='PENDING')),
+        ]
+
+    return queries
+
+
+def index_pack():
+    """(modelo, índice) del paquete que existen realmente en la base de datos"""
+    pack = []
+    with connection.cursor() as cursor:
+        for model in INDEXED_MODELS:
+            existing = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            for index in model._meta.indexes:
+                if index.name in existing:
+                    pack.append((model, index))
+    return pack
+
+
+class Command(BaseCommand):
+    help = (
+        'Muestra el plan de ejecución (EXPLAIN) de las consultas calientes por tenant. '
+        'Con --compare lo muestra también sin el paquete de índices (requiere DDL transaccional).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto el de más clientes)')
+        parser.add_argument('--compare', action='store_true', help='Comparar contra el esquema sin los índices')
+        parser.add_argument('--only', action='append', default=[], help='Limitar a una consulta (repetible)')
+
+    def handle(self, *args, **options):
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+        else:
+            organization = Organization.objects.annotate(n=Count('customer')).order_by('-n').first()
+        if organization is None:
+            raise CommandError('No hay negocios: genera datos de prueba antes de ejecutar el benchmark.')
+
+        queries = hot_queries(organization)
+        if options['only']:
+            queries = [(label, qs) for label, qs in queries if label in options['only']]
+
+        self.stdout.write(f"Negocio: {organization.name} (#{organization.pk}) - motor: {connection.vendor}")
+
+        with_indexes = {label: qs.explain() for label, qs in queries}
+        without_indexes = self._explain_without_indexes(queries) if options['compare'] else {}
+
+        for label, _ in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label}"))
+            if without_indexes:
+                self.stdout.write(self.style.WARNING('-- sin índices'))
+                self.stdout.write(without_indexes[label])
+                self.stdout.write(self.style.SUCCESS('-- con índices'))
+            self.stdout.write(with_indexes[label])
+
+        if without_indexes:
+            changed = sum(1 for label in with_indexes if with_indexes[label] != without_indexes[label])
+            self.stdout.write(self.style.SUCCESS(f"\nPlanes que cambian con los índices: {changed}/{len(queries)}"))
+
+    def _explain_without_indexes(self, queries):
+        """Elimina los índices dentro de una transacción, explica y revierte"""
+        if not connection.features.can_rollback_ddl:
+            raise CommandError(f'--compare requiere DDL transaccional (no disponible en {connection.vendor}).')
+
+        pack = index_pack()
+        with rollback():
+            editor = connection.schema_editor(atomic=False)
+            with connection.cursor() as cursor:
+                for model, index in pack:
+                    cursor.execute(str(index.remove_sql(model, editor)))
+            plans = {label: qs.explain() for label, qs in queries}
+        return plans
@@ -0,0 +1,305 @@
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+
+from apps.audit.models import AuditLog
+from apps.campaigns.models import MarketingCampaign
+from apps.core.cache import invalidate_context
+from apps.core.models import Organization
+from apps.core.usage import reconcile_usage, suspend_usage_tracking
+from apps.customers.models import Customer, Tag
+from apps.customers.birthdays import birth_ordinal
+from apps.customers.phones import normalize_phone
+from apps.customers.search import build_search_text, rebuild_search_index
+from apps.customers.stats import rebuild_customer_stats
+from apps.loyalty.models import PointTransaction
+from apps.stamps.models import StampCard, StampPromotion, StampRequest, StampTransaction
+from apps.superadmin.models import Plan
+from apps.users.models import User
+
+FIRST_NAMES = [
+    'Juan', 'Carlos', 'Luis', 'Andrés', 'Jorge', 'Miguel', 'José', 'Pedro', 'Diego', 'Fernando',
+    'Ricardo', 'Alberto', 'Sergio', 'Raúl', 'Óscar', 'Martín', 'Pablo', 'Hugo', 'Iván', 'Mateo',
+]
+LAST_NAMES = [
+    'Pérez', 'García', 'Sánchez', 'Ramírez', 'Torres', 'Flores', 'Rivera', 'Gómez', 'Díaz', 'Vargas',
+    'Castillo', 'Rojas', 'Mendoza', 'Chávez', 'Quispe', 'Huamán', 'Ramos', 'Cruz', 'Morales', 'Ortiz',
+]
+TAGS = [('VIP', '#f59e0b'), ('Barba', '#10b981'), ('Nuevo', '#3b82f6'), ('Frecuente', '#8b5cf6')]
+AUDIT_ACTIONS = ['STAMP_ADD', 'POINTS_ADD', 'UPDATE', 'WA_SENT', 'STAMP_REDEEM']
+
+
+@contextmanager
+def manual_timestamps(*model_classes):
+    """Desactiva auto_now/auto_now_add para insertar fechas históricas"""
+    saved = []
+    for model in model_classes:
+        for field in model._meta.concrete_fields:
+            if isinstance(field, models.DateField) and (field.auto_now or field.auto_now_add):
+                saved.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class BulkWriter:
+    """Acumula objetos y los inserta con bulk_create cada `batch_size`"""
+
+    def __init__(self, model, batch_size):
+        self.model = model
+        self.batch_size = batch_size
+        self.pending = []
+        self.total = 0
+
+    def add(self, obj):
+        self.pending.append(obj)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.model.objects.bulk_create(self.pending, batch_size=self.batch_size)
+            self.total += len(self.pending)
+            self.pending = []
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos deterministas para benchmarks: N negocios x M clientes x K filas '
+        'de sellos/puntos/auditoría por cliente, con inserciones masivas. '
+        'Con la misma semilla se obtienen los mismos datos (fechas relativas al día de ejecución).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=3, help='Número de negocios (N)')
+        parser.add_argument('--customers', type=int, default=1000, help='Clientes por negocio (M)')
+        parser.add_argument('--rows', type=int, default=5, help='Filas de sellos, puntos y auditoría por cliente (K)')
+        parser.add_argument('--days', type=int, default=365, help='Ventana histórica de las fechas generadas')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla del generador')
+        parser.add_argument('--prefix', default='bench', help='Prefijo de slugs y usuarios generados')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Filas por bulk_create')
+        parser.add_argument('--reset', action='store_true', help='Elimina antes los negocios generados con el mismo prefijo')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        existing = Organization.objects.filter(slug__startswith=f"{prefix}-")
+        if existing.exists():
+            if not options['reset']:
+                raise CommandError(f"Ya existen negocios '{prefix}-*'. Usa --reset para regenerarlos.")
+            self._reset(prefix, existing)
+
+        self.now = timezone.now().replace(microsecond=0)
+        self.days = max(options['days'], 1)
+        self.password = make_password('bench123')
+        self.plan = self._benchmark_plan()
+
+        totals = {}
+        for index in range(options['tenants']):
+            rng = random.Random(f"{options['seed']}:{index}")
+            counts = self._generate_tenant(index, rng, options)
+            for key, value in counts.items():
+                totals[key] = totals.get(key, 0) + value
+            self.stdout.write(f"  {prefix}-{index + 1}: " + ', '.join(f"{k}={v}" for k, v in counts.items()))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generados {options['tenants']} negocios: " + ', '.join(f"{k}={v}" for k, v in totals.items())
+        ))
+        self.stdout.write(f"Acceso: usuario '{prefix}-1-owner' / contraseña 'bench123'")
+
+    def _reset(self, prefix, organizations):
+        self.stdout.write(f"Eliminando negocios '{prefix}-*'...")
+        users = User.objects.filter(username__startswith=f"{prefix}-")
+        with suspend_usage_tracking(reconcile=False):
+            # User.organization y StampCard.promotion son PROTECT: se liberan antes
+            users.update(organization=None)
+            for organization in organizations:
+                StampCard.objects.filter(organization=organization).delete()
+                organization.delete()
+            users.delete()
+
+    def _benchmark_plan(self):
+        """Plan con todos los módulos activos y sin límites (para recorrer todas las vistas)"""
+        flags = {f.name: True for f in Plan._meta.concrete_fields if f.name.startswith('enable_')}
+        plan, _ = Plan.objects.update_or_create(name='Benchmark', defaults={
+            **flags,
+            'max_customers': -1,
+            'max_staff': -1,
+            'max_campaigns_monthly': -1,
+            'is_active': False,
+        })
+        return plan
+
+    def _past(self, rng):
+        """Fecha aleatoria dentro de la ventana histórica"""
+        return self.now - timedelta(seconds=rng.randrange(self.days * 86400))
+
+    def _generate_tenant(self, index, rng, options):
+        prefix = options['prefix']
+        batch_size = options['batch_size']
+
+        owner = User.objects.create(
+            username=f"{prefix}-{index + 1}-owner", email=f"{prefix}-{index + 1}@example.com",
+            first_name='Dueño', last_name=f"Benchmark {index + 1}", is_owner=True, password=self.password
+        )
+        organization = Organization.objects.create(
+            name=f"Barbería Benchmark {index + 1}", slug=f"{prefix}-{index + 1}", owner=owner, plan=self.plan
+        )
+        owner.organization = organization
+        owner.save(update_fields=['organization'])
+
+        staff = [
+            User.objects.create(
+                username=f"{prefix}-{index + 1}-staff{n}", email=f"{prefix}-{index + 1}-staff{n}@example.com",
+                is_staff_member=True, organization=organization, password=self.password
+            )
+            for n in range(1, 3)
+        ]
+        performers = [owner] + staff
+
+        tags = [Tag.objects.create(organization=organization, name=name, color=color) for name, color in TAGS]
+        promotions = [
+            StampPromotion.objects.create(
+                organization=organization, name='Corte 10+1', total_stamps_needed=10,
+                reward_description='Corte Clásico Gratis'
+            ),
+            StampPromotion.objects.create(
+                organization=organization, name='Barba 5+1', total_stamps_needed=5,
+                reward_description='Perfilado Gratis'
+            ),
+        ]
+        MarketingCampaign.objects.create(
+            organization=organization, name='Campaña Benchmark', content='Hola {nombre}, te esperamos.',
+            created_by=owner
+        )
+
+        with transaction.atomic(), manual_timestamps(
+            Customer, StampCard, StampTransaction, StampRequest, PointTransaction, AuditLog
+        ):
+            customer_ids = self._customers(organization, rng, options['customers'], batch_size)
+            self._tags(tags, customer_ids, rng, batch_size)
+            cards = self._cards(organization, promotions, customer_ids, rng, batch_size)
+            counts = self._history(organization, performers, customer_ids, cards, rng, options['rows'], batch_size)
+
+        # bulk_create no dispara señales: recontar uso e invalidar datos cacheados
+        reconcile_usage([organization.pk])
+        invalidate_context('customers', organization.pk)
+        invalidate_context('activity', organization.pk)
+
+        return {'customers': len(customer_ids), 'cards': len(cards), **counts}
+
+    def _customers(self, organization, rng, total, batch_size):
+        writer = BulkWriter(Customer, batch_size)
+        for n in range(total):
+            created = self._past(rng)
+            has_birthday = rng.random() < 0.8
+            customer = Customer(
+                organization=organization,
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}",
+                phone=f"9{n:08d}",
+                phone_normalized=normalize_phone(f"9{n:08d}"),
+                dni=f"{organization.pk % 100:02d}{n:06d}",
+                email=f"cliente{n}@{organization.slug}.example.com" if rng.random() < 0.5 else None,
+                birth_day=rng.randint(1, 28) if has_birthday else None,
+                birth_month=rng.randint(1, 12) if has_birthday else None,
+                birth_year=rng.randint(1960, 2006) if has_birthday and rng.random() < 0.6 else None,
+                is_active=rng.random() < 0.97,
+                created_at=created,
+                updated_at=created,
+            )
+            # bulk_create no pasa por save(): campos derivados a mano
+            customer.search_text = build_search_text(customer)
+            customer.birth_ordinal = birth_ordinal(customer.birth_month, customer.birth_day)
+            writer.add(customer)
+        writer.flush()
+        # Tokens de búsqueda (search_text ya viene calculado)
+        rebuild_search_index(organization, chunk_size=batch_size)
+        # MySQL no retorna las PKs de bulk_create: se leen de nuevo
+        return list(Customer.objects.filter(organization=organization).order_by('pk').values_list('pk', flat=True))
+
+    def _tags(self, tags, customer_ids, rng, batch_size):
+        Through = Customer.tags.through
+        writer = BulkWriter(Through, batch_size)
+        for customer_id in customer_ids:
+            if rng.random() < 0.3:
+                for tag in rng.sample(tags, rng.randint(1, 2)):
+                    writer.add(Through(customer_id=customer_id, tag_id=tag.pk))
+        writer.flush()
+
+    def _cards(self, organization, promotions, customer_ids, rng, batch_size):
+        writer = BulkWriter(StampCard, batch_size)
+        for customer_id in customer_ids:
+            if rng.random() > 0.6:
+                continue
+            promotion = promotions[0] if rng.random() < 0.75 else promotions[1]
+            stamps = rng.randint(0, promotion.total_stamps_needed)
+            completed = stamps >= promotion.total_stamps_needed
+            created = self._past(rng)
+            # bulk_create no pasa por StampCard.save(): el vencimiento se calcula aquí
+            expires_at = StampCard.compute_expires_at(created, organization.stamps_expiration_months)
+            writer.add(StampCard(
+                organization=organization, customer_id=customer_id, promotion=promotion,
+                current_stamps=stamps, is_completed=completed,
+                is_redeemed=completed and rng.random() < 0.5,
+                redemption_requested=completed and rng.random() < 0.2,
+                created_at=created,
+                last_stamp_at=min(created + timedelta(days=rng.randint(0, 60)), self.now),
+                expires_at=expires_at, expired=bool(expires_at and expires_at <= self.now),
+            ))
+        writer.flush()
+        return dict(StampCard.objects.filter(organization=organization).values_list('customer_id', 'pk'))
+
+    def _history(self, organization, performers, customer_ids, cards, rng, rows, batch_size):
+        stamps = BulkWriter(StampTransaction, batch_size)
+        points = BulkWriter(PointTransaction, batch_size)
+        audit = BulkWriter(AuditLog, batch_size)
+        requests = BulkWriter(StampRequest, batch_size)
+        promotion_by_card = dict(StampCard.objects.filter(organization=organization).values_list('pk', 'promotion_id'))
+
+        for customer_id in customer_ids:
+            card_id = cards.get(customer_id)
+            for _ in range(rows):
+                performer = rng.choice(performers)
+                if card_id:
+                    stamps.add(StampTransaction(
+                        organization=organization, card_id=card_id, performed_by=performer,
+                        action='ADD' if rng.random() < 0.9 else 'REDEEM', quantity=1,
+                        created_at=self._past(rng),
+                    ))
+                kind = 'EARN' if rng.random() < 0.8 else rng.choice(['REDEEM', 'ADJUST'])
+                points.add(PointTransaction(
+                    organization=organization, customer_id=customer_id, performed_by=performer,
+                    transaction_type=kind, points=rng.randint(5, 50) * (-1 if kind == 'REDEEM' else 1),
+                    description='Generado para benchmark', created_at=self._past(rng),
+                ))
+                audit.add(AuditLog(
+                    organization=organization, user=performer, customer_id=customer_id,
+                    action=rng.choice(AUDIT_ACTIONS), resource='Cliente',
+                    description='Generado para benchmark', created_at=self._past(rng),
+                ))
+
+            if card_id and rng.random() < 0.03:
+                requested = self.now - timedelta(minutes=rng.randint(1, 600))
+                requests.add(StampRequest(
+                    organization=organization, customer_id=customer_id,
+                    promotion_id=promotion_by_card[card_id], status='PENDING', requested_at=requested,
+                ))
+
+        for writer in (stamps, points, audit, requests):
+            writer.flush()
+        # ADN de los clientes (las visitas no pasaron por signals)
+        rebuild_customer_stats(organization, chunk_size=batch_size)
+        return {
+            'stamp_transactions': stamps.total,
+            'point_transactions': points.total,
+            'audit_logs': audit.total,
+            'stamp_requests': requests.total,
+        }
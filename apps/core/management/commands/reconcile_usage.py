@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.core.usage import reconcile_usage
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el consumo real (clientes y staff) de los límites de uso y corrige desvíos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, action='append', help='ID del negocio (repetible). Por defecto todos.')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_usage(options['organization'])
+        self.stdout.write(self.style.SUCCESS(f'Contadores corregidos: {fixed}'))
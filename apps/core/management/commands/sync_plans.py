@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from apps.core.models import Organization
+from apps.core.plan_sync import sync_organizations, sync_plan
+from apps.superadmin.models import Plan
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza límites y features de los negocios con su plan (upsert masivo por bloques).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plan', type=int, help='ID del plan a sincronizar (por defecto todos los negocios)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Negocios por bloque')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        if options['plan']:
+            plan = Plan.objects.get(pk=options['plan'])
+            result = sync_plan(plan, chunk_size=chunk_size)
+        else:
+            organizations = Organization.objects.only('pk', 'plan_id').order_by('pk')
+            result = sync_organizations(organizations, chunk_size=chunk_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sincronizados {result['organizations']} negocios. "
+            f"Filas modificadas: {result['changed']} (límites: {result['limits']}, features: {result['features']})"
+        ))
@@ -0,0 +1,244 @@
+"""
+Instrumentación por request: latencia, consultas SQL y patrones N+1.
+
+RequestMetricsMiddleware registra cada request en un acumulador en memoria
+(por proceso) agrupado por url name. Cada REQUEST_METRICS_FLUSH_INTERVAL
+segundos el acumulador se vuelca a RequestMetric (una fila por vista y hora),
+combinando los histogramas de latencia con lo ya guardado.
+"""
+import atexit
+import logging
+import re
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+
+
+def sql_shape(sql):
+    """Forma normalizada de una sentencia (listas IN y números literales colapsados)"""
+    return _NUMBER.sub('N', _IN_LIST.sub('(...)', sql))
+
+
+def bucket_index(ms):
+    for index, upper in enumerate(LATENCY_BUCKETS_MS):
+        if ms <= upper:
+            return index
+    return len(LATENCY_BUCKETS_MS) - 1
+
+
+def merge_histograms(a, b):
+    size = len(LATENCY_BUCKETS_MS)
+    a = list(a or []) + [0] * (size - len(a or []))
+    b = list(b or []) + [0] * (size - len(b or []))
+    return [x + y for x, y in zip(a, b)]
+
+
+def histogram_percentile(histogram, percentile):
+    """Límite superior del bucket que contiene el percentil (None si está vacío)"""
+    total = sum(histogram or [])
+    if not total:
+        return None
+    threshold = total * percentile / 100
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        cumulative += count
+        if cumulative >= threshold:
+            upper = LATENCY_BUCKETS_MS[index]
+            return None if upper == float('inf') else upper
+    return None
+
+
+class QueryRecorder:
+    """execute_wrapper que cuenta consultas, tiempo en BD y repeticiones por forma"""
+
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+        self.shapes = {}
+        self.slowest = ('', 0.0)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.db_ms += elapsed
+            shape = sql_shape(sql)
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+            if elapsed > self.slowest[1]:
+                self.slowest = (sql, elapsed)
+
+    def most_repeated(self):
+        if not self.shapes:
+            return '', 0
+        return max(self.shapes.items(), key=lambda item: item[1])
+
+
+class _ViewStats:
+    __slots__ = (
+        'requests', 'errors', 'total_ms', 'max_ms', 'histogram', 'total_queries', 'max_queries',
+        'db_ms', 'n_plus_one', 'sample_sql', 'sample_sql_count', 'slowest_sql', 'slowest_sql_ms',
+    )
+
+    def __init__(self):
+        self.requests = self.errors = self.total_queries = self.max_queries = self.n_plus_one = 0
+        self.total_ms = self.max_ms = self.db_ms = self.slowest_sql_ms = 0.0
+        self.histogram = [0] * len(LATENCY_BUCKETS_MS)
+        self.sample_sql, self.sample_sql_count, self.slowest_sql = '', 0, ''
+
+
+class MetricsBuffer:
+    """Acumulador en memoria por (vista, hora), compartido por los threads del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, view_name, elapsed_ms, recorder, status_code):
+        threshold = getattr(settings, 'REQUEST_METRICS_N_PLUS_ONE_THRESHOLD', 10)
+        shape, repeated = recorder.most_repeated()
+        period = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+        with self._lock:
+            stats = self._stats.get((view_name, period))
+            if stats is None:
+                stats = self._stats[(view_name, period)] = _ViewStats()
+            stats.requests += 1
+            stats.errors += status_code >= 500
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.histogram[bucket_index(elapsed_ms)] += 1
+            stats.total_queries += recorder.count
+            stats.max_queries = max(stats.max_queries, recorder.count)
+            stats.db_ms += recorder.db_ms
+            if repeated > threshold:
+                stats.n_plus_one += 1
+                if repeated > stats.sample_sql_count:
+                    stats.sample_sql, stats.sample_sql_count = shape, repeated
+            if recorder.slowest[1] > stats.slowest_sql_ms:
+                stats.slowest_sql, stats.slowest_sql_ms = recorder.slowest
+
+    def due(self):
+        interval = getattr(settings, 'REQUEST_METRICS_FLUSH_INTERVAL', 60)
+        return time.monotonic() - self._last_flush >= interval
+
+    def drain(self):
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            self._last_flush = time.monotonic()
+        return stats
+
+    def pending(self):
+        with self._lock:
+            return len(self._stats)
+
+
+buffer = MetricsBuffer()
+
+
+def record_request(view_name, elapsed_ms, recorder, status_code):
+    buffer.record(view_name, elapsed_ms, recorder, status_code)
+    if buffer.due():
+        flush_metrics()
+
+
+def flush_metrics():
+    """Vuelca el acumulador a RequestMetric. Retorna las filas escritas."""
+    from .models import RequestMetric
+
+    drained = buffer.drain()
+    if not drained:
+        return 0
+
+    try:
+        with transaction.atomic():
+            for (view_name, period), stats in drained.items():
+                row, _ = RequestMetric.objects.select_for_update().get_or_create(
+                    view_name=view_name[:200], period_start=period
+                )
+                row.requests += stats.requests
+                row.errors += stats.errors
+                row.total_ms += stats.total_ms
+                row.max_ms = max(row.max_ms, stats.max_ms)
+                row.latency_histogram = merge_histograms(row.latency_histogram, stats.histogram)
+                row.total_queries += stats.total_queries
+                row.max_queries = max(row.max_queries, stats.max_queries)
+                row.db_ms += stats.db_ms
+                row.n_plus_one += stats.n_plus_one
+                if stats.sample_sql_count > row.sample_sql_count:
+                    row.sample_sql, row.sample_sql_count = stats.sample_sql, stats.sample_sql_count
+                if stats.slowest_sql_ms > row.slowest_sql_ms:
+                    row.slowest_sql, row.slowest_sql_ms = stats.slowest_sql, stats.slowest_sql_ms
+                row.save()
+
+            retention = getattr(settings, 'REQUEST_METRICS_RETENTION_DAYS', 14)
+            RequestMetric.objects.filter(period_start__lt=timezone.now() - timedelta(days=retention)).delete()
+    except Exception:
+        # Las métricas nunca deben romper un request
+        logger.exception("No se pudieron guardar las métricas de requests")
+        return 0
+    return len(drained)
+
+
+def _flush_at_exit():
+    try:
+        flush_metrics()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def summarize(rows):
+    """
+    Combina filas de RequestMetric por vista y calcula promedios y percentiles.
+    Retorna una lista de dicts (sin ordenar).
+    """
+    views = {}
+    for row in rows:
+        item = views.get(row.view_name)
+        if item is None:
+            item = views[row.view_name] = {
+                'view_name': row.view_name, 'requests': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                'histogram': [], 'total_queries': 0, 'max_queries': 0, 'db_ms': 0.0, 'n_plus_one': 0,
+                'sample_sql': '', 'sample_sql_count': 0, 'slowest_sql': '', 'slowest_sql_ms': 0.0,
+            }
+        item['requests'] += row.requests
+        item['errors'] += row.errors
+        item['total_ms'] += row.total_ms
+        item['max_ms'] = max(item['max_ms'], row.max_ms)
+        item['histogram'] = merge_histograms(item['histogram'], row.latency_histogram)
+        item['total_queries'] += row.total_queries
+        item['max_queries'] = max(item['max_queries'], row.max_queries)
+        item['db_ms'] += row.db_ms
+        item['n_plus_one'] += row.n_plus_one
+        if row.sample_sql_count > item['sample_sql_count']:
+            item['sample_sql'], item['sample_sql_count'] = row.sample_sql, row.sample_sql_count
+        if row.slowest_sql_ms > item['slowest_sql_ms']:
+            item['slowest_sql'], item['slowest_sql_ms'] = row.slowest_sql, row.slowest_sql_ms
+
+    for item in views.values():
+        requests = item['requests'] or 1
+        item['avg_ms'] = item['total_ms'] / requests
+        item['avg_queries'] = item['total_queries'] / requests
+        item['avg_db_ms'] = item['db_ms'] / requests
+        item['p50'] = histogram_percentile(item['histogram'], 50)
+        item['p95'] = histogram_percentile(item['histogram'], 95)
+        item['p99'] = histogram_percentile(item['histogram'], 99)
+    return list(views.values())
@@ -1,5 +1,12 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
 from django.utils import timezone
-from .models import Domain, set_current_tenant
+from .models import set_current_tenant
+from .metrics import QueryRecorder, record_request
+from .cache import get_organization_by_host, get_organization_by_id
 from django.utils.deprecation import MiddlewareMixin
 from django.shortcuts import redirect
 from django.contrib import messages
@@ -7,15 +14,16 @@ from django.contrib import messages
 class TenantMiddleware(MiddlewareMixin):
     def process_request(self, request):
         host = request.get_host().split(':')[0].lower()
-        domain_obj = Domain.objects.filter(domain=host).select_related('organization').first()
-        
-        tenant = None
-        if domain_obj:
-            tenant = domain_obj.organization
+        # Resolución cacheada (sin consultas en estado estable)
+        tenant = get_organization_by_host(host)
         
         # Fallback: Si no hay dominio, usar la organización del usuario autenticado (útil para dev local)
-        if not tenant and request.user.is_authenticated and hasattr(request.user, 'organization'):
-            tenant = request.user.organization
+        if not tenant and request.user.is_authenticated and getattr(request.user, 'organization_id', None):
+            tenant = get_organization_by_id(request.user.organization_id)
+
+        if tenant and request.user.is_authenticated and getattr(request.user, 'organization_id', None) == tenant.pk:
+            # Evita la consulta extra al acceder a request.user.organization (vistas y plantillas)
+            request.user.organization = tenant
 
         request.tenant = tenant
         set_current_tenant(tenant)
@@ -55,3 +63,29 @@ class FeatureRestrictionMiddleware(MiddlewareMixin):
                     return redirect('core:dashboard')
 
         return None
+
+
+class RequestMetricsMiddleware:
+    """
+    Instrumentación opcional (settings.REQUEST_METRICS_ENABLED): mide latencia,
+    consultas SQL y tiempo en BD por url name, y detecta patrones N+1.
+    Ver apps/core/metrics.py y el reporte de rendimiento del superadmin.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Solo rutas resueltas (sin 404 de archivos estáticos o bots)
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            record_request(match.view_name, elapsed_ms, recorder, response.status_code)
+        return response
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_organization_custom_background_color_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view_name', models.CharField(max_length=200, verbose_name='Vista')),
+                ('period_start', models.DateTimeField(verbose_name='Inicio del periodo')),
+                ('requests', models.PositiveIntegerField(default=0, verbose_name='Requests')),
+                ('errors', models.PositiveIntegerField(default=0, verbose_name='Errores (5xx)')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Tiempo total (ms)')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Tiempo máximo (ms)')),
+                ('latency_histogram', models.JSONField(default=list, verbose_name='Histograma de latencia')),
+                ('total_queries', models.PositiveIntegerField(default=0, verbose_name='Consultas SQL')),
+                ('max_queries', models.PositiveIntegerField(default=0, verbose_name='Máximo de consultas')),
+                ('db_ms', models.FloatField(default=0, verbose_name='Tiempo en BD (ms)')),
+                ('n_plus_one', models.PositiveIntegerField(default=0, verbose_name='Requests con N+1')),
+                ('sample_sql', models.TextField(blank=True, verbose_name='SQL repetido (muestra)')),
+                ('sample_sql_count', models.PositiveIntegerField(default=0, verbose_name='Repeticiones de la muestra')),
+                ('slowest_sql', models.TextField(blank=True, verbose_name='SQL más lento (muestra)')),
+                ('slowest_sql_ms', models.FloatField(default=0, verbose_name='Duración del SQL más lento (ms)')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Métrica de Requests',
+                'verbose_name_plural': 'Métricas de Requests',
+                'ordering': ['-period_start'],
+                'unique_together': {('view_name', 'period_start')},
+            },
+        ),
+    ]
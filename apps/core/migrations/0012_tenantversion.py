@@ -0,0 +1,27 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestmetric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TenantVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tenant', models.CharField(max_length=20, verbose_name='Tenant')),
+                ('scope', models.CharField(max_length=50, verbose_name='Scope')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Versión')),
+            ],
+            options={
+                'verbose_name': 'Versión de Tenant',
+                'verbose_name_plural': 'Versiones de Tenant',
+                'unique_together': {('tenant', 'scope')},
+            },
+        ),
+    ]
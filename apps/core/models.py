@@ -15,7 +15,67 @@ def set_current_tenant(tenant):
     """Establece el tenant actual en el thread-local storage"""
     _thread_locals.tenant = tenant
 
-class Organization(models.Model):
+class FieldTrackerMixin:
+    """
+    Recuerda los valores cargados desde la base de datos para saber qué campos
+    cambiaron desde entonces, sin consultas extra. Las instancias nuevas (sin
+    cargar) reportan todos sus campos como cambiados.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_loaded_values()
+        return instance
+
+    def _snapshot_loaded_values(self, fields=None):
+        concrete = self._meta.concrete_fields
+        if fields is not None:
+            fields = set(fields)
+            concrete = [f for f in concrete if f.name in fields or f.attname in fields]
+        # Siempre se reasigna el diccionario (las copias de una instancia lo comparten)
+        loaded = dict(getattr(self, '_loaded_values', None) or {})
+        for field in concrete:
+            if field.attname in self.__dict__:
+                loaded[field.attname] = self.__dict__[field.attname]
+        self._loaded_values = loaded
+
+    @property
+    def loaded_values(self):
+        """Valores cargados por attname, o None si la instancia no viene de la base de datos"""
+        return getattr(self, '_loaded_values', None)
+
+    @property
+    def changed_fields(self):
+        """Nombres de los campos modificados desde la carga (o el último save)"""
+        loaded = self.loaded_values
+        if loaded is None:
+            return {f.name for f in self._meta.concrete_fields}
+
+        changed = set()
+        for field in self._meta.concrete_fields:
+            if field.attname not in self.__dict__:
+                continue  # Campo diferido que nunca se tocó
+            if field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname]:
+                changed.add(field.name)
+        return changed
+
+    def has_changed(self, *fields):
+        return bool(self.changed_fields.intersection(fields))
+
+    def get_loaded_value(self, field_name, default=None):
+        attname = self._meta.get_field(field_name).attname
+        return (self.loaded_values or {}).get(attname, default)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_loaded_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._snapshot_loaded_values(kwargs.get('fields'))
+
+class Organization(FieldTrackerMixin, models.Model):
     """
     Representa una barbería (Tenant).
     """
@@ -91,26 +151,28 @@ class Organization(models.Model):
     def __str__(self):
         return self.name
 
+    @property
+    def enabled_features(self):
+        """frozenset de llaves de features habilitadas (cacheado por versión)"""
+        from .cache import get_enabled_features
+        return get_enabled_features(self.pk)
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         
         # 1. Asignar plan por defecto si no tiene uno
-        if not self.plan:
+        if not self.plan_id:
             from apps.superadmin.models import Plan
             default_plan = Plan.objects.filter(is_default=True, is_active=True).first()
             if default_plan:
                 self.plan = default_plan
 
-        # 2. Detectar si el plan cambió
-        plan_changed = False
-        if self.pk:
-            old_instance = Organization.objects.get(pk=self.pk)
-            if old_instance.plan != self.plan:
-                plan_changed = True
+        # 2. Detectar si el plan cambió (sin recargar la instancia)
+        if self._state.adding:
+            plan_changed = bool(self.plan_id)
         else:
-            if self.plan:
-                plan_changed = True
+            plan_changed = self.has_changed('plan')
 
         super().save(*args, **kwargs)
         
@@ -119,102 +181,8 @@ class Organization(models.Model):
 
     def sync_with_plan(self):
         """Sincroniza los usage limits y feature flags con el plan actual."""
-        # 1. Preparar mapas de límites y features (usar defaults si no hay plan)
-        if self.plan:
-            limits_map = {
-                'customers': self.plan.max_customers,
-                'staff': self.plan.max_staff,
-                'appointments_monthly': self.plan.max_appointments_monthly,
-                'campaigns_monthly': self.plan.max_campaigns_monthly,
-            }
-            features_map = {
-                'customers': self.plan.enable_customers,
-                'services': self.plan.enable_services,
-                'points': self.plan.enable_points,
-                'stamps': self.plan.enable_stamps,
-                'rewards': self.plan.enable_rewards,
-                'appointments': self.plan.enable_appointments,
-                'campaigns': self.plan.enable_whatsapp,
-                'reports': self.plan.enable_reports,
-                'subscriptions': self.plan.enable_subscriptions,
-                'integrations': self.plan.enable_integrations,
-                'gamification': self.plan.enable_gamification,
-                'audit': self.plan.enable_audit,
-                
-                # Funcionalidades específicas
-                'customers.import_csv': self.plan.enable_customers_import_csv,
-                'customers.export_data': self.plan.enable_customers_export_data,
-                'reports.export_pdf': self.plan.enable_reports_export_pdf,
-                'campaigns.whatsapp_manual': self.plan.enable_campaigns_whatsapp_manual,
-                'campaigns.auto_notifications': self.plan.enable_campaigns_auto_notifications,
-                'campaigns.pabbly': self.plan.enable_campaigns_pabbly,
-                'appointments.online_booking': self.plan.enable_appointments_online_booking,
-                'gamification.referrals': self.plan.enable_gamification_referrals,
-            }
-        else:
-            # Límites por defecto para negocios sin plan (Gratis/Basic)
-            limits_map = {
-                'customers': 10,
-                'staff': 2,
-                'appointments_monthly': 0,
-                'campaigns_monthly': 0,
-            }
-            features_map = {
-                'customers': True,
-                'services': True,
-                'points': True,
-                'stamps': True,
-                'rewards': False,
-                'appointments': False,
-                'campaigns': False,
-                'reports': False,
-                'subscriptions': False,
-                'integrations': False,
-                'gamification': False,
-                'audit': False,
-                'customers.import_csv': False,
-                'customers.export_data': False,
-                'reports.export_pdf': False,
-                'campaigns.whatsapp_manual': False,
-                'campaigns.auto_notifications': False,
-                'campaigns.pabbly': False,
-                'appointments.online_booking': False,
-                'gamification.referrals': False,
-            }
-
-        # 2. Sincronizar UsageLimits
-        from apps.customers.models import Customer
-        from apps.users.models import User
-        
-        counts_map = {
-            'customers': Customer.objects.filter(organization=self).count(),
-            'staff': User.objects.filter(organization=self, is_staff_member=True).count(),
-            'appointments_monthly': 0,
-            'campaigns_monthly': 0,
-        }
-
-        for limit_type, value in limits_map.items():
-            limit_obj, created = UsageLimit.objects.get_or_create(
-                organization=self,
-                limit_type=limit_type,
-                defaults={'limit_value': value, 'current_usage': counts_map.get(limit_type, 0)}
-            )
-            if not created:
-                limit_obj.limit_value = value
-                limit_obj.current_usage = counts_map.get(limit_type, 0)
-                limit_obj.save()
-
-        # 3. Sincronizar FeatureFlags
-
-        for feature_key, is_enabled in features_map.items():
-            feature_obj, created = FeatureFlag.objects.get_or_create(
-                organization=self,
-                feature_key=feature_key,
-                defaults={'is_enabled': is_enabled}
-            )
-            if not created:
-                feature_obj.is_enabled = is_enabled
-                feature_obj.save()
+        from .plan_sync import sync_organizations
+        return sync_organizations([self])
 
 class Domain(models.Model):
     """
@@ -320,7 +288,62 @@ class UsageLimit(models.Model):
             return 100 if self.current_usage > 0 else 0
         return int(min(100, (self.current_usage / self.limit_value) * 100))
 
-class TenantAwareModel(models.Model):
+class RequestMetric(models.Model):
+    """
+    Métricas agregadas por vista (url name) y por hora, escritas por
+    RequestMetricsMiddleware. La latencia se guarda como histograma para
+    poder combinar percentiles entre procesos y periodos.
+    """
+    view_name = models.CharField(max_length=200, verbose_name="Vista")
+    period_start = models.DateTimeField(verbose_name="Inicio del periodo")
+
+    requests = models.PositiveIntegerField(default=0, verbose_name="Requests")
+    errors = models.PositiveIntegerField(default=0, verbose_name="Errores (5xx)")
+    total_ms = models.FloatField(default=0, verbose_name="Tiempo total (ms)")
+    max_ms = models.FloatField(default=0, verbose_name="Tiempo máximo (ms)")
+    latency_histogram = models.JSONField(default=list, verbose_name="Histograma de latencia")
+
+    total_queries = models.PositiveIntegerField(default=0, verbose_name="Consultas SQL")
+    max_queries = models.PositiveIntegerField(default=0, verbose_name="Máximo de consultas")
+    db_ms = models.FloatField(default=0, verbose_name="Tiempo en BD (ms)")
+
+    # Patrones N+1: requests donde una misma forma de SQL se repitió demasiado
+    n_plus_one = models.PositiveIntegerField(default=0, verbose_name="Requests con N+1")
+    sample_sql = models.TextField(blank=True, verbose_name="SQL repetido (muestra)")
+    sample_sql_count = models.PositiveIntegerField(default=0, verbose_name="Repeticiones de la muestra")
+    slowest_sql = models.TextField(blank=True, verbose_name="SQL más lento (muestra)")
+    slowest_sql_ms = models.FloatField(default=0, verbose_name="Duración del SQL más lento (ms)")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('view_name', 'period_start')
+        verbose_name = "Métrica de Requests"
+        verbose_name_plural = "Métricas de Requests"
+        ordering = ['-period_start']
+
+    def __str__(self):
+        return f"{self.view_name} @ {self.period_start:%Y-%m-%d %H:00}"
+
+class TenantVersion(models.Model):
+    """
+    Versión de cambios por tenant y scope (apps.core.cache) compartida por
+    todos los procesos cuando no hay TENANT_CACHE_BACKEND. Se incrementa con
+    F('version') + 1 al confirmar cada escritura.
+    """
+    tenant = models.CharField(max_length=20, verbose_name="Tenant")  # ID de la organización o 'global'
+    scope = models.CharField(max_length=50, verbose_name="Scope")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Versión")
+
+    class Meta:
+        unique_together = ('tenant', 'scope')
+        verbose_name = "Versión de Tenant"
+        verbose_name_plural = "Versiones de Tenant"
+
+    def __str__(self):
+        return f"{self.scope}:{self.tenant} v{self.version}"
+
+class TenantAwareModel(FieldTrackerMixin, models.Model):
     """
     Clase abstracta para modelos que pertenecen a un tenant específico.
     Automáticamente asigna el tenant al guardar y filtra por tenant al consultar.
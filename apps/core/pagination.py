@@ -0,0 +1,71 @@
+"""
+Paginación por cursor (keyset).
+
+En lugar de OFFSET (que recorre y descarta todas las filas anteriores), la
+página siguiente se pide "después de" los valores de orden de la última fila
+entregada: `WHERE (created_at, id) < (c, i) ORDER BY created_at DESC, id DESC`.
+El costo de cada página es el mismo en la primera que en la milésima, y las
+filas insertadas mientras se navega no desplazan ni repiten resultados.
+
+El cursor viaja al cliente como texto opaco (JSON en base64 url-safe).
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def _json_default(value):
+    # isoformat completo: DjangoJSONEncoder trunca a milisegundos y el cursor debe ser exacto
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), default=_json_default, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Lista de valores del cursor, o None si falta o no es válido"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def keyset_values(obj, fields):
+    """Valores de orden de una fila (para el cursor de la página siguiente)"""
+    return [getattr(obj, field) for field in fields]
+
+
+def keyset_after(queryset, fields, values=None):
+    """
+    Ordena por `fields` descendente y, si hay `values`, deja solo las filas
+    posteriores a ellos. Valores que no corresponden a los campos (cursor
+    manipulado) se ignoran: se empieza desde el principio.
+    """
+    queryset = queryset.order_by(*[f'-{field}' for field in fields])
+    if not values or len(values) != len(fields):
+        return queryset
+    try:
+        values = [
+            queryset.model._meta.pk.to_python(value) if field == 'pk'
+            else queryset.model._meta.get_field(field).to_python(value)
+            for field, value in zip(fields, values)
+        ]
+    except (ValidationError, TypeError, ValueError):
+        return queryset
+
+    # (a < x) OR (a = x AND b < y) OR ...
+    condition = Q()
+    for index, field in enumerate(fields):
+        step = Q(**{f'{field}__lt': values[index]})
+        for previous, value in zip(fields[:index], values[:index]):
+            step &= Q(**{previous: value})
+        condition |= step
+    # El primer campo acotado aparte: con solo el OR algunos motores no usan el rango del índice
+    return queryset.filter(Q(**{f'{fields[0]}__lte': values[0]}), condition)
@@ -0,0 +1,186 @@
+"""
+Sincronización masiva de UsageLimits y FeatureFlags con los planes.
+
+En lugar de un get_or_create + save por límite y por feature (≈50 consultas
+por negocio), cada bloque de organizaciones se resuelve con un puñado de
+sentencias: conteos agrupados, lectura de las filas existentes y un upsert
+(bulk_create con update_conflicts) solo de las filas que cambiaron.
+"""
+from django.db import connection, transaction
+from .models import FeatureFlag, UsageLimit
+from .usage import usage_counts
+
+# Límites y features por defecto para negocios sin plan (Gratis/Basic)
+DEFAULT_LIMITS = {
+    'customers': 10,
+    'staff': 2,
+    'appointments_monthly': 0,
+    'campaigns_monthly': 0,
+}
+
+DEFAULT_FEATURES = {
+    'customers': True,
+    'services': True,
+    'points': True,
+    'stamps': True,
+    'rewards': False,
+    'appointments': False,
+    'campaigns': False,
+    'reports': False,
+    'subscriptions': False,
+    'integrations': False,
+    'gamification': False,
+    'audit': False,
+    'customers.import_csv': False,
+    'customers.export_data': False,
+    'reports.export_pdf': False,
+    'campaigns.whatsapp_manual': False,
+    'campaigns.auto_notifications': False,
+    'campaigns.pabbly': False,
+    'appointments.online_booking': False,
+    'gamification.referrals': False,
+}
+
+
+def plan_limits_map(plan):
+    if not plan:
+        return dict(DEFAULT_LIMITS)
+    return {
+        'customers': plan.max_customers,
+        'staff': plan.max_staff,
+        'appointments_monthly': plan.max_appointments_monthly,
+        'campaigns_monthly': plan.max_campaigns_monthly,
+    }
+
+
+def plan_features_map(plan):
+    if not plan:
+        return dict(DEFAULT_FEATURES)
+    return {
+        'customers': plan.enable_customers,
+        'services': plan.enable_services,
+        'points': plan.enable_points,
+        'stamps': plan.enable_stamps,
+        'rewards': plan.enable_rewards,
+        'appointments': plan.enable_appointments,
+        'campaigns': plan.enable_whatsapp,
+        'reports': plan.enable_reports,
+        'subscriptions': plan.enable_subscriptions,
+        'integrations': plan.enable_integrations,
+        'gamification': plan.enable_gamification,
+        'audit': plan.enable_audit,
+
+        # Funcionalidades específicas
+        'customers.import_csv': plan.enable_customers_import_csv,
+        'customers.export_data': plan.enable_customers_export_data,
+        'reports.export_pdf': plan.enable_reports_export_pdf,
+        'campaigns.whatsapp_manual': plan.enable_campaigns_whatsapp_manual,
+        'campaigns.auto_notifications': plan.enable_campaigns_auto_notifications,
+        'campaigns.pabbly': plan.enable_campaigns_pabbly,
+        'appointments.online_booking': plan.enable_appointments_online_booking,
+        'gamification.referrals': plan.enable_gamification_referrals,
+    }
+
+
+def _upsert(model, objs, unique_fields, update_fields):
+    if not objs:
+        return
+    kwargs = {'update_conflicts': True, 'update_fields': update_fields}
+    # MySQL no admite indicar las columnas del conflicto (usa cualquier UNIQUE)
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = unique_fields
+    model.objects.bulk_create(objs, batch_size=500, **kwargs)
+
+
+def _sync_chunk(organizations, plans):
+    org_ids = [org.pk for org in organizations]
+    counts = usage_counts(org_ids)
+
+    existing_limits = {
+        (row['organization_id'], row['limit_type']): row
+        for row in UsageLimit.objects.filter(organization_id__in=org_ids).values(
+            'organization_id', 'limit_type', 'limit_value', 'current_usage'
+        )
+    }
+    existing_flags = {
+        (row['organization_id'], row['feature_key']): row['is_enabled']
+        for row in FeatureFlag.objects.filter(organization_id__in=org_ids).values(
+            'organization_id', 'feature_key', 'is_enabled'
+        )
+    }
+
+    limits, flags = [], []
+    limit_orgs, flag_orgs = set(), set()
+    for org in organizations:
+        plan = plans.get(org.plan_id)
+
+        for limit_type, value in plan_limits_map(plan).items():
+            usage = counts[org.pk].get(limit_type, 0)
+            current = existing_limits.get((org.pk, limit_type))
+            if current and current['limit_value'] == value and current['current_usage'] == usage:
+                continue
+            limits.append(UsageLimit(
+                organization_id=org.pk, limit_type=limit_type,
+                limit_value=value, current_usage=usage
+            ))
+            limit_orgs.add(org.pk)
+
+        for feature_key, is_enabled in plan_features_map(plan).items():
+            if existing_flags.get((org.pk, feature_key)) == is_enabled:
+                continue
+            flags.append(FeatureFlag(
+                organization_id=org.pk, feature_key=feature_key, is_enabled=is_enabled
+            ))
+            flag_orgs.add(org.pk)
+
+    with transaction.atomic():
+        _upsert(UsageLimit, limits, ['organization', 'limit_type'], ['limit_value', 'current_usage'])
+        _upsert(FeatureFlag, flags, ['organization', 'feature_key'], ['is_enabled'])
+
+    return len(limits), len(flags), limit_orgs, flag_orgs
+
+
+def sync_organizations(organizations, chunk_size=500):
+    """
+    Sincroniza límites y features de muchas organizaciones en bloques.
+    Acepta una lista o un queryset de Organization y retorna un resumen
+    con las filas modificadas.
+    """
+    from apps.superadmin.models import Plan
+    from .cache import invalidate_context_on_commit, invalidate_features_on_commit
+
+    result = {'organizations': 0, 'limits': 0, 'features': 0}
+    organizations = list(organizations)
+    plan_ids = {org.plan_id for org in organizations if org.plan_id}
+    plans = {plan.pk: plan for plan in Plan.objects.filter(pk__in=plan_ids)}
+
+    for start in range(0, len(organizations), chunk_size):
+        chunk = organizations[start:start + chunk_size]
+        limits, flags, limit_orgs, flag_orgs = _sync_chunk(chunk, plans)
+        result['organizations'] += len(chunk)
+        result['limits'] += limits
+        result['features'] += flags
+
+        # bulk_create no dispara señales: invalidar snapshots explícitamente,
+        # al confirmar (la sincronización puede correr dentro de otra transacción)
+        for org_id in flag_orgs:
+            invalidate_features_on_commit(org_id)
+        for org_id in limit_orgs:
+            invalidate_context_on_commit('limits', org_id)
+
+    result['changed'] = result['limits'] + result['features']
+    return result
+
+
+def sync_plan(plan, chunk_size=500):
+    """Sincroniza todos los negocios suscritos a un plan, por bloques de IDs"""
+    from .models import Organization
+
+    result = {'organizations': 0, 'limits': 0, 'features': 0, 'changed': 0}
+    org_ids = list(plan.organizations.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(org_ids), chunk_size):
+        chunk = Organization.objects.filter(pk__in=org_ids[start:start + chunk_size]).only('pk', 'plan_id')
+        partial = sync_organizations(chunk, chunk_size=chunk_size)
+        for key in result:
+            result[key] += partial[key]
+    return result
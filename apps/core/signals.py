@@ -3,44 +3,105 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from apps.customers.models import Customer
 from apps.users.models import User
-from .models import UsageLimit
-
-def update_usage_counter(organization, limit_type):
-    """Actualiza el contador de uso para un tipo de límite específico"""
-    if not organization:
-        return
-        
-    limit = UsageLimit.objects.filter(organization=organization, limit_type=limit_type).first()
-    if not limit:
-        return
-
-    if limit_type == 'customers':
-        count = Customer.objects.filter(organization=organization).count()
-    elif limit_type == 'staff':
-        count = User.objects.filter(organization=organization, is_staff_member=True).count()
-    else:
-        return
-
-    limit.current_usage = count
-    limit.save()
+from apps.superadmin.models import Plan, SystemAnnouncement
+from .models import UsageLimit, Organization, Domain, FeatureFlag
+from apps.loyalty.models import PointTransaction
+from apps.stamps.models import StampCard, StampTransaction
+from apps.campaigns.models import NotificationConfig, ProviderHealth
+from .cache import GLOBAL_SCOPE, invalidate_tenant_cache, invalidate_features_on_commit, invalidate_context_on_commit
+from .usage import adjust_usage, reconcile_usage
 
 # --- Señales para Clientes ---
 @receiver(post_save, sender=Customer)
 def customer_usage_update_on_save(sender, instance, created, **kwargs):
     if created:
-        update_usage_counter(instance.organization, 'customers')
+        adjust_usage(instance.organization_id, 'customers', 1)
 
 @receiver(post_delete, sender=Customer)
 def customer_usage_update_on_delete(sender, instance, **kwargs):
-    update_usage_counter(instance.organization, 'customers')
+    adjust_usage(instance.organization_id, 'customers', -1)
 
 # --- Señales para Staff ---
 @receiver(post_save, sender=User)
 def staff_usage_update_on_save(sender, instance, created, **kwargs):
+    if created:
+        if instance.is_staff_member:
+            adjust_usage(instance.organization_id, 'staff', 1)
+        return
+
+    # Cambios ajenos al rol/organización (ej: contraseña, last_login) no afectan el conteo
+    if not instance.has_changed('is_staff_member', 'organization'):
+        return
+
+    if instance.loaded_values is None:
+        # Sin valores cargados no se conoce el estado anterior: recontar
+        if instance.organization_id:
+            reconcile_usage([instance.organization_id])
+        return
+
+    if instance.get_loaded_value('is_staff_member'):
+        adjust_usage(instance.get_loaded_value('organization'), 'staff', -1)
     if instance.is_staff_member:
-        update_usage_counter(instance.organization, 'staff')
+        adjust_usage(instance.organization_id, 'staff', 1)
 
 @receiver(post_delete, sender=User)
 def staff_usage_update_on_delete(sender, instance, **kwargs):
     if instance.is_staff_member:
-        update_usage_counter(instance.organization, 'staff')
+        adjust_usage(instance.organization_id, 'staff', -1)
+
+# --- Invalidación de la caché de Tenants ---
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+@receiver(post_save, sender=Domain)
+@receiver(post_delete, sender=Domain)
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def tenant_cache_invalidate(sender, instance, **kwargs):
+    # Se limpia completa: cubre renombres de slug/dominio y entradas negativas
+    # (hosts sin dominio). El plan va cacheado junto a la organización.
+    invalidate_tenant_cache()
+
+# --- Snapshot de Feature Flags ---
+@receiver(post_save, sender=FeatureFlag)
+@receiver(post_delete, sender=FeatureFlag)
+def feature_snapshot_invalidate(sender, instance, **kwargs):
+    # Al confirmar: un request concurrente no debe cachear los flags viejos con la versión nueva
+    invalidate_features_on_commit(instance.organization_id)
+
+# --- Datos de los Context Processors ---
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def customer_context_invalidate(sender, instance, **kwargs):
+    # Lista de cumpleañeros del día
+    invalidate_context_on_commit('customers', instance.organization_id)
+
+@receiver(post_save, sender=UsageLimit)
+@receiver(post_delete, sender=UsageLimit)
+def usage_limit_context_invalidate(sender, instance, **kwargs):
+    invalidate_context_on_commit('limits', instance.organization_id)
+
+@receiver(post_save, sender=NotificationConfig)
+@receiver(post_delete, sender=NotificationConfig)
+def notification_config_invalidate(sender, instance, **kwargs):
+    # Configuración leída al encolar y al despachar notificaciones (campaigns.outbox)
+    invalidate_context_on_commit('notifications', instance.organization_id)
+    # Endpoint nuevo: el circuito y la ventana de errores empiezan de cero
+    if kwargs.get('signal') is post_save and instance.has_changed('whatsapp_api_url', 'whatsapp_token'):
+        ProviderHealth.objects.filter(organization_id=instance.organization_id, channel='WHATSAPP').update(
+            state='CLOSED', opened_until=None, consecutive_failures=0, window_successes=0, window_failures=0,
+        )
+
+@receiver(post_save, sender=SystemAnnouncement)
+@receiver(post_delete, sender=SystemAnnouncement)
+def announcement_context_invalidate(sender, instance, **kwargs):
+    invalidate_context_on_commit('announcements', GLOBAL_SCOPE)
+
+# --- Actividad del dashboard (ETag de las APIs JSON) ---
+@receiver(post_save, sender=StampTransaction)
+@receiver(post_delete, sender=StampTransaction)
+@receiver(post_save, sender=PointTransaction)
+@receiver(post_delete, sender=PointTransaction)
+@receiver(post_save, sender=StampCard)
+@receiver(post_delete, sender=StampCard)
+def activity_context_invalidate(sender, instance, **kwargs):
+    invalidate_context_on_commit('activity', instance.organization_id)
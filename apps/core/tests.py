@@ -1,3 +1,223 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from apps.customers.models import Customer
+from apps.superadmin.models import SystemAnnouncement
+from . import cache
+from .cache import GLOBAL_SCOPE, _shared_backend, get_tenant_version, invalidate_context
+from .checks import tenant_cache_backend_check
+from .decorators import tenant_etag
+from .models import FeatureFlag, Organization, TenantVersion
+from .pagination import decode_cursor, encode_cursor, keyset_after, keyset_values
+
+User = get_user_model()
+
+
+class CursorEncodingTests(SimpleTestCase):
+    """Cursor opaco de la paginación keyset"""
+
+    def test_round_trip_keeps_microseconds(self):
+        created = datetime(2026, 3, 1, 12, 30, 5, 123456, tzinfo=dt_timezone.utc)
+
+        cursor = encode_cursor([created, 42])
+
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), ['2026-03-01T12:30:05.123456+00:00', 42])
+
+    def test_invalid_cursor_is_none(self):
+        for cursor in (None, '', 'no-es-base64!', encode_cursor([1])[:-2] + '%%', 'eyJhIjogMX0'):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+
+class KeysetAfterTests(TestCase):
+    """Páginas por (created_at, id) descendente"""
+
+    fields = ('created_at', 'pk')
+
+    def setUp(self):
+        owner = User.objects.create_user(username='keyset-owner', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Keyset', owner=owner)
+        base = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        for index in range(7):
+            customer = Customer.objects.create(organization=self.organization, first_name=f'C{index}', last_name='K')
+            # Empates de created_at de a dos: el id desempata
+            Customer.objects.filter(pk=customer.pk).update(created_at=base + timedelta(minutes=index // 2))
+
+    def customers(self):
+        return Customer.objects.filter(organization=self.organization)
+
+    def pages(self, size):
+        pages, cursor = [], None
+        while True:
+            page = list(keyset_after(self.customers(), self.fields, decode_cursor(cursor))[:size])
+            if not page:
+                return pages
+            pages.append([customer.pk for customer in page])
+            cursor = encode_cursor(keyset_values(page[-1], self.fields))
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(self.customers().order_by('-created_at', '-pk').values_list('pk', flat=True))
+
+        for size in (1, 2, 3, 7):
+            with self.subTest(size=size):
+                pages = self.pages(size)
+                self.assertEqual([pk for page in pages for pk in page], expected)
+                self.assertTrue(all(len(page) <= size for page in pages))
+
+    def test_rows_inserted_while_paging_do_not_shift_pages(self):
+        first = list(keyset_after(self.customers(), self.fields)[:3])
+        cursor = encode_cursor(keyset_values(first[-1], self.fields))
+        Customer.objects.create(organization=self.organization, first_name='Nuevo', last_name='K')
+
+        rest = [c.pk for c in keyset_after(self.customers(), self.fields, decode_cursor(cursor))]
+
+        self.assertEqual(len(rest), 4)
+        self.assertFalse({c.pk for c in first} & set(rest))
+
+    def test_tampered_cursor_starts_over(self):
+        expected = list(keyset_after(self.customers(), self.fields).values_list('pk', flat=True))
+
+        for values in (['no-es-fecha', 1], ['2026-01-01T00:00:00+00:00'], [None, 'x']):
+            with self.subTest(values=values):
+                self.assertEqual(
+                    list(keyset_after(self.customers(), self.fields, values).values_list('pk', flat=True)), expected
+                )
+
+
+class FeatureSnapshotInvalidationTests(TestCase):
+    """La versión de los feature flags cambia al confirmar, no al escribir"""
+
+    def test_flag_change_bumps_version_on_commit(self):
+        owner = User.objects.create_user(username='flags-owner', email='flags@example.com', password='x', is_owner=True)
+        organization = Organization.objects.create(name='Flags', owner=owner)
+        before = get_tenant_version('features', organization.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            FeatureFlag.objects.create(organization=organization, feature_key='campaigns', is_enabled=True)
+            # Aún sin confirmar: otro request cachearía los flags viejos con la versión nueva
+            self.assertEqual(get_tenant_version('features', organization.pk), before)
+
+        self.assertGreater(get_tenant_version('features', organization.pk), before)
+
+
+# Caché compartida entre procesos para los tests (archivos en /tmp)
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tenant': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/tenant-cache-tests'},
+}
+
+
+class SharedCacheBackendTests(SimpleTestCase):
+    """TENANT_CACHE_BACKEND solo se usa si es compartido entre procesos"""
+
+    def check_ids(self):
+        return [warning.id for warning in tenant_cache_backend_check(None)]
+
+    @override_settings(TENANT_CACHE_BACKEND=None)
+    def test_without_alias(self):
+        self.assertIsNone(_shared_backend())
+        self.assertEqual(self.check_ids(), [])
+
+    @override_settings(TENANT_CACHE_BACKEND='default')
+    def test_local_memory_alias_is_ignored_with_warning(self):
+        self.assertIsNone(_shared_backend())
+        self.assertEqual(self.check_ids(), ['core.W002'])
+
+    @override_settings(TENANT_CACHE_BACKEND='tenant')
+    def test_missing_alias_warns(self):
+        self.assertEqual(self.check_ids(), ['core.W001'])
+
+    @override_settings(TENANT_CACHE_BACKEND='tenant', CACHES=SHARED_CACHES)
+    def test_shared_alias_is_used(self):
+        self.assertIsNotNone(_shared_backend())
+        self.assertEqual(self.check_ids(), [])
+
+
+@override_settings(TENANT_CACHE_BACKEND=None, TENANT_VERSION_REFRESH=60)
+class StoredVersionTests(TestCase):
+    """Versiones por tenant en TenantVersion (sin backend compartido) y ETag/304"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='version-owner', email='version@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Versions', owner=owner)
+        self.calls = 0
+        # Versiones leídas por tests anteriores (las PKs se reutilizan)
+        cache._stored_versions.clear()
+
+        @tenant_etag('customers')
+        def view(request):
+            self.calls += 1
+            return HttpResponse('ok')
+
+        self.view = view
+
+    def get(self, etag=None):
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag or '')
+        request.tenant, request.user = self.organization, self.organization.owner
+        return self.view(request)
+
+    def bump(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_context('customers', self.organization.pk)
+
+    def test_bump_is_stored_on_commit_and_seen_by_other_processes(self):
+        self.assertEqual(get_tenant_version('customers', self.organization.pk), 0)
+
+        self.bump()
+        first = get_tenant_version('customers', self.organization.pk)
+        self.bump()
+
+        row = TenantVersion.objects.get(tenant=str(self.organization.pk), scope='customers')
+        self.assertEqual(row.version, first + 1)
+        # Otro proceso (sin versiones en memoria) lee el mismo número de la tabla
+        cache._stored_versions.clear()
+        self.assertEqual(get_tenant_version('customers', self.organization.pk), first + 1)
+
+    def test_versions_are_reused_within_refresh(self):
+        get_tenant_version('customers', self.organization.pk)
+
+        with self.assertNumQueries(0):
+            get_tenant_version('customers', self.organization.pk)
+            get_tenant_version('features', self.organization.pk)
+
+    def test_not_modified_until_the_version_changes(self):
+        response = self.get()
+        etag = response['ETag']
+
+        self.assertEqual(self.get(etag).status_code, 304)
+        self.assertEqual(self.calls, 1)
+
+        self.bump()
+        response = self.get(etag)
+        self.assertEqual((response.status_code, self.calls), (200, 2))
+        self.assertNotEqual(response['ETag'], etag)
+
+
+@override_settings(TENANT_CACHE_BACKEND='tenant', CACHES=SHARED_CACHES)
+class ContextInvalidationOnCommitTests(TestCase):
+    """Con backend compartido, las versiones de contexto cambian al confirmar"""
+
+    def setUp(self):
+        _shared_backend().clear()
+        owner = User.objects.create_user(username='context-owner', email='context@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Context', owner=owner)
+
+    def versions(self):
+        return (
+            get_tenant_version('customers', self.organization.pk),
+            get_tenant_version('announcements', GLOBAL_SCOPE),
+        )
+
+    def test_writes_bump_versions_only_after_commit(self):
+        before = self.versions()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(organization=self.organization, first_name='Ana', last_name='C')
+            SystemAnnouncement.objects.create(title='Aviso', content='Mantenimiento')
+            self.assertEqual(self.versions(), before)
+
+        self.assertEqual(self.versions(), (before[0] + 1, before[1] + 1))
@@ -0,0 +1,116 @@
+"""
+Mantenimiento incremental de UsageLimit.current_usage.
+
+Las altas y bajas ajustan el contador con un UPDATE atómico (F() + delta) en
+lugar de recontar la tabla completa. `reconcile_usage` corrige cualquier
+desvío con conteos agrupados y `suspend_usage_tracking` permite pausar el
+mantenimiento durante operaciones masivas (importaciones, generadores).
+"""
+from contextlib import contextmanager
+from threading import local
+
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .cache import invalidate_context
+from .models import UsageLimit
+
+# Tipos de límite cuyo consumo se puede recontar desde la base de datos
+COUNTED_LIMITS = ('customers', 'staff')
+
+_state = local()
+
+
+def is_usage_tracking_suspended():
+    return getattr(_state, 'depth', 0) > 0
+
+
+def mark_usage_dirty(organization_id):
+    """Marca un negocio para reconciliar al salir del bloque suspendido"""
+    if organization_id and is_usage_tracking_suspended():
+        _state.touched.add(organization_id)
+
+
+def adjust_usage(organization_id, limit_type, delta):
+    """Suma (o resta) `delta` al consumo del límite de forma atómica"""
+    if not organization_id or not delta:
+        return
+
+    if is_usage_tracking_suspended():
+        mark_usage_dirty(organization_id)
+        return
+
+    UsageLimit.objects.filter(
+        organization_id=organization_id, limit_type=limit_type
+    ).update(current_usage=Greatest(F('current_usage') + delta, 0))
+    invalidate_context('limits', organization_id)
+
+
+@contextmanager
+def suspend_usage_tracking(reconcile=True):
+    """
+    Pausa el mantenimiento de contadores en el thread actual.
+    Al salir (del bloque más externo) reconcilia solo los negocios tocados.
+    """
+    if not is_usage_tracking_suspended():
+        _state.touched = set()
+    _state.depth = getattr(_state, 'depth', 0) + 1
+    try:
+        yield
+    finally:
+        _state.depth -= 1
+        if _state.depth == 0:
+            touched, _state.touched = _state.touched, set()
+            if reconcile and touched:
+                reconcile_usage(touched)
+
+
+def usage_counts(organization_ids=None):
+    """
+    Consumo real agrupado por organización: {org_id: {'customers': n, 'staff': n}}.
+    Una consulta agrupada por tipo de límite (None = todos los negocios).
+    """
+    from apps.customers.models import Customer
+    from apps.users.models import User
+
+    counts = {}
+    if organization_ids is not None:
+        counts = {org_id: {'customers': 0, 'staff': 0} for org_id in organization_ids}
+
+    customers = Customer.objects.all()
+    staff = User.objects.filter(is_staff_member=True, organization__isnull=False)
+    if organization_ids is not None:
+        customers = customers.filter(organization_id__in=organization_ids)
+        staff = staff.filter(organization_id__in=organization_ids)
+
+    for limit_type, queryset in (('customers', customers), ('staff', staff)):
+        rows = queryset.values('organization_id').annotate(total=Count('id')).order_by()
+        for row in rows:
+            counts.setdefault(row['organization_id'], {'customers': 0, 'staff': 0})
+            counts[row['organization_id']][limit_type] = row['total']
+    return counts
+
+
+def reconcile_usage(organization_ids=None):
+    """Corrige el consumo de los límites contables. Retorna las filas corregidas."""
+    if organization_ids is not None:
+        organization_ids = list(organization_ids)
+    counts = usage_counts(organization_ids)
+
+    limits = UsageLimit.objects.filter(limit_type__in=COUNTED_LIMITS).only(
+        'pk', 'organization_id', 'limit_type', 'current_usage'
+    )
+    if organization_ids is not None:
+        limits = limits.filter(organization_id__in=organization_ids)
+
+    changed = []
+    for limit in limits.iterator(chunk_size=2000):
+        real = counts.get(limit.organization_id, {}).get(limit.limit_type, 0)
+        if limit.current_usage != real:
+            limit.current_usage = real
+            changed.append(limit)
+
+    UsageLimit.objects.bulk_update(changed, ['current_usage'], batch_size=500)
+    for organization_id in {limit.organization_id for limit in changed}:
+        invalidate_context('limits', organization_id)
+    return len(changed)
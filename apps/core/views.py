@@ -9,7 +9,7 @@ from datetime import timedelta
 from apps.customers.models import Customer
 from apps.loyalty.models import PointTransaction
 from apps.stamps.models import StampCard, StampTransaction, StampPromotion
-from .decorators import owner_or_superuser_required
+from .decorators import owner_or_superuser_required, tenant_etag
 
 @login_required
 def dashboard_dispatch(request):
@@ -256,7 +256,11 @@ def export_daily_report(request):
         
     return response
 
+def _local_today(request):
+    return timezone.localtime().date().isoformat()
+
 @login_required
+@tenant_etag('activity', 'customers', key=_local_today)
 def daily_activity_api(request):
     """Devuelve JSON con la actividad detallada de hoy"""
     tenant = getattr(request, 'tenant', None) or request.user.organization
@@ -301,6 +305,7 @@ def daily_activity_api(request):
     return JsonResponse({'activity': results})
 
 @login_required
+@tenant_etag('activity', 'promotions', key=_local_today)
 def dashboard_stats_api(request):
     """API que devuelve datos para los gráficos del dashboard"""
     tenant = getattr(request, 'tenant', None) or request.user.organization
@@ -330,16 +335,21 @@ def dashboard_stats_api(request):
     })
 from django.contrib import messages
 from .forms import OrganizationSettingsForm
+from .models import Organization
 
 @owner_or_superuser_required
 def tenant_settings(request):
     """Configuración general del negocio (solo para dueños)"""
     tenant = getattr(request, 'tenant', None) or request.user.organization
+    # request.tenant es la copia cacheada del proceso (puede estar desactualizada):
+    # el formulario trabaja sobre la fila actual para no pisar cambios de plan/estado
+    tenant = Organization.objects.get(pk=tenant.pk)
     
     if request.method == 'POST':
         form = OrganizationSettingsForm(request.POST, request.FILES, instance=tenant)
         if form.is_valid():
-            form.save()
+            # Solo las columnas del formulario (plan, estado y límites los maneja el superadmin)
+            form.save(commit=False).save(update_fields=OrganizationSettingsForm.Meta.fields)
             messages.success(request, "Configuración actualizada correctamente.")
             return redirect('core:tenant_settings')
     else:
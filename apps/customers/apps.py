@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CustomersConfig(AppConfig):
     name = 'apps.customers'
+
+    def ready(self):
+        import apps.customers.signals
@@ -0,0 +1,99 @@
+"""
+Calendario de cumpleaños indexado.
+
+`Customer.birth_ordinal` es el día del año del cumpleaños contado sobre un
+año bisiesto (LEAP_YEAR): 1 = 1 de enero, 60 = 29 de febrero, 61 = 1 de
+marzo, 366 = 31 de diciembre. Así cada fecha tiene siempre el mismo número,
+sea o no bisiesto el año en curso.
+
+Política del 29 de febrero: en años no bisiestos se celebra el 28 de febrero
+(`celebration_date`), por eso un rango que termina un 28 de febrero no
+bisiesto incluye también el 60.
+
+Una ventana de fechas (hoy, próximos 30 días, últimos 7) se traduce a uno o
+dos rangos de birth_ordinal (dos si cruza de diciembre a enero) que resuelve
+el índice (organization, birth_ordinal).
+"""
+import calendar
+import zoneinfo
+from datetime import date
+
+from django.db.models import Q
+from django.utils import timezone
+
+LEAP_YEAR = 2000
+FEB_29 = 60
+LAST_ORDINAL = 366
+
+
+def tenant_today(organization):
+    """Fecha actual en la zona horaria del negocio (o la del proyecto)"""
+    today = timezone.localtime().date()
+
+    # Si por alguna razón localtime no está funcionando, forzamos la zona del tenant
+    if organization and getattr(organization, 'timezone', None):
+        try:
+            tz = zoneinfo.ZoneInfo(organization.timezone)
+            today = timezone.now().astimezone(tz).date()
+        except Exception:
+            pass
+    return today
+
+
+def birth_ordinal(month, day):
+    """Día del año (calendario bisiesto) de un cumpleaños, o None si la fecha no es válida"""
+    if not month or not day:
+        return None
+    try:
+        return date(LEAP_YEAR, int(month), int(day)).timetuple().tm_yday
+    except (TypeError, ValueError):
+        return None
+
+
+def celebration_date(year, month, day):
+    """Fecha en que se celebra el cumpleaños en `year` (29/02 -> 28/02 si no es bisiesto)"""
+    if month == 2 and day == 29 and not calendar.isleap(year):
+        return date(year, 2, 28)
+    return date(year, month, day)
+
+
+def _ordinal(value):
+    return date(LEAP_YEAR, value.month, value.day).timetuple().tm_yday
+
+
+def ordinal_ranges(start, end):
+    """
+    Rangos [(desde, hasta)] de birth_ordinal que se celebran entre `start` y
+    `end` (inclusive, a lo sumo un año). Dos rangos si la ventana cruza el año.
+    """
+    low, high = _ordinal(start), _ordinal(end)
+    # Un 28 de febrero no bisiesto también celebra a los nacidos el 29
+    if end.month == 2 and end.day == 28 and not calendar.isleap(end.year):
+        high = FEB_29
+    if start.year == end.year and low <= high:
+        return [(low, high)]
+    return [(low, LAST_ORDINAL), (1, high)]
+
+
+def birthday_q(start, end=None):
+    """Filtro de los clientes que celebran entre `start` y `end` (por defecto solo `start`)"""
+    condition = Q()
+    for low, high in ordinal_ranges(start, end or start):
+        condition |= Q(birth_ordinal__gte=low, birth_ordinal__lte=high) if low != high else Q(birth_ordinal=low)
+    return condition
+
+
+def next_birthday(month, day, today):
+    """Próxima fecha de celebración desde `today` (hoy incluido)"""
+    upcoming = celebration_date(today.year, month, day)
+    if upcoming < today:
+        upcoming = celebration_date(today.year + 1, month, day)
+    return upcoming
+
+
+def last_birthday(month, day, today):
+    """Última fecha de celebración hasta `today` (hoy incluido)"""
+    previous = celebration_date(today.year, month, day)
+    if previous > today:
+        previous = celebration_date(today.year - 1, month, day)
+    return previous
@@ -1,40 +1,42 @@
-from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from apps.core.cache import get_context_data
+from .birthdays import birthday_q, tenant_today
 from .models import Customer
 
+
+def get_birthday_celebrants(organization):
+    """
+    Clientes del negocio que cumplen años hoy (hora local del tenant).
+    Se cachea por día y por versión de clientes: una alta, edición o
+    baja de cliente invalida la lista.
+    """
+    today = tenant_today(organization)
+
+    def load():
+        return list(Customer.objects.filter(birthday_q(today), organization_id=organization.pk))
+
+    return get_context_data('customers', organization.pk, load, today.isoformat())
+
+
 def birthday_celebrants(request):
     """
     Context processor to find customers celebrating their birthday today.
+    Los valores son perezosos: solo se resuelven si la plantilla los usa.
     """
     if not request.user.is_authenticated:
         return {}
-        
+
     # Get organization (tenant)
     organization = getattr(request, 'tenant', None)
     if not organization and hasattr(request.user, 'organization'):
         organization = request.user.organization
-        
+
     if not organization:
         return {}
-        
-    today = timezone.localtime().date()
-    
-    # Si por alguna razón localtime no está funcionando, forzamos la zona del tenant
-    if organization and hasattr(organization, 'timezone') and organization.timezone:
-        import zoneinfo
-        try:
-            tz = zoneinfo.ZoneInfo(organization.timezone)
-            today = timezone.now().astimezone(tz).date()
-        except Exception:
-            pass
-    
-    # Filter customers of this organization whose birthday is today (month & day)
-    celebrants = Customer.objects.filter(
-        organization=organization,
-        birth_month=today.month,
-        birth_day=today.day
-    )
-    
+
+    celebrants = SimpleLazyObject(lambda: get_birthday_celebrants(organization))
+
     return {
         'birthday_celebrants': celebrants,
-        'has_birthday_today': celebrants.exists()
+        'has_birthday_today': SimpleLazyObject(lambda: bool(celebrants))
     }
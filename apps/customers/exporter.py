@@ -0,0 +1,183 @@
+"""
+Exportación de clientes (feature customers.export_data) en CSV o JSON Lines.
+
+La respuesta se arma por partes (StreamingHttpResponse) para que la memoria
+no dependa del tamaño del negocio:
+
+- Una sola consulta recorre los clientes con `.iterator(chunk_size=...)`
+  usando `.values()` (sin instanciar modelos). El resumen de sellos y el
+  saldo de puntos vienen como subconsultas agregadas por cliente (índices
+  stamps_card_cust_promo_idx y points_cust_type_idx) y las visitas de la
+  fila precalculada de CustomerStats, en lugar de recorrer las relaciones
+  de cada cliente.
+- Las etiquetas se leen por bloque de EXPORT_CHUNK_SIZE clientes (una
+  consulta a la tabla intermedia); los nombres de las etiquetas del negocio
+  se cargan una vez.
+- Cada bloque se envía como un solo fragmento de texto.
+
+Los encabezados del CSV son los que acepta la importación, así que el
+archivo exportado se puede volver a importar. Los textos que Excel tomaría
+como fórmula (nombres cargados desde el formulario QR público, por ejemplo
+"=HYPERLINK(...)") se escriben con un apóstrofo delante.
+"""
+import csv
+import io
+import json
+import zoneinfo
+from itertools import islice
+
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Clientes por bloque (fetch del cursor, consulta de etiquetas y fragmento enviado)
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+# (clave en JSON Lines, encabezado del CSV)
+EXPORT_COLUMNS = [
+    ('id', 'ID'),
+    ('first_name', 'Nombre'),
+    ('last_name', 'Apellido'),
+    ('phone', 'Teléfono'),
+    ('email', 'Email'),
+    ('dni', 'DNI'),
+    ('birthday', 'Cumpleaños'),
+    ('tags', 'Etiquetas'),
+    ('notes', 'Notas'),
+    ('is_active', 'Activo'),
+    ('current_stamps', 'Sellos actuales'),
+    ('rewards_pending', 'Premios por canjear'),
+    ('rewards_redeemed', 'Premios canjeados'),
+    ('points', 'Puntos'),
+    ('visit_count', 'Visitas'),
+    ('last_visit_at', 'Última visita'),
+    ('created_at', 'Fecha de registro'),
+]
+
+
+def _aggregate(queryset, expression):
+    """Subconsulta con un agregado por cliente (0 si no tiene filas)"""
+    subquery = queryset.filter(customer=OuterRef('pk')).order_by().values('customer').annotate(total=expression).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+def export_queryset(organization):
+    """Clientes del negocio como diccionarios, con sellos, puntos y visitas ya agregados"""
+    from apps.loyalty.models import PointTransaction
+    from apps.stamps.models import StampCard
+    from .models import Customer
+
+    cards = StampCard.objects.all()
+    points = PointTransaction.objects.all()
+    return Customer.objects.filter(organization=organization).order_by('pk').annotate(
+        current_stamps=_aggregate(
+            cards.filter(is_completed=False, is_redeemed=False, expired=False), Sum('current_stamps')
+        ),
+        rewards_pending=_aggregate(cards.filter(is_completed=True, is_redeemed=False), Count('pk')),
+        rewards_redeemed=_aggregate(cards.filter(is_redeemed=True), Count('pk')),
+        points_earned=_aggregate(points.filter(transaction_type__in=['EARN', 'ADJUST']), Sum('points')),
+        points_redeemed=_aggregate(points.filter(transaction_type='REDEEM'), Sum('points')),
+    ).values(
+        'pk', 'first_name', 'last_name', 'phone', 'email', 'dni', 'birth_day', 'birth_month', 'birth_year',
+        'notes', 'is_active', 'created_at', 'current_stamps', 'rewards_pending', 'rewards_redeemed',
+        'points_earned', 'points_redeemed', 'stats__visit_count', 'stats__last_visit_at',
+    )
+
+
+def _birthday(row):
+    """dd/mm o dd/mm/aaaa (formato que acepta la importación)"""
+    if not row['birth_day'] or not row['birth_month']:
+        return ''
+    value = f"{row['birth_day']:02d}/{row['birth_month']:02d}"
+    if row['birth_year']:
+        value += f"/{row['birth_year']}"
+    return value
+
+
+def _organization_timezone(organization):
+    """
+    Zona del negocio. Se resuelve aquí porque el contenido se genera al enviar
+    la respuesta, fuera de la vista (no depende de la zona activa del request).
+    """
+    try:
+        return zoneinfo.ZoneInfo(organization.timezone)
+    except Exception:
+        return timezone.get_current_timezone()
+
+
+def _local(value, tz):
+    return value.astimezone(tz).isoformat(timespec='seconds') if value else None
+
+
+def _record(row, tags, tz):
+    return {
+        'id': row['pk'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'phone': row['phone'] or '',
+        'email': row['email'] or '',
+        'dni': row['dni'] or '',
+        'birthday': _birthday(row),
+        'tags': tags,
+        'notes': row['notes'],
+        'is_active': row['is_active'],
+        'current_stamps': row['current_stamps'],
+        'rewards_pending': row['rewards_pending'],
+        'rewards_redeemed': row['rewards_redeemed'],
+        'points': row['points_earned'] - row['points_redeemed'],
+        'visit_count': row['stats__visit_count'] or 0,
+        'last_visit_at': _local(row['stats__last_visit_at'], tz),
+        'created_at': _local(row['created_at'], tz),
+    }
+
+
+def iter_customer_records(organization, chunk_size=EXPORT_CHUNK_SIZE):
+    """Bloques (listas) de registros de clientes, cada uno con sus etiquetas"""
+    from .models import Customer, Tag
+
+    tz = _organization_timezone(organization)
+    tag_names = dict(Tag.objects.filter(organization=organization).values_list('pk', 'name'))
+    rows = export_queryset(organization).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        tags = {}
+        links = Customer.tags.through.objects.filter(customer_id__in=[row['pk'] for row in chunk])
+        for customer_id, tag_id in links.order_by('customer_id', 'tag_id').values_list('customer_id', 'tag_id'):
+            tags.setdefault(customer_id, []).append(tag_names.get(tag_id, ''))
+        yield [_record(row, tags.get(row['pk'], []), tz) for row in chunk]
+
+
+# Inicio de celda que una hoja de cálculo interpreta como fórmula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_safe(value):
+    """Texto de una celda del CSV, neutralizado si empieza como fórmula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(organization, chunk_size=EXPORT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')  # BOM para Excel
+    writer.writerow([header for key, header in EXPORT_COLUMNS])
+    for records in iter_customer_records(organization, chunk_size):
+        for record in records:
+            record['tags'] = '; '.join(record['tags'])
+            record['is_active'] = 'Sí' if record['is_active'] else 'No'
+            writer.writerow([csv_safe(record[key]) if record[key] is not None else '' for key, header in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_jsonl(organization, chunk_size=EXPORT_CHUNK_SIZE):
+    for records in iter_customer_records(organization, chunk_size):
+        yield ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
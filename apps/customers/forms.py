@@ -1,6 +1,7 @@
 
 from django import forms
 from .models import Customer, Tag
+from .phones import normalize_phone
 
 class CustomerForm(forms.ModelForm):
     """Formulario para gestión de clientes shadow-sm"""
@@ -42,9 +43,23 @@ class CustomerForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         tenant = kwargs.pop('tenant', None)
         super().__init__(*args, **kwargs)
+        self.tenant = tenant
         if tenant:
             self.fields['tags'].queryset = Tag.objects.filter(organization=tenant)
 
+    def clean_phone(self):
+        """Un teléfono (en cualquier formato) pertenece a un solo cliente del negocio"""
+        phone = self.cleaned_data.get('phone')
+        normalized = normalize_phone(phone)
+        if normalized and self.tenant:
+            duplicate = Customer.objects.filter(organization=self.tenant, phone_normalized=normalized)
+            if self.instance.pk:
+                duplicate = duplicate.exclude(pk=self.instance.pk)
+            duplicate = duplicate.first()
+            if duplicate:
+                raise forms.ValidationError(f"Este teléfono ya está registrado para {duplicate.full_name}.")
+        return phone
+
     class Meta:
         model = Customer
         fields = ['first_name', 'last_name', 'email', 'phone', 'dni', 'birth_day', 'birth_month', 'birth_year', 'notes', 'tags', 'is_active']
@@ -58,3 +73,18 @@ class CustomerForm(forms.ModelForm):
             'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'is_active': forms.CheckboxInput(attrs={'class': 'form-check-input mb-2'}),
         }
+
+
+class CustomerImportForm(forms.Form):
+    """Archivo CSV para la importación masiva (customers.importer)"""
+    file = forms.FileField(
+        label="Archivo CSV",
+        help_text="Columnas: nombre, apellido, teléfono, email, dni, cumpleaños (dd/mm o dd/mm/aaaa), etiquetas, notas.",
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'})
+    )
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.txt')):
+            raise forms.ValidationError("El archivo debe ser .csv")
+        return upload
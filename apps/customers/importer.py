@@ -0,0 +1,367 @@
+"""
+Importación masiva de clientes desde CSV (feature customers.import_csv).
+
+El archivo se lee línea a línea (sin cargarlo completo) y se procesa por
+lotes de IMPORT_BATCH_SIZE filas. Por lote:
+
+1. Validar cada fila (nombre obligatorio, largo de los campos, correo,
+   teléfono y fecha de cumpleaños).
+2. Descartar duplicados contra los clientes del negocio por teléfono
+   normalizado o DNI: dos consultas `IN` por lote. Los lotes anteriores ya
+   están guardados, así que también se detectan duplicados dentro del archivo
+   sin guardar en memoria todo lo leído.
+3. Consultar el límite de clientes del plan (UsageLimit) una vez y cortar el
+   lote en lo que quede disponible.
+4. `bulk_create` de los clientes con los campos derivados que calcula
+   Customer.save() (teléfono normalizado, search_text, birth_ordinal), tokens
+   de búsqueda, etiquetas y el contador de uso, en una transacción. Si un
+   alta simultánea gana la carrera (IntegrityError), el lote se deshace y se
+   reintenta sin los nuevos duplicados.
+
+Cada lote confirmado llama a `progress(result)`; los errores por fila se
+guardan (hasta MAX_REPORTED_ERRORS) como (línea, mensaje).
+"""
+import csv
+import logging
+import re
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, connection, transaction
+
+from apps.core.cache import invalidate_context
+from apps.core.models import UsageLimit
+from apps.core.usage import adjust_usage
+from .birthdays import birth_ordinal
+from .exporter import FORMULA_PREFIXES
+from .phones import normalize_phone
+from .search import build_search_text, fold, index_customers
+
+logger = logging.getLogger(__name__)
+
+# Filas por lote (consultas de duplicados, límite del plan y bulk_create)
+IMPORT_BATCH_SIZE = 1000
+# Intentos por lote si un alta simultánea viola la unicidad del teléfono
+IMPORT_BATCH_ATTEMPTS = 3
+# Errores por fila que se guardan en el resultado (el total se cuenta igual)
+MAX_REPORTED_ERRORS = 500
+
+# Encabezados aceptados (sin tildes, en minúsculas, espacios como "_")
+COLUMN_ALIASES = {
+    'first_name': ('nombre', 'nombres', 'nombre_completo', 'nombre_y_apellido', 'first_name', 'name', 'cliente'),
+    'last_name': ('apellido', 'apellidos', 'last_name'),
+    'phone': ('telefono', 'celular', 'movil', 'whatsapp', 'phone'),
+    'email': ('email', 'correo', 'e-mail', 'correo_electronico', 'mail'),
+    'dni': ('dni', 'documento', 'doc', 'ruc'),
+    'birthday': ('cumpleanos', 'fecha_de_nacimiento', 'nacimiento', 'birthday', 'birth_date'),
+    'tags': ('etiquetas', 'etiqueta', 'tags'),
+    'notes': ('notas', 'nota', 'observaciones', 'notes'),
+}
+MAX_LENGTHS = {'first_name': 150, 'last_name': 150, 'phone': 20, 'dni': 20, 'email': 254}
+
+_DATE = re.compile(r'^(\d{1,4})[/\-.](\d{1,2})(?:[/\-.](\d{2,4}))?$')
+_TAG_SEPARATOR = re.compile(r'[;|,]')
+
+
+def new_result():
+    return {
+        'rows': 0, 'created': 0, 'duplicates': 0, 'invalid': 0, 'over_limit': 0,
+        'tags_created': 0, 'limit_reached': False, 'errors': [],
+    }
+
+
+def _add_error(result, line, message):
+    if len(result['errors']) < MAX_REPORTED_ERRORS:
+        result['errors'].append((line, message))
+
+
+def _decoded_lines(stream):
+    """Líneas de texto del archivo binario: UTF-8 (con o sin BOM) o, si falla, Windows-1252 (Excel)"""
+    for number, raw in enumerate(stream):
+        if isinstance(raw, str):
+            line = raw
+        else:
+            try:
+                line = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                line = raw.decode('cp1252', errors='replace')
+        if number == 0:
+            line = line.lstrip('\ufeff')
+        yield line
+
+
+def _header_map(header):
+    """{campo: índice de columna} a partir de la fila de encabezados"""
+    columns = {}
+    for index, name in enumerate(header):
+        key = re.sub(r'\s+', '_', fold(name).strip())
+        for field, aliases in COLUMN_ALIASES.items():
+            if key in aliases and field not in columns:
+                columns[field] = index
+    return columns
+
+
+def parse_birthday(value):
+    """(día, mes, año o None) de "dd/mm", "dd/mm/aaaa" o "aaaa-mm-dd"; ValueError si no es válida"""
+    match = _DATE.match(value.strip())
+    if not match:
+        raise ValueError(value)
+    first, month, last = match.groups()
+    if len(first) == 4:
+        year, day = int(first), int(last or 0)
+    else:
+        day, year = int(first), int(last) if last else None
+        if year is not None and year < 100:
+            # Dos dígitos: 85 -> 1985, 05 -> 2005
+            year += 2000 if year <= date.today().year % 100 else 1900
+    month = int(month)
+    if birth_ordinal(month, day) is None or (year is not None and not 1900 <= year <= date.today().year):
+        raise ValueError(value)
+    if year is not None:
+        date(year, month, day)
+    return day, month, year
+
+
+def _parse_row(row, columns, line):
+    """Datos del cliente de una fila, o ValueError con el motivo"""
+    def cell(field):
+        index = columns.get(field)
+        value = row[index].strip() if index is not None and index < len(row) else ''
+        # Celda escapada por la exportación ("'+51 999...", "'=...")
+        if value.startswith("'") and value[1:].startswith(FORMULA_PREFIXES):
+            value = value[1:].strip()
+        return value
+
+    data = {field: cell(field) for field in COLUMN_ALIASES}
+    if not data['first_name']:
+        raise ValueError('Falta el nombre')
+    if not data['last_name'] and 'last_name' not in columns:
+        # Una sola columna con el nombre completo: "Juan Pérez Díaz"
+        data['first_name'], _, data['last_name'] = data['first_name'].partition(' ')
+        data['last_name'] = data['last_name'].strip()
+    for field, length in MAX_LENGTHS.items():
+        if len(data[field]) > length:
+            raise ValueError(f'{field} supera {length} caracteres')
+
+    if data['email']:
+        try:
+            validate_email(data['email'])
+        except ValidationError:
+            raise ValueError(f"Correo inválido: {data['email']}")
+    data['phone_normalized'] = normalize_phone(data['phone'])
+    if data['phone'] and not data['phone_normalized']:
+        raise ValueError(f"Teléfono inválido: {data['phone']}")
+
+    data['birth_day'] = data['birth_month'] = data['birth_year'] = None
+    if data['birthday']:
+        try:
+            data['birth_day'], data['birth_month'], data['birth_year'] = parse_birthday(data['birthday'])
+        except ValueError:
+            raise ValueError(f"Fecha de cumpleaños inválida: {data['birthday']}")
+
+    data['tag_names'] = [name.strip()[:50] for name in _TAG_SEPARATOR.split(data['tags']) if name.strip()]
+    data['line'] = line
+    return data
+
+
+def _remaining_quota(organization):
+    """Clientes que aún admite el plan (None = sin límite)"""
+    limit = UsageLimit.objects.filter(organization=organization, limit_type='customers', enforce_limit=True).first()
+    if limit is None or limit.limit_value == -1:
+        return None
+    return max(limit.limit_value - limit.current_usage, 0)
+
+
+def _drop_duplicates(organization, rows, result):
+    """Filas cuyo teléfono o DNI no existe en el negocio ni se repite antes en el lote"""
+    from .models import Customer
+
+    phones = {row['phone_normalized'] for row in rows if row['phone_normalized']}
+    dnis = {row['dni'] for row in rows if row['dni']}
+    existing = Customer.objects.filter(organization=organization)
+    taken_phones = set(existing.filter(phone_normalized__in=phones).values_list('phone_normalized', flat=True)) if phones else set()
+    taken_dnis = set(existing.filter(dni__in=dnis).values_list('dni', flat=True)) if dnis else set()
+
+    unique = []
+    for row in rows:
+        if row['phone_normalized'] and row['phone_normalized'] in taken_phones:
+            reason = f"teléfono {row['phone']}"
+        elif row['dni'] and row['dni'] in taken_dnis:
+            reason = f"DNI {row['dni']}"
+        else:
+            unique.append(row)
+            if row['phone_normalized']:
+                taken_phones.add(row['phone_normalized'])
+            if row['dni']:
+                taken_dnis.add(row['dni'])
+            continue
+        result['duplicates'] += 1
+        _add_error(result, row['line'], f"Duplicado: ya existe un cliente con {reason}")
+    return unique
+
+
+def _resolve_tags(organization, names, tags, result):
+    """Completa `tags` ({nombre sin tildes: Tag}) creando las etiquetas que falten"""
+    from .models import Tag
+
+    missing = {}
+    for name in names:
+        missing.setdefault(fold(name), name)
+    for key in list(missing):
+        if key in tags:
+            missing.pop(key)
+    if not missing:
+        return
+    Tag.objects.bulk_create(
+        [Tag(organization=organization, name=name) for name in missing.values()], ignore_conflicts=True
+    )
+    # Releer: bulk_create no retorna las PKs en todos los motores (ni con ignore_conflicts)
+    for tag in Tag.objects.filter(organization=organization, name__in=list(missing.values())):
+        tags[fold(tag.name)] = tag
+    result['tags_created'] += len(missing)
+
+
+def _recover_pks(organization, customers, last_pk):
+    """
+    PKs de `customers` en motores sin RETURNING (MySQL): relee las filas del
+    negocio posteriores a `last_pk` y las asocia por contenido, no por
+    posición (otro INSERT concurrente puede intercalar filas).
+    """
+    from .models import Customer
+
+    def key(first_name, last_name, phone_normalized, dni):
+        return first_name, last_name, phone_normalized or '', dni or ''
+
+    pks = {}
+    inserted = Customer.objects.filter(organization=organization, pk__gt=last_pk).order_by('pk')
+    for pk, *fields in inserted.values_list('pk', 'first_name', 'last_name', 'phone_normalized', 'dni'):
+        pks.setdefault(key(*fields), []).append(pk)
+    for customer in customers:
+        matches = pks.get(key(customer.first_name, customer.last_name, customer.phone_normalized, customer.dni))
+        if not matches:
+            raise RuntimeError(f'No se encontró el cliente importado "{customer.first_name} {customer.last_name}"')
+        customer.pk = matches.pop(0)
+
+
+def _insert_batch(organization, rows, tags, result):
+    from .models import Customer
+
+    customers = []
+    for row in rows:
+        customer = Customer(
+            organization=organization,
+            first_name=row['first_name'], last_name=row['last_name'],
+            email=row['email'] or None, phone=row['phone'] or None, dni=row['dni'] or None,
+            birth_day=row['birth_day'], birth_month=row['birth_month'], birth_year=row['birth_year'],
+            notes=row['notes'],
+        )
+        # bulk_create no pasa por save(): campos derivados a mano
+        customer.phone_normalized = row['phone_normalized']
+        customer.search_text = build_search_text(customer)
+        customer.birth_ordinal = birth_ordinal(customer.birth_month, customer.birth_day)
+        customers.append(customer)
+
+    with transaction.atomic():
+        returns_pks = connection.features.can_return_rows_from_bulk_insert
+        if not returns_pks:
+            last_pk = Customer.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Customer.objects.bulk_create(customers)
+        if not returns_pks:
+            _recover_pks(organization, customers, last_pk)
+
+        index_customers(customers, created=True)
+        _resolve_tags(organization, [name for row in rows for name in row['tag_names']], tags, result)
+        Through = Customer.tags.through
+        Through.objects.bulk_create([
+            Through(customer_id=customer.pk, tag_id=tags[fold(name)].pk)
+            for customer, row in zip(customers, rows)
+            for name in row['tag_names'] if fold(name) in tags
+        ], ignore_conflicts=True)
+        # bulk_create no dispara signals: contador de uso del plan
+        adjust_usage(organization.pk, 'customers', len(customers))
+    result['created'] += len(customers)
+
+
+def _process_batch(organization, rows, tags, result):
+    rows = _drop_duplicates(organization, rows, result)
+    if not rows:
+        return
+    quota = _remaining_quota(organization)
+    if quota is not None and len(rows) > quota:
+        for row in rows[quota:]:
+            _add_error(result, row['line'], 'Límite de clientes del plan alcanzado')
+        result['over_limit'] += len(rows) - quota
+        result['limit_reached'] = True
+        rows = rows[:quota]
+    for attempt in range(IMPORT_BATCH_ATTEMPTS):
+        if not rows:
+            return
+        known_tags, tags_created = dict(tags), result['tags_created']
+        try:
+            _insert_batch(organization, rows, tags, result)
+            return
+        except IntegrityError:
+            # Un alta simultánea (ej: escaneo QR con el mismo teléfono) ganó la
+            # carrera: el lote se deshizo completo; descartar los nuevos duplicados y reintentar
+            tags.clear()
+            tags.update(known_tags)
+            result['tags_created'] = tags_created
+            rows = _drop_duplicates(organization, rows, result)
+    for row in rows:
+        _add_error(result, row['line'], 'No se pudo guardar: el cliente cambió durante la importación')
+    result['invalid'] += len(rows)
+
+
+def import_customers(organization, stream, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Importa los clientes del CSV `stream` (archivo binario o de texto, ej:
+    request.FILES['file']) en `organization`. Separador "," ";" o tabulación
+    (se detecta en el encabezado). Retorna el resultado de new_result().
+    """
+    from .models import Tag
+
+    result = new_result()
+    lines = _decoded_lines(stream)
+    header_line = next(lines, '')
+    delimiter = max((',', ';', '\t'), key=header_line.count)
+    header = next(csv.reader([header_line], delimiter=delimiter), [])
+    columns = _header_map(header)
+    if 'first_name' not in columns:
+        _add_error(result, 1, 'El archivo debe tener una columna "nombre"')
+        return result
+
+    tags = {fold(tag.name): tag for tag in Tag.objects.filter(organization=organization)}
+    reader = csv.reader(lines, delimiter=delimiter)
+    batch = []
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        result['rows'] += 1
+        # +1: el encabezado se leyó aparte
+        line = reader.line_num + 1
+        try:
+            batch.append(_parse_row(row, columns, line))
+        except ValueError as exc:
+            result['invalid'] += 1
+            _add_error(result, line, str(exc))
+
+        if len(batch) >= batch_size:
+            _process_batch(organization, batch, tags, result)
+            batch = []
+            if progress:
+                progress(result)
+            if result['limit_reached']:
+                break
+    if batch and not result['limit_reached']:
+        _process_batch(organization, batch, tags, result)
+        if progress:
+            progress(result)
+
+    if result['created']:
+        invalidate_context('customers', organization.pk)
+    logger.info(
+        f"Importación en {organization.slug}: {result['created']} creados, {result['duplicates']} duplicados, "
+        f"{result['invalid']} inválidos, {result['over_limit']} sobre el límite"
+    )
+    return result
@@ -0,0 +1,119 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Q
+from django.test.utils import CaptureQueriesContext
+
+from apps.core.benchmarks import environment, write_results
+from apps.core.models import Organization
+from apps.customers.models import Customer
+from apps.customers.search import SEARCH_LIMIT, search_customers
+
+
+def legacy_search(organization, query):
+    """Búsqueda anterior (icontains sobre cada campo), como referencia"""
+    return list(Customer.objects.filter(organization=organization).filter(
+        Q(first_name__icontains=query) |
+        Q(last_name__icontains=query) |
+        Q(phone__icontains=query) |
+        Q(email__icontains=query)
+    )[:SEARCH_LIMIT])
+
+
+def indexed_search(organization, query):
+    return search_customers(organization, query)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia por tecla del buscador de clientes: escribe letra a letra nombres y teléfonos '
+        'de clientes reales del negocio y compara la búsqueda indexada (customers.search) con la '
+        'anterior (icontains). Solo lectura; para 100k clientes: generate_load_data --tenants 1 --customers 100000.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto el de más clientes)')
+        parser.add_argument('--samples', type=int, default=20, help='Clientes cuyos datos se teclean')
+        parser.add_argument('--max-keystrokes', type=int, default=8, help='Largo máximo de cada consulta tecleada')
+        parser.add_argument('--skip-legacy', action='store_true', help='No medir la búsqueda icontains')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark_customer_search.json', help='Archivo JSON de resultados')
+
+    def handle(self, *args, **options):
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+        else:
+            organization = Organization.objects.annotate(n=Count('customer')).order_by('-n').first()
+        if organization is None:
+            raise CommandError('No hay negocios: ejecuta antes generate_load_data.')
+        total = Customer.objects.filter(organization=organization).count()
+        if not total:
+            raise CommandError('El negocio no tiene clientes.')
+
+        rng = random.Random(options['seed'])
+        ids = list(Customer.objects.filter(organization=organization).values_list('pk', flat=True))
+        sampled = Customer.objects.filter(pk__in=rng.sample(ids, min(options['samples'], len(ids))))
+        inputs = {'name': [], 'phone': []}
+        for customer in sampled:
+            inputs['name'].append(f"{customer.first_name} {customer.last_name}"[:options['max_keystrokes']])
+            if customer.phone:
+                inputs['phone'].append(customer.phone[:options['max_keystrokes']])
+
+        modes = [('indexed', indexed_search)]
+        if not options['skip_legacy']:
+            modes.append(('legacy', legacy_search))
+
+        results = []
+        for mode, search in modes:
+            for kind, texts in inputs.items():
+                if texts:
+                    results.append(self.run(organization, mode, kind, texts, search))
+
+        write_results(options['output'], {
+            'benchmark': 'customer_search',
+            'environment': environment(),
+            'organization': {'id': organization.pk, 'slug': organization.slug, 'customers': total},
+            'results': results,
+        })
+        self.stdout.write(self.style.SUCCESS(f"Resultados en {options['output']}"))
+
+    def run(self, organization, mode, kind, texts, search):
+        """Una consulta por tecla: "j", "ju", "jua"... de cada texto"""
+        timings, by_length, queries = [], {}, []
+        for text in texts:
+            for size in range(1, len(text) + 1):
+                query = text[:size]
+                if not query.strip():
+                    continue
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    search(organization, query)
+                    elapsed = (time.perf_counter() - start) * 1000
+                timings.append(elapsed)
+                queries.append(len(ctx.captured_queries))
+                by_length.setdefault(size, []).append(elapsed)
+
+        timings.sort()
+        result = {
+            'name': f'search_{mode}_{kind}',
+            'keystrokes': len(timings),
+            'wall_ms': {
+                'min': round(timings[0], 2),
+                'median': round(statistics.median(timings), 2),
+                'p95': round(timings[max(int(len(timings) * 0.95) - 1, 0)], 2),
+                'max': round(timings[-1], 2),
+            },
+            'queries': {'first': queries[0], 'last': queries[-1]},
+            'peak_memory_kb': 0,
+            'median_ms_by_length': {
+                size: round(statistics.median(values), 2) for size, values in sorted(by_length.items())
+            },
+        }
+        self.stdout.write(
+            f"{mode:8} {kind:6}: {result['keystrokes']} teclas, mediana {result['wall_ms']['median']} ms, "
+            f"p95 {result['wall_ms']['p95']} ms, máx {result['wall_ms']['max']} ms"
+        )
+        return result
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.models import Organization
+from apps.customers.importer import IMPORT_BATCH_SIZE, import_customers
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa clientes desde un CSV a un negocio (mismo proceso que la pantalla Importar): '
+        'valida, descarta duplicados por teléfono/DNI y respeta el límite de clientes del plan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Ruta del archivo CSV')
+        parser.add_argument('--organization', type=int, required=True, help='ID del negocio')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Filas por lote')
+
+    def handle(self, *args, **options):
+        organization = Organization.objects.filter(pk=options['organization']).first()
+        if organization is None:
+            raise CommandError(f"No existe el negocio {options['organization']}")
+
+        start = time.perf_counter()
+
+        def progress(result):
+            self.stdout.write(
+                f"  {result['rows']} filas: {result['created']} creados, {result['duplicates']} duplicados, "
+                f"{result['invalid']} con errores ({time.perf_counter() - start:.1f} s)"
+            )
+
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_customers(organization, stream, batch_size=options['batch_size'], progress=progress)
+        except OSError as exc:
+            raise CommandError(f"No se pudo leer {options['path']}: {exc}")
+
+        for line, message in result['errors']:
+            self.stdout.write(self.style.WARNING(f"  Línea {line}: {message}"))
+        if result['limit_reached']:
+            self.stdout.write(self.style.WARNING('Límite de clientes del plan alcanzado: el resto del archivo no se importó.'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Importación terminada: {result['created']} clientes creados de {result['rows']} filas "
+            f"en {time.perf_counter() - start:.1f} s"
+        ))
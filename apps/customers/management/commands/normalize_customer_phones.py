@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.models import Organization
+from apps.customers.phones import backfill_normalized, find_collisions, merge_customers
+
+
+class Command(BaseCommand):
+    help = (
+        'Completa el teléfono normalizado de los clientes y reporta los que comparten teléfono '
+        'dentro de un negocio. Con --merge los une en el más antiguo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto todos)')
+        parser.add_argument('--merge', action='store_true', help='Une cada grupo de duplicados en el cliente más antiguo')
+
+    def handle(self, *args, **options):
+        organization = None
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"No existe el negocio {options['organization']}")
+
+        collisions = find_collisions(organization)
+        for (organization_id, normalized), customers in sorted(collisions.items()):
+            listed = ', '.join(f"#{c.pk} {c.full_name} ({c.phone})" for c in customers)
+            self.stdout.write(f"Negocio {organization_id}, teléfono {normalized}: {listed}")
+            if options['merge']:
+                merge_customers(customers[0], customers[1:])
+
+        changed = backfill_normalized(organization)
+        self.stdout.write(f'Teléfonos normalizados actualizados: {changed}')
+
+        if not collisions:
+            self.stdout.write(self.style.SUCCESS('Sin teléfonos duplicados'))
+        elif options['merge']:
+            merged = sum(len(customers) - 1 for customers in collisions.values())
+            self.stdout.write(self.style.SUCCESS(f'Grupos unidos: {len(collisions)} ({merged} clientes duplicados eliminados)'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'Grupos con teléfono duplicado: {len(collisions)} (sin teléfono normalizado hasta unirlos con --merge)'
+            ))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.models import Organization
+from apps.customers.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula el índice de búsqueda de clientes (search_text y tokens). Necesario tras cargas '
+        'masivas que no pasan por Customer.save() o al cambiar las reglas de customers.search.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto todos)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Clientes por lote')
+
+    def handle(self, *args, **options):
+        organization = None
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"No existe el negocio {options['organization']}")
+
+        start = time.perf_counter()
+        customers, tokens = rebuild_search_index(organization, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido: {customers} clientes, {tokens} tokens en {time.perf_counter() - start:.1f} s'
+        ))
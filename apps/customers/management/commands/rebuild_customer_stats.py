@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.models import Organization
+from apps.customers.stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula el ADN de los clientes (CustomerStats) desde el historial de sellos y puntos, por lotes. '
+        'Necesario tras cargas masivas de transacciones que no pasan por save() o al cambiar las reglas de customers.stats.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto todos)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Clientes por lote')
+
+    def handle(self, *args, **options):
+        organization = None
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+            if organization is None:
+                raise CommandError(f"No existe el negocio {options['organization']}")
+
+        start = time.perf_counter()
+        customers, with_visits = rebuild_customer_stats(organization, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'ADN recalculado: {customers} clientes ({with_visits} con visitas) en {time.perf_counter() - start:.1f} s'
+        ))
@@ -1,58 +1,79 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
-from apps.customers.models import Customer
 from apps.campaigns.models import NotificationConfig
-from apps.campaigns.utils import send_whatsapp_message, send_email_notification, format_message
+from apps.customers.birthdays import birthday_q, tenant_today
+from apps.customers.models import Customer
+from apps.campaigns.outbox import build_notification, enqueue_notifications
+from apps.campaigns.utils import format_message
 import logging
+import zoneinfo
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Envía saludos de cumpleaños automáticos a los clientes.'
+    help = (
+        'Encola saludos de cumpleaños automáticos a los clientes (los envía dispatch_notifications). '
+        'Cada negocio usa su propia fecha local; se puede ejecutar cada hora con --min-hour.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-hour', type=int, default=0,
+            help='Solo saluda en los negocios donde ya son al menos estas horas (ej: 9 con un cron horario)'
+        )
 
     def handle(self, *args, **options):
-        today = timezone.localtime().date()
-        
-        # 1. Buscar clientes que celebran cumpleaños hoy
-        # Filtramos por día y mes únicamente
-        celebrants = Customer.objects.filter(
-            birth_day=today.day,
-            birth_month=today.month,
-            is_active=True
-        ).select_related('organization')
-        
-        counts = {'whatsapp': 0, 'email': 0, 'errors': 0}
-        
-        for customer in celebrants:
-            # Intentar obtener config de notificaciones del negocio
-            try:
-                config = NotificationConfig.objects.get(organization=customer.organization)
-            except NotificationConfig.DoesNotExist:
-                continue
+        counts = {'whatsapp': 0, 'email': 0}
+        messages = []
 
-            # Saltar si no está habilitado
-            if not config.birthday_enabled:
+        # Solo negocios con saludos activos; cada uno con su fecha local
+        configs = NotificationConfig.objects.filter(birthday_enabled=True).select_related('organization')
+        for config in configs:
+            organization = config.organization
+            if options['min_hour'] and self.local_hour(organization) < options['min_hour']:
                 continue
-            
-            message = format_message(config.birthday_template, customer)
-            
-            # --- Enviar por WhatsApp ---
-            if customer.phone and config.whatsapp_api_url:
-                if send_whatsapp_message(config, customer.phone, message):
+            today = tenant_today(organization)
+
+            # 1. Buscar clientes que celebran cumpleaños hoy (índice por birth_ordinal)
+            celebrants = Customer.objects.filter(
+                birthday_q(today), organization=organization, is_active=True
+            )
+
+            for customer in celebrants:
+                # format_message lee customer.organization.name: se reutiliza el negocio ya cargado
+                customer.organization = organization
+                message = format_message(config.birthday_template, customer)
+                # Un saludo por canal y año aunque el comando se ejecute varias veces el mismo día
+                key = f"{customer.pk}:{today.year}"
+
+                # --- WhatsApp ---
+                if customer.phone and config.whatsapp_api_url:
+                    messages.append(build_notification(
+                        customer.organization_id, 'WHATSAPP', customer.phone, message,
+                        kind='birthday', dedupe_key=f"birthday:wa:{key}", customer=customer,
+                    ))
                     counts['whatsapp'] += 1
-                    logger.info(f"Cumpleaños WA enviado a {customer.full_name}")
-                else:
-                    counts['errors'] += 1
-
-            # --- Enviar por Correo ---
-            if customer.email and config.email_enabled:
-                subject = f"¡Feliz Cumpleaños, {customer.first_name}! 🎂"
-                if send_email_notification(config, customer.email, subject, message):
+
+                # --- Correo ---
+                if customer.email and config.email_enabled:
+                    subject = f"¡Feliz Cumpleaños, {customer.first_name}! 🎂"
+                    messages.append(build_notification(
+                        customer.organization_id, 'EMAIL', customer.email, message, subject=subject,
+                        kind='birthday', dedupe_key=f"birthday:email:{key}", customer=customer,
+                    ))
                     counts['email'] += 1
-                    logger.info(f"Cumpleaños Email enviado a {customer.full_name}")
-                else:
-                    counts['errors'] += 1
+
+        with transaction.atomic():
+            for start in range(0, len(messages), 500):
+                enqueue_notifications(messages[start:start + 500])
 
         self.stdout.write(self.style.SUCCESS(
-            f"Proceso de cumpleaños completado. WA: {counts['whatsapp']}, Email: {counts['email']}, Errores: {counts['errors']}"
+            f"Proceso de cumpleaños completado. Encolados WA: {counts['whatsapp']}, Email: {counts['email']}"
         ))
+
+    def local_hour(self, organization):
+        try:
+            return timezone.now().astimezone(zoneinfo.ZoneInfo(organization.timezone)).hour
+        except Exception:
+            return timezone.localtime().hour
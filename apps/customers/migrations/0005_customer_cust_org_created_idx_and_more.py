@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_organization_custom_background_color_and_more'),
+        ('customers', '0004_customer_dni'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['organization', '-created_at'], name='cust_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['organization', 'phone'], name='cust_org_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['organization', 'birth_month', 'birth_day'], name='cust_org_birthday_idx'),
+        ),
+    ]
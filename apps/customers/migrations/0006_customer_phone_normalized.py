@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_customer_cust_org_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, verbose_name='Teléfono normalizado'),
+        ),
+    ]
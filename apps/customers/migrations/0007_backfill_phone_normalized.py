@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:52
+
+from django.db import migrations
+
+from apps.customers.phones import normalize_phone
+
+
+def backfill_phone_normalized(apps, schema_editor):
+    """
+    Completa phone_normalized. Si varios clientes del mismo negocio comparten
+    teléfono, solo el más antiguo lo recibe; los demás quedan en NULL hasta
+    unirlos con `manage.py normalize_customer_phones --merge`.
+    """
+    Customer = apps.get_model('customers', 'Customer')
+
+    seen = set()
+    batch = []
+    customers = Customer.objects.exclude(phone__isnull=True).exclude(phone='').order_by('created_at', 'pk')
+    for customer in customers.only('pk', 'organization_id', 'phone').iterator(chunk_size=1000):
+        normalized = normalize_phone(customer.phone)
+        if not normalized or (customer.organization_id, normalized) in seen:
+            continue
+        seen.add((customer.organization_id, normalized))
+        customer.phone_normalized = normalized
+        batch.append(customer)
+        if len(batch) >= 1000:
+            Customer.objects.bulk_update(batch, ['phone_normalized'])
+            batch = []
+    if batch:
+        Customer.objects.bulk_update(batch, ['phone_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0006_customer_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_phone_normalized, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0007_backfill_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='cust_org_phone_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='customer',
+            constraint=models.UniqueConstraint(fields=('organization', 'phone_normalized'), name='cust_org_phone_norm_uniq'),
+        ),
+    ]
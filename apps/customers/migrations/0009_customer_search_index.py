@@ -0,0 +1,39 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestmetric'),
+        ('customers', '0008_customer_cust_org_phone_norm_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.CreateModel(
+            name='CustomerSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=10)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='customers.customer')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.organization')),
+            ],
+            options={
+                'verbose_name': 'Token de búsqueda',
+                'verbose_name_plural': 'Tokens de búsqueda',
+                'indexes': [models.Index(fields=['token', 'organization', 'weight', 'customer'], name='cust_search_token_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='customersearchtoken',
+            constraint=models.UniqueConstraint(fields=('customer', 'token'), name='cust_search_token_uniq'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:47
+
+from django.db import migrations
+
+from apps.customers.search import build_search_text, customer_tokens
+
+
+def backfill_search_index(apps, schema_editor):
+    """search_text y tokens de los clientes existentes (igual que rebuild_customer_search)"""
+    Customer = apps.get_model('customers', 'Customer')
+    CustomerSearchToken = apps.get_model('customers', 'CustomerSearchToken')
+
+    last_pk = 0
+    while True:
+        chunk = list(Customer.objects.filter(pk__gt=last_pk).order_by('pk')[:1000])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        for customer in chunk:
+            customer.search_text = build_search_text(customer)
+        Customer.objects.bulk_update(chunk, ['search_text'])
+        CustomerSearchToken.objects.bulk_create([
+            CustomerSearchToken(organization_id=customer.organization_id, customer_id=customer.pk, token=token, weight=weight)
+            for customer in chunk
+            for token, weight in customer_tokens(customer).items()
+        ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0009_customer_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestmetric'),
+        ('customers', '0010_backfill_customer_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='cust_org_birthday_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['organization', 'birth_month', 'birth_day', '-created_at'], name='cust_org_birthday_idx'),
+        ),
+    ]
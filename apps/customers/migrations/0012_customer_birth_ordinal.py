@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:31
+
+from django.db import migrations, models
+
+from apps.customers.birthdays import birth_ordinal
+
+
+def backfill_birth_ordinal(apps, schema_editor):
+    Customer = apps.get_model('customers', 'Customer')
+
+    # Un UPDATE por fecha (a lo sumo 366) en lugar de uno por cliente; sin el
+    # ordering por defecto, que agregaría created_at al DISTINCT
+    dates = Customer.objects.filter(
+        birth_month__isnull=False, birth_day__isnull=False
+    ).order_by().values_list('birth_month', 'birth_day').distinct()
+    for month, day in list(dates):
+        Customer.objects.filter(birth_month=month, birth_day=day).update(birth_ordinal=birth_ordinal(month, day))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0011_customer_birthday_idx_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='birth_ordinal',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_birth_ordinal, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='cust_org_birthday_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['organization', 'birth_ordinal', '-created_at'], name='cust_org_birthday_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestmetric'),
+        ('customers', '0012_customer_birth_ordinal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visit_count', models.PositiveIntegerField(default=0, verbose_name='Visitas')),
+                ('first_visit_at', models.DateTimeField(blank=True, null=True, verbose_name='Primera visita')),
+                ('last_visit_at', models.DateTimeField(blank=True, null=True, verbose_name='Última visita')),
+                ('mean_interval_days', models.FloatField(blank=True, null=True, verbose_name='Días entre visitas (media)')),
+                ('median_interval_days', models.FloatField(blank=True, null=True, verbose_name='Días entre visitas (mediana)')),
+                ('interval_counts', models.JSONField(blank=True, default=dict)),
+                ('service_counts', models.JSONField(blank=True, default=dict)),
+                ('favorite_service', models.CharField(blank=True, max_length=255, verbose_name='Servicio favorito')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='customers.customer', verbose_name='Cliente')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.organization')),
+            ],
+            options={
+                'verbose_name': 'Estadísticas del cliente',
+                'verbose_name_plural': 'Estadísticas de clientes',
+                'indexes': [models.Index(fields=['organization', 'last_visit_at'], name='cust_stats_org_last_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-17 22:05
+
+from django.db import migrations
+
+from apps.customers.stats import compute_stats, customer_visits
+
+
+def backfill_customer_stats(apps, schema_editor):
+    """Estadísticas de los clientes con visitas (igual que rebuild_customer_stats)"""
+    Customer = apps.get_model('customers', 'Customer')
+    CustomerStats = apps.get_model('customers', 'CustomerStats')
+    StampTransaction = apps.get_model('stamps', 'StampTransaction')
+    PointTransaction = apps.get_model('loyalty', 'PointTransaction')
+
+    last_pk = 0
+    while True:
+        chunk = dict(Customer.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'organization_id')[:1000])
+        if not chunk:
+            break
+        last_pk = max(chunk)
+        visits = customer_visits(list(chunk), StampTransaction, PointTransaction)
+        CustomerStats.objects.bulk_create([
+            compute_stats(CustomerStats, chunk[customer_id], customer_id, entries)
+            for customer_id, entries in visits.items()
+        ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0013_customer_stats'),
+        ('stamps', '0012_move_notified_flags_to_outbox'),
+        ('loyalty', '0002_pointtransaction_points_org_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+    ]
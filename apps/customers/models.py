@@ -1,6 +1,9 @@
 
 from django.db import models
 from apps.core.models import TenantAwareModel
+from .birthdays import birth_ordinal
+from .phones import normalize_phone
+from .search import MAX_PREFIX, build_search_text
 
 class Tag(TenantAwareModel):
     """
@@ -25,10 +28,16 @@ class Customer(TenantAwareModel):
     last_name = models.CharField(max_length=150, verbose_name="Apellidos")
     email = models.EmailField(blank=True, null=True, verbose_name="Correo Electrónico")
     phone = models.CharField(max_length=20, blank=True, null=True, verbose_name="Teléfono / WhatsApp")
+    # Solo dígitos con prefijo de país (customers.phones.normalize_phone); se calcula al guardar
+    phone_normalized = models.CharField(max_length=20, blank=True, null=True, editable=False, verbose_name="Teléfono normalizado")
     dni = models.CharField(max_length=20, blank=True, null=True, verbose_name="DNI/ID", db_index=True)
     birth_day = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="Día de Nacimiento")
     birth_month = models.PositiveSmallIntegerField(blank=True, null=True, verbose_name="Mes de Nacimiento")
     birth_year = models.PositiveIntegerField(blank=True, null=True, verbose_name="Año de Nacimiento")
+    # Día del año del cumpleaños sobre un año bisiesto (customers.birthdays); se calcula al guardar
+    birth_ordinal = models.PositiveSmallIntegerField(blank=True, null=True, editable=False)
+    # Campos buscables normalizados (customers.search); los tokens van en CustomerSearchToken
+    search_text = models.TextField(blank=True, default='', editable=False)
     
     # Datos internos
     notes = models.TextField(blank=True, verbose_name="Notas Internas")
@@ -43,10 +52,40 @@ class Customer(TenantAwareModel):
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
         ordering = ['-created_at']
+        indexes = [
+            # Listado de clientes del negocio (orden por defecto)
+            models.Index(fields=['organization', '-created_at'], name='cust_org_created_idx'),
+            # Cumpleañeros de hoy y ventanas de días (rangos de birth_ordinal); con created_at,
+            # el primer grupo del listado sale ya ordenado
+            models.Index(fields=['organization', 'birth_ordinal', '-created_at'], name='cust_org_birthday_idx'),
+        ]
+        constraints = [
+            # Búsqueda por teléfono (QR, consulta de sellos, login de clientes) y sin duplicados.
+            # NULL (sin teléfono) puede repetirse.
+            models.UniqueConstraint(fields=['organization', 'phone_normalized'], name='cust_org_phone_norm_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
 
+    # Campos de los que dependen phone_normalized / search_text
+    SEARCH_FIELDS = {'first_name', 'last_name', 'email', 'phone', 'dni'}
+    BIRTHDAY_FIELDS = {'birth_day', 'birth_month'}
+
+    def save(self, *args, **kwargs):
+        self.phone_normalized = normalize_phone(self.phone)
+        self.search_text = build_search_text(self)
+        self.birth_ordinal = birth_ordinal(self.birth_month, self.birth_day)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if self.SEARCH_FIELDS & update_fields:
+                update_fields |= {'phone_normalized', 'search_text'}
+            if self.BIRTHDAY_FIELDS & update_fields:
+                update_fields.add('birth_ordinal')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
@@ -66,3 +105,60 @@ class Customer(TenantAwareModel):
         if self.birth_year:
             display += f" {self.birth_year}"
         return display
+
+
+class CustomerSearchToken(models.Model):
+    """
+    Prefijos de las palabras buscables de un cliente (customers.search).
+    Se reemplazan al guardar el cliente si cambia su search_text.
+    """
+    organization = models.ForeignKey('core.Organization', on_delete=models.CASCADE, related_name='+')
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='search_tokens')
+    token = models.CharField(max_length=MAX_PREFIX)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Token de búsqueda"
+        verbose_name_plural = "Tokens de búsqueda"
+        indexes = [
+            # token = 'mar' AND negocio = X ORDER BY peso DESC: resultados ya ordenados
+            models.Index(fields=['token', 'organization', 'weight', 'customer'], name='cust_search_token_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'token'], name='cust_search_token_uniq'),
+        ]
+
+    def __str__(self):
+        return self.token
+
+
+class CustomerStats(models.Model):
+    """
+    ADN del cliente (customers.stats): visitas, frecuencia y servicio
+    favorito. Se actualiza al registrar sellos o puntos; el perfil y los
+    segmentos ("inactivos") leen solo esta fila.
+    """
+    organization = models.ForeignKey('core.Organization', on_delete=models.CASCADE, related_name='+')
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, related_name='stats', verbose_name="Cliente")
+    visit_count = models.PositiveIntegerField(default=0, verbose_name="Visitas")
+    first_visit_at = models.DateTimeField(null=True, blank=True, verbose_name="Primera visita")
+    last_visit_at = models.DateTimeField(null=True, blank=True, verbose_name="Última visita")
+    mean_interval_days = models.FloatField(null=True, blank=True, verbose_name="Días entre visitas (media)")
+    median_interval_days = models.FloatField(null=True, blank=True, verbose_name="Días entre visitas (mediana)")
+    # {días entre visitas consecutivas: veces}
+    interval_counts = models.JSONField(default=dict, blank=True)
+    # {promoción o servicio: visitas}
+    service_counts = models.JSONField(default=dict, blank=True)
+    favorite_service = models.CharField(max_length=255, blank=True, verbose_name="Servicio favorito")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Estadísticas del cliente"
+        verbose_name_plural = "Estadísticas de clientes"
+        indexes = [
+            # Segmentos por última visita ("inactivos hace más de 30 días")
+            models.Index(fields=['organization', 'last_visit_at'], name='cust_stats_org_last_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id}: {self.visit_count} visitas"
@@ -0,0 +1,185 @@
+"""
+Teléfonos normalizados de clientes.
+
+`Customer.phone` guarda lo que escribió el usuario ("999 888 777",
+"+51 999888777"...). `Customer.phone_normalized` guarda solo dígitos con el
+prefijo de país aplicado según PHONE_COUNTRY_CODE / PHONE_NATIONAL_LENGTH, y
+es único por negocio (cust_org_phone_norm_uniq): los flujos públicos (QR,
+consulta de sellos, login de clientes) buscan por esa columna.
+
+`merge_customers` une clientes duplicados (mismo teléfono normalizado) en el
+más antiguo; lo usa `manage.py normalize_customer_phones --merge`.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_phone(raw):
+    """
+    Solo dígitos, con el prefijo de país del sistema:
+    "+51 999-888-777" -> "51999888777", "999 888 777" -> "51999888777",
+    "0051999888777" -> "51999888777". Retorna None si no hay dígitos.
+    Los números con "+" o "00" ya son internacionales y no se tocan.
+    """
+    if not raw:
+        return None
+    raw = str(raw).strip()
+    digits = ''.join(ch for ch in raw if ch.isdigit())
+    if not digits:
+        return None
+    if raw.startswith('+'):
+        return digits
+    if digits.startswith('00'):
+        return digits[2:] or None
+
+    country = settings.PHONE_COUNTRY_CODE
+    if country and len(digits) == settings.PHONE_NATIONAL_LENGTH:
+        return country + digits
+    return digits
+
+
+def find_by_phone(organization, raw):
+    """Cliente del negocio con ese teléfono (cualquier formato), o None"""
+    normalized = normalize_phone(raw)
+    if not normalized:
+        return None
+    from .models import Customer
+    return Customer.objects.filter(organization=organization, phone_normalized=normalized).first()
+
+
+def _merge_open_cards(customer_ids):
+    """
+    Antes de mover las tarjetas al cliente que se conserva, une las tarjetas
+    abiertas de una misma promoción (stamps_one_open_card): los sellos se
+    suman en la más antigua y su historial se traslada a ella.
+    """
+    from apps.stamps.models import StampCard, StampTransaction
+
+    groups = {}
+    for card in StampCard.objects.filter(
+        customer_id__in=customer_ids, is_completed=False, is_redeemed=False, expired=False
+    ).select_related('promotion').order_by('created_at', 'pk'):
+        groups.setdefault(card.promotion_id, []).append(card)
+
+    for cards in groups.values():
+        if len(cards) < 2:
+            continue
+        keeper, others = cards[0], cards[1:]
+        stamps = sum(card.current_stamps for card in cards)
+        StampCard.objects.filter(pk=keeper.pk).update(
+            current_stamps=stamps,
+            is_completed=stamps >= keeper.promotion.total_stamps_needed,
+            last_stamp_at=max(card.last_stamp_at for card in cards),
+        )
+        other_ids = [card.pk for card in others]
+        StampTransaction.objects.filter(card_id__in=other_ids).update(card_id=keeper.pk)
+        StampCard.objects.filter(pk__in=other_ids).delete()
+
+
+# Datos que el cliente conservado toma de los duplicados si no los tiene
+MERGE_FIELDS = ('last_name', 'email', 'dni', 'birth_day', 'birth_month', 'birth_year')
+
+
+def merge_customers(keeper, duplicates):
+    """
+    Une `duplicates` en `keeper`: tarjetas, historial, canjes, logs y
+    etiquetas pasan a `keeper` (todas las relaciones hacia Customer, sin
+    listarlas a mano), completa sus datos vacíos y borra los duplicados.
+    """
+    from .models import Customer, CustomerSearchToken, CustomerStats
+    from .stats import rebuild_customer_stats
+
+    duplicate_ids = [c.pk for c in duplicates if c.pk != keeper.pk]
+    if not duplicate_ids:
+        return keeper
+
+    with transaction.atomic():
+        # Filas completas y bloqueadas (pueden venir de consultas con .only())
+        locked = {c.pk: c for c in Customer.objects.select_for_update().filter(pk__in=[keeper.pk] + duplicate_ids)}
+        keeper = locked[keeper.pk]
+        duplicates = [locked[pk] for pk in duplicate_ids if pk in locked]
+        _merge_open_cards([keeper.pk] + duplicate_ids)
+
+        for relation in Customer._meta.related_objects:
+            # Tokens y estadísticas se borran con los duplicados y se recalculan abajo
+            if relation.many_to_many or relation.related_model in (CustomerSearchToken, CustomerStats):
+                continue
+            relation.related_model._base_manager.filter(
+                **{f"{relation.field.name}__in": duplicate_ids}
+            ).update(**{relation.field.name: keeper})
+
+        for duplicate in duplicates:
+            keeper.tags.add(*duplicate.tags.all())
+            for field in MERGE_FIELDS:
+                if not getattr(keeper, field) and getattr(duplicate, field):
+                    setattr(keeper, field, getattr(duplicate, field))
+            if duplicate.notes:
+                keeper.notes = f"{keeper.notes}\n{duplicate.notes}".strip()
+            keeper.is_active = keeper.is_active or duplicate.is_active
+
+        # Borrar antes de guardar: el teléfono normalizado del duplicado ya no bloquea
+        for duplicate in duplicates:
+            duplicate.delete()
+        keeper.save()
+        # ADN con el historial unido
+        rebuild_customer_stats(customer_ids=[keeper.pk])
+
+    logger.info(f"Clientes {duplicate_ids} unidos en {keeper.pk} ({keeper})")
+    return keeper
+
+
+def find_collisions(organization=None):
+    """
+    Grupos de clientes cuyo teléfono normaliza igual dentro del negocio.
+    Retorna {(organization_id, normalizado): [clientes, del más antiguo al más nuevo]}.
+    """
+    from .models import Customer
+
+    customers = Customer.objects.exclude(phone__isnull=True).exclude(phone='')
+    if organization is not None:
+        customers = customers.filter(organization=organization)
+
+    groups = {}
+    for customer in customers.order_by('created_at', 'pk').only(
+        'pk', 'organization_id', 'phone', 'phone_normalized', 'first_name', 'last_name', 'created_at'
+    ).iterator(chunk_size=2000):
+        normalized = normalize_phone(customer.phone)
+        if normalized:
+            groups.setdefault((customer.organization_id, normalized), []).append(customer)
+    return {key: group for key, group in groups.items() if len(group) > 1}
+
+
+def backfill_normalized(organization=None, chunk_size=1000):
+    """
+    Completa/corrige phone_normalized de los clientes sin colisión (los
+    grupos en colisión quedan para merge_customers). Retorna cuántos cambió.
+    """
+    from .models import Customer
+
+    customers = Customer.objects.all()
+    if organization is not None:
+        customers = customers.filter(organization=organization)
+    blocked = set(find_collisions(organization))
+
+    changed = []
+    for customer in customers.only('pk', 'organization_id', 'phone', 'phone_normalized').iterator(chunk_size=chunk_size):
+        normalized = normalize_phone(customer.phone)
+        if normalized == customer.phone_normalized:
+            continue
+        if normalized and (customer.organization_id, normalized) in blocked:
+            continue
+        customer.phone_normalized = normalized
+        changed.append(customer)
+
+    with transaction.atomic():
+        # Primero se liberan los valores viejos: un cliente puede tomar el que otro deja
+        ids = [c.pk for c in changed]
+        for start in range(0, len(ids), chunk_size):
+            Customer.objects.filter(pk__in=ids[start:start + chunk_size]).update(phone_normalized=None)
+        for start in range(0, len(changed), chunk_size):
+            Customer.objects.bulk_update(changed[start:start + chunk_size], ['phone_normalized'])
+    return len(changed)
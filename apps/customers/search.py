@@ -0,0 +1,239 @@
+"""
+Índice de búsqueda de clientes.
+
+Los buscadores (API del autocompletado, listado de clientes, tarjetas,
+solicitudes QR y buscador maestro) usaban `icontains` sobre nombre, apellido,
+teléfono y correo: un `LIKE '%q%'` que recorre todos los clientes del negocio
+en cada tecla. Ahora consultan `search_customers` / `search_customer_ids`:
+
+- `Customer.search_text`: nombre, apellido, correo, teléfono y DNI en
+  minúsculas y sin tildes ("José Pérez" -> "jose perez"), calculado al guardar.
+- `CustomerSearchToken`: los prefijos (hasta MAX_PREFIX caracteres) de cada
+  palabra, con un peso por campo. Buscar "mar" es una igualdad `token = 'mar'`
+  sobre el índice (token, negocio, peso, cliente), que además entrega los
+  resultados ya ordenados para cortar en `limit`.
+
+Los términos más largos que MAX_PREFIX se buscan por su prefijo y se
+confirman contra `search_text`. Una consulta de solo dígitos ("+51 999 88")
+se trata como un único número (prefijo del teléfono o DNI); del teléfono
+también se indexan los últimos 4 dígitos.
+"""
+import re
+import unicodedata
+
+from django.db import connection, models, transaction
+
+# Largo máximo de los prefijos indexados
+MAX_PREFIX = 10
+# Resultados por defecto de search_customers
+SEARCH_LIMIT = 10
+# Términos considerados por consulta
+MAX_TERMS = 5
+
+# Peso de cada campo; una palabra completa suma 1 sobre su prefijo
+WEIGHT_NAME = 3
+WEIGHT_NUMBER = 2
+WEIGHT_EMAIL = 1
+
+_NUMBER_QUERY = re.compile(r'^[\d\s+\-().]+$')
+_WORD = re.compile(r'[^\W_]+')
+
+
+def fold(text):
+    """Minúsculas y sin tildes ni diacríticos: "Ñuñez Óscar" -> "nunez oscar" """
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def _digits(text):
+    return ''.join(ch for ch in str(text or '') if ch.isdigit())
+
+
+def build_search_text(customer):
+    """Texto normalizado de los campos buscables"""
+    parts = [
+        customer.first_name, customer.last_name, customer.email,
+        _digits(customer.phone), customer.phone_normalized, customer.dni,
+    ]
+    return ' '.join(fold(part) for part in parts if part)
+
+
+def customer_tokens(customer):
+    """{token: peso} del cliente: prefijos de cada palabra con el peso de su campo"""
+    tokens = {}
+
+    def add(word, weight):
+        word = word[:MAX_PREFIX + 1]
+        for size in range(1, min(len(word), MAX_PREFIX) + 1):
+            token = word[:size]
+            # La palabra completa pesa más que un prefijo
+            value = weight * 2 + (1 if size == len(word) else 0)
+            if tokens.get(token, 0) < value:
+                tokens[token] = value
+
+    for word in _WORD.findall(fold(f"{customer.first_name or ''} {customer.last_name or ''}")):
+        add(word, WEIGHT_NAME)
+
+    phone = _digits(customer.phone)
+    for number in {phone, customer.phone_normalized or '', fold(customer.dni)}:
+        for word in _WORD.findall(number):
+            add(word, WEIGHT_NUMBER)
+    if len(phone) > 4:
+        add(phone[-4:], WEIGHT_NUMBER)
+
+    if customer.email:
+        for word in _WORD.findall(fold(customer.email.split('@')[0])):
+            add(word, WEIGHT_EMAIL)
+    return tokens
+
+
+def index_customers(customers, created=False):
+    """
+    Reemplaza los tokens de los clientes dados (instancias ya guardadas).
+    `created=True` (clientes recién insertados) omite el borrado previo.
+
+    Cada cliente genera decenas de tokens: se insertan con INSERT de varias
+    filas armados a mano, sin instanciar un modelo por token (bulk_create
+    es varias veces más lento con cientos de miles de filas).
+    """
+    from .models import CustomerSearchToken
+
+    customers = list(customers)
+    if not customers:
+        return 0
+    rows = [
+        (customer.organization_id, customer.pk, token, weight)
+        for customer in customers
+        for token, weight in customer_tokens(customer).items()
+    ]
+    quote = connection.ops.quote_name
+    columns = ('organization_id', 'customer_id', 'token', 'weight')
+    insert = 'INSERT INTO %s (%s) VALUES ' % (
+        quote(CustomerSearchToken._meta.db_table), ', '.join(quote(column) for column in columns)
+    )
+    batch_size = min(connection.ops.bulk_batch_size(columns, rows), 2000)
+    with transaction.atomic():
+        if not created:
+            CustomerSearchToken.objects.filter(customer_id__in=[c.pk for c in customers]).delete()
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                chunk = rows[start:start + batch_size]
+                cursor.execute(
+                    insert + ', '.join(['(%s, %s, %s, %s)'] * len(chunk)),
+                    [value for row in chunk for value in row],
+                )
+    return len(rows)
+
+
+def rebuild_search_index(organization=None, chunk_size=1000):
+    """
+    Recalcula search_text y los tokens de todos los clientes (o de un
+    negocio) por lotes. Retorna (clientes, tokens).
+    """
+    from .models import Customer
+
+    customers = Customer.objects.order_by('pk').only(
+        'pk', 'organization_id', 'first_name', 'last_name', 'email', 'phone', 'phone_normalized', 'dni', 'search_text'
+    )
+    if organization is not None:
+        customers = customers.filter(organization=organization)
+
+    total_customers = total_tokens = 0
+    last_pk = 0
+    while True:
+        chunk = list(customers.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            break
+        last_pk = chunk[-1].pk
+        stale = []
+        for customer in chunk:
+            search_text = build_search_text(customer)
+            if customer.search_text != search_text:
+                customer.search_text = search_text
+                stale.append(customer)
+        with transaction.atomic():
+            if stale:
+                Customer.objects.bulk_update(stale, ['search_text'])
+            total_tokens += index_customers(chunk)
+        total_customers += len(chunk)
+    return total_customers, total_tokens
+
+
+def query_terms(query):
+    """Términos de búsqueda normalizados igual que los tokens"""
+    query = (query or '').strip()
+    if _NUMBER_QUERY.match(query):
+        digits = _digits(query)
+        return [digits] if digits else []
+    terms = []
+    for word in _WORD.findall(fold(query)):
+        if word not in terms:
+            terms.append(word)
+    return terms[:MAX_TERMS]
+
+
+def _matches(organization, terms):
+    """
+    Filas del término más selectivo (el más largo) cuyos clientes también
+    tienen los demás términos; con varios términos, `rank` suma sus pesos.
+    Los demás se buscan con una subconsulta por cliente sobre
+    cust_search_token_uniq, sin agrupar todas las filas de prefijos cortos.
+    """
+    from .models import CustomerSearchToken
+
+    prefixes = sorted({term[:MAX_PREFIX] for term in terms}, key=len, reverse=True)
+    tokens = CustomerSearchToken.objects.filter(token=prefixes[0])
+    if organization is not None:
+        tokens = tokens.filter(organization=organization)
+    for term in terms:
+        if len(term) > MAX_PREFIX:
+            tokens = tokens.filter(customer__search_text__contains=term)
+    if len(prefixes) == 1:
+        return tokens
+
+    rank = models.F('weight')
+    for index, prefix in enumerate(prefixes[1:]):
+        name = f'weight_{index}'
+        tokens = tokens.annotate(**{name: models.Subquery(
+            CustomerSearchToken.objects.filter(customer_id=models.OuterRef('customer_id'), token=prefix).values('weight')[:1]
+        )}).filter(**{f'{name}__isnull': False})
+        rank = rank + models.F(name)
+    return tokens.annotate(rank=rank)
+
+
+def search_customer_ids(organization, query):
+    """
+    IDs (como subconsulta) de los clientes que coinciden con todos los
+    términos, para filtrar listados: `customer_id__in=search_customer_ids(...)`.
+    `organization=None` busca en todos los negocios.
+    """
+    from .models import CustomerSearchToken
+
+    terms = query_terms(query)
+    if not terms:
+        return CustomerSearchToken.objects.none().values('customer_id')
+    return _matches(organization, terms).values('customer_id')
+
+
+def search_customers(organization, query, limit=SEARCH_LIMIT, queryset=None):
+    """
+    Clientes que coinciden con todos los términos de `query`, ordenados por
+    relevancia (nombre antes que teléfono antes que correo; palabra completa
+    antes que prefijo; luego los más recientes) y cortados en `limit`.
+    `queryset` permite pedir select_related/only sobre los clientes.
+    """
+    from .models import Customer
+
+    terms = query_terms(query)
+    if not terms:
+        return []
+    tokens = _matches(organization, terms)
+    # Un término: el índice entrega las filas ya ordenadas
+    order = ('-rank', '-customer_id') if 'rank' in tokens.query.annotations else ('-weight', '-customer_id')
+    ranked = tokens.order_by(*order).values_list('customer_id', flat=True)[:limit]
+
+    ids = list(ranked)
+    found = (queryset if queryset is not None else Customer.objects.all()).in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
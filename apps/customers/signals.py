@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from apps.core.models import Organization
+from apps.loyalty.models import PointTransaction
+from apps.stamps.models import StampTransaction
+from .models import Customer
+from .search import index_customers
+from .stats import rebuild_customer_stats, record_visits
+
+
+@receiver(post_save, sender=Customer)
+def customer_search_index_update(sender, instance, created, **kwargs):
+    """Tokens de búsqueda del cliente: solo si cambió algún campo buscable"""
+    if created or instance.has_changed('search_text'):
+        index_customers([instance], created=created)
+
+
+def _is_visit(instance):
+    """Sellos ADD y puntos EARN cuentan como visita"""
+    if isinstance(instance, StampTransaction):
+        return instance.action == 'ADD'
+    return instance.transaction_type == 'EARN'
+
+
+def _customer_id(instance):
+    return instance.card.customer_id if isinstance(instance, StampTransaction) else instance.customer_id
+
+
+@receiver(post_save, sender=StampTransaction)
+@receiver(post_save, sender=PointTransaction)
+def customer_stats_record_visit(sender, instance, created, **kwargs):
+    """Suma la visita al ADN del cliente (los bulk_create llaman a record_visits)"""
+    if not created or not _is_visit(instance):
+        return
+    service = instance.card.promotion.name if isinstance(instance, StampTransaction) else instance.description
+    record_visits([(instance.organization_id, _customer_id(instance), instance.created_at, service)])
+
+
+@receiver(post_delete, sender=StampTransaction)
+@receiver(post_delete, sender=PointTransaction)
+def customer_stats_undo_visit(sender, instance, origin=None, **kwargs):
+    """Visita deshecha: se recalcula el cliente desde su historial al confirmar"""
+    # Al borrar el cliente o el negocio sus estadísticas se borran en cascada
+    if isinstance(origin, (Customer, Organization)) or not _is_visit(instance):
+        return
+    customer_id = _customer_id(instance)
+    transaction.on_commit(lambda: rebuild_customer_stats(customer_ids=[customer_id]))
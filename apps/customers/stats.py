@@ -0,0 +1,194 @@
+"""
+ADN del cliente: estadísticas de visitas precalculadas.
+
+El perfil calculaba el ADN en cada vista: leía todos los sellos (ADD) y
+puntos (EARN) del cliente, ordenaba las fechas en Python y buscaba la
+promoción de cada sello (una consulta por transacción). Ahora se lee una
+fila de `CustomerStats` que se actualiza al registrar la visita:
+
+- Visita = transacción de sellos ADD o de puntos EARN (igual que antes).
+- `interval_counts` guarda {días entre visitas consecutivas: veces}; de ahí
+  salen la media y la mediana sin volver a leer el historial.
+- `service_counts` guarda {promoción o descripción: visitas}; el favorito es
+  el de más visitas (en empate se conserva el anterior).
+
+`record_visits` suma visitas nuevas (transacciones creadas con save() vía
+signals; los bulk_create lo llaman a mano). Deshacer una visita recalcula al
+cliente completo con `rebuild_customer_stats`, que también usa el comando
+del mismo nombre para un negocio entero por lotes.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+# Días sin venir para considerar inactivo a un cliente
+INACTIVE_DAYS = 30
+# Campos que actualizan record_visits y el recálculo
+STATS_FIELDS = (
+    'visit_count', 'first_visit_at', 'last_visit_at', 'mean_interval_days', 'median_interval_days',
+    'interval_counts', 'service_counts', 'favorite_service', 'updated_at',
+)
+
+
+def add_visit(stats, when, service):
+    """Suma una visita a `stats` (en memoria) y recalcula los resúmenes"""
+    if stats.last_visit_at is not None:
+        # Una visita anterior a la última (carrera entre peticiones) cuenta como el mismo día
+        days = str(max((when - stats.last_visit_at).days, 0))
+        stats.interval_counts[days] = stats.interval_counts.get(days, 0) + 1
+    if stats.first_visit_at is None or when < stats.first_visit_at:
+        stats.first_visit_at = when
+    if stats.last_visit_at is None or when > stats.last_visit_at:
+        stats.last_visit_at = when
+    stats.visit_count += 1
+
+    service = (service or '').strip()[:255]
+    if service:
+        stats.service_counts[service] = stats.service_counts.get(service, 0) + 1
+        if stats.service_counts[service] > stats.service_counts.get(stats.favorite_service, 0):
+            stats.favorite_service = service
+
+    _summarize_intervals(stats)
+
+
+def _summarize_intervals(stats):
+    """Media y mediana de días entre visitas a partir del histograma"""
+    intervals = sorted((int(days), count) for days, count in stats.interval_counts.items())
+    total = sum(count for _, count in intervals)
+    if not total:
+        stats.mean_interval_days = stats.median_interval_days = None
+        return
+    stats.mean_interval_days = round(sum(days * count for days, count in intervals) / total, 1)
+
+    def value_at(position):
+        seen = 0
+        for days, count in intervals:
+            seen += count
+            if position < seen:
+                return days
+
+    # Con un total par, promedio de los dos valores centrales
+    stats.median_interval_days = round((value_at((total - 1) // 2) + value_at(total // 2)) / 2, 1)
+
+
+def _new_stats(stats_model, organization_id, customer_id):
+    return stats_model(
+        organization_id=organization_id, customer_id=customer_id, visit_count=0,
+        interval_counts={}, service_counts={}, favorite_service='',
+    )
+
+
+def record_visits(visits):
+    """
+    Suma visitas recién registradas: [(organization_id, customer_id, fecha, servicio)].
+    Con la fila ya creada: SELECT ... FOR UPDATE y UPDATE; la primera visita
+    del cliente agrega un INSERT.
+    """
+    from .models import CustomerStats
+
+    by_customer = {}
+    for organization_id, customer_id, when, service in visits:
+        by_customer.setdefault(customer_id, (organization_id, []))[1].append((when, service))
+    if not by_customer:
+        return
+
+    with transaction.atomic():
+        # El bloqueo serializa las visitas simultáneas del mismo cliente
+        rows = {s.customer_id: s for s in CustomerStats.objects.select_for_update().filter(customer_id__in=by_customer)}
+        missing = [customer_id for customer_id in by_customer if customer_id not in rows]
+        if missing:
+            CustomerStats.objects.bulk_create(
+                [_new_stats(CustomerStats, by_customer[customer_id][0], customer_id) for customer_id in missing],
+                ignore_conflicts=True,
+            )
+            # Releer: otra petición pudo crear la fila entre medio
+            rows.update({s.customer_id: s for s in CustomerStats.objects.select_for_update().filter(customer_id__in=missing)})
+
+        for customer_id, stats in rows.items():
+            for when, service in sorted(by_customer[customer_id][1], key=lambda visit: visit[0]):
+                add_visit(stats, when, service)
+            stats.updated_at = timezone.now()
+        CustomerStats.objects.bulk_update(list(rows.values()), STATS_FIELDS)
+
+
+def customer_visits(customer_ids, stamp_model=None, point_model=None):
+    """
+    {customer_id: [(fecha, servicio), ...]} con las visitas de los clientes
+    dados, ordenadas por fecha. Dos consultas (sellos y puntos) por lote.
+    """
+    if stamp_model is None:
+        from apps.stamps.models import StampTransaction as stamp_model
+    if point_model is None:
+        from apps.loyalty.models import PointTransaction as point_model
+
+    visits = {}
+    stamps = stamp_model.objects.filter(card__customer_id__in=customer_ids, action='ADD').values_list(
+        'card__customer_id', 'created_at', 'card__promotion__name'
+    )
+    points = point_model.objects.filter(customer_id__in=customer_ids, transaction_type='EARN').values_list(
+        'customer_id', 'created_at', 'description'
+    )
+    for rows in (stamps, points):
+        for customer_id, when, service in rows.iterator(chunk_size=2000):
+            visits.setdefault(customer_id, []).append((when, service))
+    for entries in visits.values():
+        entries.sort(key=lambda visit: visit[0])
+    return visits
+
+
+def compute_stats(stats_model, organization_id, customer_id, visits):
+    """Fila de estadísticas (sin guardar) a partir de todas las visitas ordenadas"""
+    stats = _new_stats(stats_model, organization_id, customer_id)
+    for when, service in visits:
+        add_visit(stats, when, service)
+    return stats
+
+
+def rebuild_customer_stats(organization=None, customer_ids=None, chunk_size=1000):
+    """
+    Recalcula desde el historial las estadísticas de los clientes de un
+    negocio (o de `customer_ids`, o de todos) por lotes de `chunk_size`.
+    Los clientes sin visitas quedan sin fila. Retorna (clientes, con visitas).
+    """
+    from .models import Customer, CustomerStats
+
+    customers = Customer.objects.order_by('pk')
+    if organization is not None:
+        customers = customers.filter(organization=organization)
+    if customer_ids is not None:
+        customers = customers.filter(pk__in=list(customer_ids))
+
+    total = with_visits = 0
+    last_pk = 0
+    while True:
+        chunk = dict(customers.filter(pk__gt=last_pk).values_list('pk', 'organization_id')[:chunk_size])
+        if not chunk:
+            break
+        last_pk = max(chunk)
+        visits = customer_visits(list(chunk))
+        rows = [
+            compute_stats(CustomerStats, chunk[customer_id], customer_id, entries)
+            for customer_id, entries in visits.items()
+        ]
+        with transaction.atomic():
+            CustomerStats.objects.filter(customer_id__in=list(chunk)).exclude(customer_id__in=list(visits)).delete()
+            CustomerStats.objects.bulk_create(
+                rows, batch_size=500, update_conflicts=True,
+                unique_fields=['customer'], update_fields=list(STATS_FIELDS),
+            )
+        total += len(chunk)
+        with_visits += len(rows)
+    return total, with_visits
+
+
+def inactive_q(organization, days=INACTIVE_DAYS, now=None):
+    """
+    Filtro de clientes que vinieron alguna vez pero no en los últimos `days`
+    días (índice cust_stats_org_last_idx sobre sus estadísticas).
+    """
+    return Q(
+        stats__organization=organization,
+        stats__last_visit_at__lt=(now or timezone.now()) - timedelta(days=days),
+    )
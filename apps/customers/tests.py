@@ -1,3 +1,451 @@
-from django.test import TestCase
+import csv
+import io
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.core.models import Organization
+from apps.loyalty.models import PointTransaction
+from apps.stamps.models import StampCard, StampPromotion, StampTransaction
+from apps.stamps.services import grant_stamps
+from .birthdays import birth_ordinal, birthday_q, celebration_date, ordinal_ranges
+from .exporter import stream_csv, stream_jsonl
+from . import importer
+from .importer import import_customers
+from .models import Customer, CustomerStats, Tag
+from .phones import backfill_normalized, find_by_phone, find_collisions, merge_customers, normalize_phone
+from .search import MAX_PREFIX, customer_tokens, fold, query_terms, search_customer_ids, search_customers
+from .stats import inactive_q, rebuild_customer_stats, record_visits
+
+User = get_user_model()
+
+
+class OrdinalRangesTests(SimpleTestCase):
+    """Ventanas de fechas -> rangos de birth_ordinal (calendario bisiesto)"""
+
+    def test_birth_ordinal(self):
+        self.assertEqual(birth_ordinal(1, 1), 1)
+        self.assertEqual(birth_ordinal(2, 29), 60)
+        self.assertEqual(birth_ordinal(3, 1), 61)
+        self.assertEqual(birth_ordinal(12, 31), 366)
+        self.assertIsNone(birth_ordinal(2, 30))
+        self.assertIsNone(birth_ordinal(None, 5))
+
+    def test_single_day_and_window_inside_the_year(self):
+        self.assertEqual(ordinal_ranges(date(2026, 3, 1), date(2026, 3, 1)), [(61, 61)])
+        self.assertEqual(ordinal_ranges(date(2026, 1, 10), date(2026, 1, 20)), [(10, 20)])
+        self.assertEqual(ordinal_ranges(date(2026, 1, 1), date(2026, 12, 31)), [(1, 366)])
+
+    def test_window_crossing_new_year_splits_in_two(self):
+        self.assertEqual(ordinal_ranges(date(2026, 12, 25), date(2027, 1, 5)), [(360, 366), (1, 5)])
+        self.assertEqual(ordinal_ranges(date(2026, 12, 31), date(2027, 1, 1)), [(366, 366), (1, 1)])
+
+    def test_feb_29_celebrated_on_feb_28_in_common_years(self):
+        self.assertEqual(ordinal_ranges(date(2026, 2, 28), date(2026, 2, 28)), [(59, 60)])
+        self.assertEqual(ordinal_ranges(date(2028, 2, 28), date(2028, 2, 28)), [(59, 59)])
+        self.assertEqual(ordinal_ranges(date(2028, 2, 29), date(2028, 2, 29)), [(60, 60)])
+        self.assertEqual(ordinal_ranges(date(2026, 3, 1), date(2026, 3, 1)), [(61, 61)])
+        self.assertEqual(ordinal_ranges(date(2026, 2, 20), date(2026, 3, 5)), [(51, 65)])
+        self.assertEqual(celebration_date(2026, 2, 29), date(2026, 2, 28))
+        self.assertEqual(celebration_date(2028, 2, 29), date(2028, 2, 29))
+
+
+class BirthdayQueryTests(TestCase):
+    """birthday_q sobre el índice (organization, birth_ordinal)"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='birthday-owner', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Birthdays', owner=owner)
+        for name, month, day in [('Ene', 1, 2), ('Feb28', 2, 28), ('Feb29', 2, 29), ('Mar', 3, 1), ('Dic', 12, 30), ('Sin', None, None)]:
+            Customer.objects.create(
+                organization=self.organization, first_name=name, last_name='B', birth_month=month, birth_day=day
+            )
+
+    def celebrating(self, start, end=None):
+        customers = Customer.objects.filter(birthday_q(start, end), organization=self.organization)
+        return sorted(customers.values_list('first_name', flat=True))
+
+    def test_single_days(self):
+        self.assertEqual(self.celebrating(date(2026, 2, 28)), ['Feb28', 'Feb29'])
+        self.assertEqual(self.celebrating(date(2028, 2, 28)), ['Feb28'])
+        self.assertEqual(self.celebrating(date(2028, 2, 29)), ['Feb29'])
+        self.assertEqual(self.celebrating(date(2026, 3, 1)), ['Mar'])
+
+    def test_window_across_new_year(self):
+        self.assertEqual(self.celebrating(date(2026, 12, 28), date(2027, 1, 3)), ['Dic', 'Ene'])
+        self.assertEqual(self.celebrating(date(2026, 12, 31), date(2027, 1, 1)), [])
+
+
+class CustomerExportTests(TestCase):
+    """Exportación CSV: celdas con forma de fórmula y reimportación"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='export-owner', email='export@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Export', owner=owner)
+        Customer.objects.create(
+            organization=self.organization, first_name='=HYPERLINK("http://x.invalid","ver")', last_name='@SUM(A1)',
+            phone='+51 999 111 222', notes='-1+1',
+        )
+        Customer.objects.create(organization=self.organization, first_name='Ana', last_name='López', phone='999111333', notes='a = b')
+
+    def csv_rows(self, organization):
+        text = ''.join(stream_csv(organization, chunk_size=1))
+        return list(csv.DictReader(io.StringIO(text.lstrip('\ufeff'))))
+
+    def test_formula_like_cells_are_escaped(self):
+        rows = self.csv_rows(self.organization)
+
+        self.assertEqual(
+            [(row['Nombre'], row['Apellido'], row['Teléfono'], row['Notas']) for row in rows],
+            [
+                ('\'=HYPERLINK("http://x.invalid","ver")', "'@SUM(A1)", "'+51 999 111 222", "'-1+1"),
+                ('Ana', 'López', '999111333', 'a = b'),
+            ],
+        )
+        # JSON Lines no pasa por una hoja de cálculo: valores tal cual
+        self.assertIn('"first_name": "=HYPERLINK', ''.join(stream_jsonl(self.organization)))
+
+    def test_export_imports_back_unchanged(self):
+        text = ''.join(stream_csv(self.organization))
+        owner = User.objects.create_user(username='export-owner-2', email='export2@example.com', password='x', is_owner=True)
+        other = Organization.objects.create(name='Export 2', owner=owner)
+
+        result = import_customers(other, io.BytesIO(text.encode('utf-8')))
+
+        self.assertEqual((result['created'], result['errors']), (2, []))
+        fields = ('first_name', 'last_name', 'phone', 'phone_normalized', 'notes')
+        self.assertEqual(
+            list(Customer.objects.filter(organization=other).order_by('pk').values_list(*fields)),
+            list(Customer.objects.filter(organization=self.organization).order_by('pk').values_list(*fields)),
+        )
+
+
+class ImportWithoutReturningTests(TestCase):
+    """Importación en motores sin RETURNING en bulk_create (MySQL)"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='import-owner', email='import@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Import', owner=owner)
+
+    def test_pks_are_matched_by_content_despite_concurrent_inserts(self):
+        text = 'nombre,apellido,telefono,etiquetas\nAna,Uno,999111001,vip\nBeto,Dos,999111002,\nCarla,Tres,,nuevo\n'
+        bulk_create = Customer.objects.bulk_create
+
+        def concurrent_insert(customers, **kwargs):
+            # Otro request inserta en el mismo negocio entre la lectura de la última PK y el INSERT
+            Customer.objects.create(organization=self.organization, first_name='Intruso', last_name='X')
+            return bulk_create(customers, **kwargs)
+
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(Customer.objects, 'bulk_create', side_effect=concurrent_insert):
+            result = import_customers(self.organization, io.StringIO(text))
+
+        self.assertEqual((result['created'], result['errors']), (3, []))
+        tagged = Customer.objects.filter(organization=self.organization, tags__isnull=False)
+        self.assertEqual(
+            sorted(tagged.values_list('first_name', 'tags__name')), [('Ana', 'vip'), ('Carla', 'nuevo')]
+        )
+
+
+class ImportConcurrentCustomerTests(TestCase):
+    """Alta simultánea (escaneo QR) con el mismo teléfono durante la importación"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='race-owner', email='race@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Race', owner=owner)
+
+    def test_batch_is_retried_without_the_new_duplicate(self):
+        text = 'nombre,telefono,etiquetas\nAna,999111001,nueva\nBeto,999111002,nueva\n'
+        remaining_quota = importer._remaining_quota
+        scans = ['999111002']
+
+        def scanned_meanwhile(organization):
+            # Entre la búsqueda de duplicados y el INSERT del lote
+            if scans:
+                Customer.objects.create(organization=organization, first_name='Beto QR', phone=scans.pop())
+            return remaining_quota(organization)
+
+        with mock.patch('apps.customers.importer._remaining_quota', side_effect=scanned_meanwhile):
+            result = import_customers(self.organization, io.StringIO(text))
+
+        self.assertEqual((result['created'], result['duplicates'], result['tags_created']), (1, 1, 1))
+        self.assertEqual(result['errors'], [(3, 'Duplicado: ya existe un cliente con teléfono 999111002')])
+        self.assertEqual(
+            sorted(Customer.objects.filter(organization=self.organization).values_list('first_name', 'tags__name')),
+            [('Ana', 'nueva'), ('Beto QR', None)],
+        )
+        self.assertEqual(Tag.objects.filter(organization=self.organization).count(), 1)
+
+
+@override_settings(PHONE_COUNTRY_CODE='51', PHONE_NATIONAL_LENGTH=9)
+class NormalizePhoneTests(SimpleTestCase):
+    """Teléfono normalizado: dígitos con el prefijo de país"""
+
+    def test_formats(self):
+        cases = {
+            '+51 999-888-777': '51999888777',
+            '999 888 777': '51999888777',
+            '(999) 888.777': '51999888777',
+            '0051999888777': '51999888777',
+            '+1 (415) 555-0100': '14155550100',
+            '12345': '12345',
+            '': None,
+            None: None,
+            'sin número': None,
+            '00': None,
+        }
+        for raw, expected in cases.items():
+            with self.subTest(raw=raw):
+                self.assertEqual(normalize_phone(raw), expected)
+
+    @override_settings(PHONE_COUNTRY_CODE='')
+    def test_without_country_code_only_digits(self):
+        self.assertEqual(normalize_phone('999 888 777'), '999888777')
+
+
+@override_settings(PHONE_COUNTRY_CODE='51', PHONE_NATIONAL_LENGTH=9)
+class PhoneMergeTests(TestCase):
+    """Búsqueda por teléfono, unión de duplicados y backfill de phone_normalized"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='phones-owner', email='phones@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Phones', owner=owner)
+
+    def customer(self, first_name, phone, stored=None, **fields):
+        """Cliente con `phone` y, si se indica, otro phone_normalized guardado (datos previos al backfill)"""
+        if stored is None:
+            return Customer.objects.create(organization=self.organization, first_name=first_name, phone=phone, **fields)
+        customer = Customer.objects.create(organization=self.organization, first_name=first_name, **fields)
+        Customer.objects.filter(pk=customer.pk).update(phone=phone, phone_normalized=stored or None)
+        customer.refresh_from_db()
+        return customer
+
+    def normalized(self):
+        return dict(Customer.objects.filter(organization=self.organization).values_list('first_name', 'phone_normalized'))
+
+    def test_find_by_phone_in_any_format(self):
+        ana = self.customer('Ana', '999 111 222')
+        owner = User.objects.create_user(username='phones-other', email='phones2@example.com', password='x', is_owner=True)
+        other = Organization.objects.create(name='Otro', owner=owner)
+
+        for raw in ('+51 999-111-222', '999111222', '0051999111222'):
+            with self.subTest(raw=raw):
+                self.assertEqual(find_by_phone(self.organization, raw), ana)
+        self.assertIsNone(find_by_phone(other, '999111222'))
+        self.assertIsNone(find_by_phone(self.organization, 'sin número'))
+
+    def test_merge_moves_history_and_fills_empty_fields(self):
+        promotion = StampPromotion.objects.create(
+            organization=self.organization, name='Corte', total_stamps_needed=10, reward_description='Gratis'
+        )
+        keeper = self.customer('Ana', '999111222')
+        duplicate = self.customer(
+            'Ana B', '+51 999 111 222', stored='', email='ana@example.com', dni='12345678', notes='Prefiere la tarde'
+        )
+        keeper.tags.add(Tag.objects.create(organization=self.organization, name='vip'))
+        duplicate.tags.add(Tag.objects.create(organization=self.organization, name='nuevo'))
+        grant_stamps(keeper, promotion, 2, notify=False)
+        grant_stamps(duplicate, promotion, 1, notify=False)
+
+        collisions = find_collisions(self.organization)
+        self.assertEqual(
+            {key: [c.pk for c in group] for key, group in collisions.items()},
+            {(self.organization.pk, '51999111222'): [keeper.pk, duplicate.pk]},
+        )
+
+        merged = merge_customers(keeper, collisions[(self.organization.pk, '51999111222')][1:])
+
+        self.assertFalse(Customer.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(
+            (merged.email, merged.dni, merged.notes, merged.phone_normalized),
+            ('ana@example.com', '12345678', 'Prefiere la tarde', '51999111222'),
+        )
+        self.assertEqual(sorted(merged.tags.values_list('name', flat=True)), ['nuevo', 'vip'])
+        # Las dos tarjetas abiertas de la promoción quedan en una
+        card = StampCard.objects.get()
+        self.assertEqual((card.customer_id, card.current_stamps), (keeper.pk, 3))
+        self.assertEqual(StampTransaction.objects.filter(card=card).count(), 2)
+        self.assertEqual(CustomerStats.objects.get(customer=keeper).visit_count, 2)
+        self.assertEqual(find_collisions(self.organization), {})
+
+    def test_backfill_fixes_stale_values_and_skips_collisions(self):
+        self.customer('Vacío', '999000111', stored='')
+        # Cada uno guarda el valor que le corresponde al otro: se liberan antes de asignar
+        self.customer('Cruce A', '999000444', stored='51999000555')
+        self.customer('Cruce B', '999000555', stored='')
+        self.customer('Correcto', '999000666')
+        self.customer('Choque 1', '999000777')
+        self.customer('Choque 2', '+51 999 000 777', stored='')
+
+        changed = backfill_normalized(self.organization, chunk_size=2)
+
+        self.assertEqual(changed, 3)
+        self.assertEqual(self.normalized(), {
+            'Vacío': '51999000111',
+            'Cruce A': '51999000444',
+            'Cruce B': '51999000555',
+            'Correcto': '51999000666',
+            'Choque 1': '51999000777',
+            'Choque 2': None,
+        })
+
+
+class SearchTermsTests(SimpleTestCase):
+    """Normalización de consultas y tokens del índice de búsqueda"""
+
+    def test_fold_and_terms(self):
+        self.assertEqual(fold('Ñuñez Óscar'), 'nunez oscar')
+        self.assertEqual(query_terms('  José jose PÉREZ '), ['jose', 'perez'])
+        self.assertEqual(query_terms('+51 999-88'), ['5199988'])
+        self.assertEqual(query_terms('a b c d e f g'), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(query_terms(''), [])
+        self.assertEqual(query_terms('---'), [])
+
+    def test_tokens_weigh_field_and_whole_word(self):
+        customer = Customer(
+            first_name='Ana María', last_name='', phone='999 111 222', phone_normalized='51999111222',
+            email='ana.m@example.com', dni='',
+        )
+
+        tokens = customer_tokens(customer)
+
+        self.assertEqual((tokens['ana'], tokens['an'], tokens['maria']), (7, 6, 7))
+        self.assertEqual((tokens['999111222'], tokens['1222'], tokens['5199911122']), (5, 5, 4))
+        self.assertEqual(tokens['m'], 6)  # nombre antes que correo
+        self.assertTrue(all(len(token) <= MAX_PREFIX for token in tokens))
+
+
+class CustomerSearchTests(TestCase):
+    """search_customers / search_customer_ids sobre CustomerSearchToken"""
+
+    def setUp(self):
+        owner = User.objects.create_user(username='search-owner', email='search@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Search', owner=owner)
+        self.mario = self.create('Mario', 'Gómez', phone='999 111 222')
+        self.create('María', 'Pérez', email='mario.fan@example.com')
+        self.create('Marisol', 'Díaz')
+        self.create('Ana', 'Mar')
+        owner = User.objects.create_user(username='search-other', email='search2@example.com', password='x', is_owner=True)
+        other = Organization.objects.create(name='Search 2', owner=owner)
+        Customer.objects.create(organization=other, first_name='Mario', last_name='Otro')
+
+    def create(self, first_name, last_name, **fields):
+        return Customer.objects.create(organization=self.organization, first_name=first_name, last_name=last_name, **fields)
+
+    def names(self, query, **kwargs):
+        return [customer.first_name for customer in search_customers(self.organization, query, **kwargs)]
+
+    def test_ranking_whole_word_then_prefix_then_newest(self):
+        self.assertEqual(self.names('mar'), ['Ana', 'Marisol', 'María', 'Mario'])
+        self.assertEqual(self.names('MAR', limit=2), ['Ana', 'Marisol'])
+        # Nombre antes que correo
+        self.assertEqual(self.names('mario'), ['Mario', 'María'])
+
+    def test_all_terms_must_match_without_accents(self):
+        self.assertEqual(self.names('mar gómez'), ['Mario'])
+        self.assertEqual(self.names('perez maria'), ['María'])
+        self.assertEqual(self.names('mar zzz'), [])
+        self.assertEqual(self.names(''), [])
+
+    def test_numbers_match_phone_prefix_and_last_digits(self):
+        for query in ('999 111', '+51 999 111 222', '1222'):
+            with self.subTest(query=query):
+                self.assertEqual(self.names(query), ['Mario'])
+
+    def test_terms_longer_than_max_prefix_are_confirmed(self):
+        self.create('Constantino', 'Ruiz')
+        self.create('Constantinopla', 'Ruiz')
+
+        self.assertEqual(self.names('constantino'), ['Constantinopla', 'Constantino'])
+        self.assertEqual(self.names('constantinop'), ['Constantinopla'])
+        self.assertEqual(self.names('constantinox'), [])
+
+    def test_ids_filter_and_reindex_on_save(self):
+        matching = Customer.objects.filter(pk__in=search_customer_ids(self.organization, 'mar'))
+        self.assertEqual(matching.count(), 4)
+
+        self.mario.first_name = 'Pedro'
+        self.mario.save()
+
+        self.assertEqual(self.names('pedro'), ['Pedro'])
+        self.assertEqual(self.names('mario'), ['María'])
+
+
+class CustomerStatsTests(TestCase):
+    """ADN del cliente: histograma de intervalos, media, mediana y favorito"""
+
+    base = datetime(2026, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        owner = User.objects.create_user(username='stats-owner', email='stats@example.com', password='x', is_owner=True)
+        self.organization = Organization.objects.create(name='Stats', owner=owner)
+        self.customer = Customer.objects.create(organization=self.organization, first_name='Ana', last_name='S')
+
+    def visit(self, days, service):
+        return (self.organization.pk, self.customer.pk, self.base + timedelta(days=days), service)
+
+    def stats(self):
+        return CustomerStats.objects.get(customer=self.customer)
+
+    def test_record_visits_accumulates_the_histogram(self):
+        record_visits([self.visit(3, 'Corte'), self.visit(0, 'Corte')])
+        record_visits([self.visit(10, 'Barba'), self.visit(11, 'Barba')])
+
+        stats = self.stats()
+        self.assertEqual(stats.interval_counts, {'3': 1, '7': 1, '1': 1})
+        # Intervalos 1, 3, 7
+        self.assertEqual((stats.mean_interval_days, stats.median_interval_days), (3.7, 3))
+        # Empate 2-2: se conserva el favorito anterior
+        self.assertEqual((stats.visit_count, stats.favorite_service), (4, 'Corte'))
+        self.assertEqual((stats.first_visit_at, stats.last_visit_at), (self.base, self.base + timedelta(days=11)))
+
+        record_visits([self.visit(12, 'Barba')])
+        stats = self.stats()
+        # Intervalos 1, 1, 3, 7: mediana de los dos centrales
+        self.assertEqual((stats.mean_interval_days, stats.median_interval_days), (3.0, 2.0))
+        self.assertEqual(stats.favorite_service, 'Barba')
+
+        # Visita anterior a la última (carrera entre peticiones): intervalo 0
+        record_visits([self.visit(5, 'Corte')])
+        stats = self.stats()
+        self.assertEqual(stats.interval_counts, {'3': 1, '7': 1, '1': 2, '0': 1})
+        self.assertEqual((stats.median_interval_days, stats.visit_count), (1, 6))
+        self.assertEqual(stats.last_visit_at, self.base + timedelta(days=12))
+
+    def test_rebuild_from_history_and_undo(self):
+        for days, kind in ((0, 'EARN'), (7, 'EARN'), (8, 'REDEEM'), (14, 'EARN')):
+            point = PointTransaction.objects.create(
+                organization=self.organization, customer=self.customer, transaction_type=kind, points=10,
+                description='Corte' if days < 14 else 'Tinte',
+            )
+            PointTransaction.objects.filter(pk=point.pk).update(created_at=self.base + timedelta(days=days))
+        idle = Customer.objects.create(organization=self.organization, first_name='Sin', last_name='Visitas')
+        CustomerStats.objects.create(organization=self.organization, customer=idle, visit_count=3)
+
+        self.assertEqual(rebuild_customer_stats(self.organization), (2, 1))
+
+        stats = self.stats()
+        self.assertEqual(
+            (stats.visit_count, stats.interval_counts, stats.mean_interval_days, stats.median_interval_days),
+            (3, {'7': 2}, 7.0, 7.0),
+        )
+        self.assertEqual((stats.favorite_service, stats.last_visit_at), ('Corte', self.base + timedelta(days=14)))
+        self.assertFalse(CustomerStats.objects.filter(customer=idle).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PointTransaction.objects.filter(description='Tinte').get().delete()
+        stats = self.stats()
+        self.assertEqual((stats.visit_count, stats.interval_counts, stats.last_visit_at), (2, {'7': 1}, self.base + timedelta(days=7)))
+
+    def test_inactive_segment(self):
+        now = self.base + timedelta(days=60)
+        recent = Customer.objects.create(organization=self.organization, first_name='Reciente', last_name='S')
+        Customer.objects.create(organization=self.organization, first_name='Nunca', last_name='S')
+        record_visits([self.visit(0, 'Corte'), (self.organization.pk, recent.pk, now - timedelta(days=5), 'Corte')])
+
+        inactive = Customer.objects.filter(inactive_q(self.organization, now=now))
+
+        self.assertEqual(list(inactive.values_list('first_name', flat=True)), ['Ana'])
@@ -10,6 +10,8 @@ urlpatterns = [
     path('<int:pk>/', views.customer_detail, name='customer_detail'),
     path('<int:pk>/edit/', views.customer_edit, name='customer_edit'),
     path('<int:pk>/delete/', views.customer_delete, name='customer_delete'),
+    path('import/', views.customer_import, name='customer_import'),
+    path('export/', views.customer_export, name='customer_export'),
     path('birthdays/', views.birthday_list, name='birthday_list'),
     path('logout/', views.customer_logout, name='customer_logout'),
     path('login/<slug:slug>/', views.customer_login, name='customer_login'),
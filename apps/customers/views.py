@@ -1,61 +1,138 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import Http404, JsonResponse
-from django.db.models import Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.db import transaction
-from .models import Customer, Tag
-from .forms import CustomerForm
+from django.db.models import IntegerField, Q, Value
+from django.template.loader import get_template
+from .models import Customer, CustomerStats, Tag
+from .birthdays import birthday_q, last_birthday, next_birthday, tenant_today
+from .exporter import EXPORT_FORMATS, stream_csv, stream_jsonl
+from .forms import CustomerForm, CustomerImportForm
+from .importer import MAX_REPORTED_ERRORS, import_customers
+from .phones import find_by_phone
+from .search import search_customer_ids, search_customers
+from .stats import INACTIVE_DAYS
 # Importaciones para auto-asignación y estadísticas
-from apps.stamps.models import StampPromotion, StampCard, StampTransaction, StampRequest
-from apps.loyalty.models import PointTransaction
+from apps.stamps.models import StampPromotion, StampCard, StampRequest
 from apps.audit.utils import log_action
 from django.utils import timezone
-from collections import Counter
 from datetime import date, timedelta
-from apps.core.models import Organization
+from apps.core.cache import get_active_organization_or_404
+from apps.core.pagination import decode_cursor, encode_cursor, keyset_after, keyset_values
+
+# Clientes por página del listado (y máximo pedible con ?page_size=)
+CUSTOMER_PAGE_SIZE = 50
+CUSTOMER_MAX_PAGE_SIZE = 1000
+# Las páginas más grandes se renderizan y envían por partes (StreamingHttpResponse)
+CUSTOMER_STREAM_THRESHOLD = 200
+CUSTOMER_STREAM_CHUNK = 100
+# Orden dentro de cada grupo (y valores del cursor)
+CUSTOMER_KEYSET = ('created_at', 'pk')
+
+
+def _customer_segments(organization, query, today):
+    """
+    Cumpleañeros de hoy primero y luego el resto, cada grupo ordenado por
+    (created_at, id) descendente. Así el orden lo resuelven los índices
+    cust_org_birthday_idx / cust_org_created_idx en lugar de ordenar todo el
+    negocio por una expresión.
+    """
+    customers = Customer.objects.filter(organization=organization)
+    if query:
+        customers = customers.filter(pk__in=search_customer_ids(organization, query))
+    birthday = birthday_q(today)
+    return [
+        ('b', customers.filter(birthday).annotate(is_birthday_today=Value(1, output_field=IntegerField()))),
+        ('r', customers.exclude(birthday).annotate(is_birthday_today=Value(0, output_field=IntegerField()))),
+    ]
+
+
+def _iter_customer_page(segments, cursor, size, state):
+    """
+    Genera los clientes de una página (hasta `size`) desde el cursor
+    [grupo, created_at, id]. Al terminar deja en state['next_cursor'] el
+    cursor de la página siguiente (None si no hay más).
+    """
+    state['next_cursor'] = None
+    names = [name for name, _ in segments]
+    start, after = 0, None
+    if cursor and cursor[0] in names:
+        start, after = names.index(cursor[0]), cursor[1:] or None
+
+    remaining = size
+    for name, queryset in segments[start:]:
+        rows = keyset_after(queryset, CUSTOMER_KEYSET, after)[:remaining + 1]
+        after, last, count = None, None, 0
+        # Una fila de más indica que hay página siguiente
+        for customer in rows.iterator(chunk_size=CUSTOMER_STREAM_CHUNK):
+            if count == remaining:
+                values = keyset_values(last, CUSTOMER_KEYSET) if last is not None else []
+                state['next_cursor'] = encode_cursor([name] + values)
+                return
+            count += 1
+            last = customer
+            yield customer
+        remaining -= count
+
+
+def _stream_customer_rows(customers, state, context):
+    """Filas por bloques de CUSTOMER_STREAM_CHUNK y al final el botón "Cargar más" """
+    rows_template = get_template('customers/partials/customer_rows.html')
+    more_template = get_template('customers/partials/customer_load_more.html')
+    chunk, sent = [], 0
+    for customer in customers:
+        chunk.append(customer)
+        if len(chunk) >= CUSTOMER_STREAM_CHUNK:
+            yield rows_template.render({'customers': chunk})
+            sent += len(chunk)
+            chunk = []
+    if chunk:
+        yield rows_template.render({'customers': chunk})
+        sent += len(chunk)
+    yield more_template.render({**context, 'has_rows': sent > 0, 'next_cursor': state['next_cursor']})
+
 
 @login_required
 def customer_list(request):
-    """Listar clientes de la organización actual con soporte para búsqueda AJAX"""
+    """
+    Listar clientes de la organización actual con soporte para búsqueda AJAX.
+    Paginado por cursor: la petición AJAX con ?cursor= devuelve solo las filas
+    siguientes para agregarlas a la tabla ("Cargar más").
+    """
     if not hasattr(request, 'tenant') or not request.tenant:
          return redirect('users:login')
          
     query = request.GET.get('q', '')
-    from django.db.models import Case, When, Value, IntegerField
-    today = timezone.localtime().date()
-    if request.tenant and hasattr(request.tenant, 'timezone') and request.tenant.timezone:
-        import zoneinfo
-        try:
-            today = timezone.now().astimezone(zoneinfo.ZoneInfo(request.tenant.timezone)).date()
-        except: pass
-    
-    customers = Customer.objects.filter(organization=request.tenant).annotate(
-        is_birthday_today=Case(
-            When(birth_day=today.day, birth_month=today.month, then=Value(1)),
-            default=Value(0),
-            output_field=IntegerField(),
-        )
-    )
-    
-    if query:
-        customers = customers.filter(
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query) |
-            Q(phone__icontains=query) |
-            Q(email__icontains=query)
-        )
-    
-    customers = customers.order_by('-is_birthday_today', '-created_at')
+    cursor = decode_cursor(request.GET.get('cursor'))
+    try:
+        page_size = min(max(int(request.GET.get('page_size', CUSTOMER_PAGE_SIZE)), 1), CUSTOMER_MAX_PAGE_SIZE)
+    except ValueError:
+        page_size = CUSTOMER_PAGE_SIZE
+
+    today = tenant_today(request.tenant)
+    segments = _customer_segments(request.tenant, query, today)
+    state = {}
+    customers = _iter_customer_page(segments, cursor, page_size, state)
+    page_context = {'query': query, 'is_first_page': cursor is None}
     
     # Si es una petición AJAX, devolvemos solo el parcial de las filas
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        return render(request, 'customers/partials/customer_table_rows.html', {'customers': customers})
+        if page_size > CUSTOMER_STREAM_THRESHOLD:
+            return StreamingHttpResponse(
+                _stream_customer_rows(customers, state, page_context), content_type='text/html; charset=utf-8'
+            )
+        customers = list(customers)
+        return render(request, 'customers/partials/customer_table_rows.html', {
+            **page_context, 'customers': customers, 'next_cursor': state['next_cursor'],
+        })
         
+    customers = list(customers)
     context = {
+        **page_context,
         'customers': customers,
+        'next_cursor': state['next_cursor'],
         'title': 'Gestión de Clientes',
-        'query': query,
         'form': CustomerForm()
     }
     return render(request, 'customers/customer_list.html', context)
@@ -81,11 +158,8 @@ def customer_detail(request, pk):
          point_transactions = customer.point_transactions.all().order_by('-created_at')
 
     # --- Lógica de ADN del Cliente ---
-    # 1. Recopilar todas las visitas (transacciones de acumulación)
-    stamp_txns = StampTransaction.objects.filter(card__customer=customer, action='ADD').order_by('created_at')
-    point_txns = PointTransaction.objects.filter(customer=customer, transaction_type='EARN').order_by('created_at')
-    
-    visit_dates = sorted([tx.created_at for tx in stamp_txns] + [tx.created_at for tx in point_txns])
+    # Una fila precalculada (customers.stats) en lugar de recorrer el historial
+    stats = CustomerStats.objects.filter(customer=customer).first()
     
     adn = {
         'frecuencia': 'Primera visita',
@@ -94,12 +168,11 @@ def customer_detail(request, pk):
         'status_ultima_visita': 'text-muted'
     }
     
-    if visit_dates:
+    if stats and stats.last_visit_at:
         # Última visita
-        last_visit = visit_dates[-1]
-        delta_last = (timezone.now() - last_visit).days
+        delta_last = (timezone.now() - stats.last_visit_at).days
         adn['dias_ultima_visita'] = delta_last
-        if delta_last > 30:
+        if delta_last > INACTIVE_DAYS:
             adn['status_ultima_visita'] = 'text-danger fw-bold'
         elif delta_last < 7:
             adn['status_ultima_visita'] = 'text-success'
@@ -107,17 +180,12 @@ def customer_detail(request, pk):
             adn['status_ultima_visita'] = 'text-primary'
             
         # Frecuencia media
-        if len(visit_dates) > 1:
-            diffs = [(visit_dates[i] - visit_dates[i-1]).days for i in range(1, len(visit_dates))]
-            if diffs:
-                avg_days = sum(diffs) / len(diffs)
-                adn['frecuencia'] = f"Viene cada {int(avg_days)} días"
+        if stats.mean_interval_days is not None:
+            adn['frecuencia'] = f"Viene cada {int(stats.mean_interval_days)} días"
             
         # Servicio favorito (basado en descripciones o promos)
-        services = [tx.card.promotion.name for tx in stamp_txns] + [tx.description for tx in point_txns]
-        if services:
-            most_common = Counter(services).most_common(1)
-            adn['servicio_favorito'] = most_common[0][0]
+        if stats.favorite_service:
+            adn['servicio_favorito'] = stats.favorite_service
 
     # --- Lógica de Cumpleaños ---
     birthday_info = {
@@ -127,20 +195,9 @@ def customer_detail(request, pk):
     }
     if customer.birth_day and customer.birth_month:
         try:
-            today = timezone.localtime().date()
-            if request.tenant and hasattr(request.tenant, 'timezone') and request.tenant.timezone:
-                import zoneinfo
-                try:
-                    today = timezone.now().astimezone(zoneinfo.ZoneInfo(request.tenant.timezone)).date()
-                except: pass
-            # Crear fecha de cumple para este año
-            this_year_bday = today.replace(month=customer.birth_month, day=customer.birth_day)
-            
-            # Si ya pasó este año, mirar el siguiente
-            if this_year_bday < today:
-                next_bday = this_year_bday.replace(year=today.year + 1)
-            else:
-                next_bday = this_year_bday
+            today = tenant_today(request.tenant)
+            # Próxima celebración (29 de febrero -> 28 en años no bisiestos)
+            next_bday = next_birthday(customer.birth_month, customer.birth_day, today)
                 
             delta = (next_bday - today).days
             birthday_info['days_to'] = delta
@@ -153,7 +210,7 @@ def customer_detail(request, pk):
             else:
                 birthday_info['message'] = f"Faltan {delta} días"
         except ValueError:
-            pass # Fechas inválidas como 29 de febrero en años no bisiestos
+            pass # Fechas inválidas (ej: 31 de febrero)
 
     # --- Línea de Vida (Audit Logs) ---
     # Dueño ve todo, trabajador ve filtrado
@@ -250,6 +307,51 @@ def customer_delete(request, pk):
     messages.success(request, f"Cliente {name} eliminado.")
     return redirect('customers:customer_list')
 
+@login_required
+def customer_import(request):
+    """Importación masiva de clientes desde CSV (feature customers.import_csv)"""
+    if not request.user.has_feature_import_csv:
+        messages.error(request, "La importación de clientes no está incluida en tu plan actual.")
+        return redirect('customers:customer_list')
+
+    result = None
+    if request.method == 'POST':
+        form = CustomerImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            result = import_customers(request.tenant, form.cleaned_data['file'])
+            if result['created']:
+                log_action(request, 'CREATE', 'Cliente', f"Importados {result['created']} clientes desde CSV")
+                messages.success(request, f"Se importaron {result['created']} clientes.")
+            if result['limit_reached']:
+                messages.warning(request, "⚠️ Se alcanzó el límite de clientes de tu plan: el resto del archivo no se importó.")
+    else:
+        form = CustomerImportForm()
+
+    return render(request, 'customers/customer_import.html', {
+        'form': form,
+        'result': result,
+        'max_errors': MAX_REPORTED_ERRORS,
+        'title': 'Importar Clientes',
+    })
+
+@login_required
+def customer_export(request):
+    """Exportación de clientes en CSV o JSON Lines (feature customers.export_data), enviada por partes"""
+    if not request.user.has_feature_export_data:
+        messages.error(request, "La exportación de datos no está incluida en tu plan actual.")
+        return redirect('customers:customer_list')
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'csv'
+    today = tenant_today(request.tenant)
+    if export_format == 'jsonl':
+        response = StreamingHttpResponse(stream_jsonl(request.tenant), content_type='application/x-ndjson; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(stream_csv(request.tenant), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="Clientes_{today}.{export_format}"'
+    return response
+
 @login_required
 def customer_search_api(request):
     """API para búsqueda rápida de clientes (AJAX)"""
@@ -257,14 +359,7 @@ def customer_search_api(request):
     if len(query) < 1:
         return JsonResponse({'results': []})
         
-    customers = Customer.objects.filter(
-        organization=request.tenant
-    ).filter(
-        Q(first_name__icontains=query) |
-        Q(last_name__icontains=query) |
-        Q(phone__icontains=query) |
-        Q(email__icontains=query)
-    )[:10]
+    customers = search_customers(request.tenant, query)
     
     results = [
         {
@@ -296,18 +391,16 @@ def log_whatsapp_message(request, pk):
 
 def customer_login(request, slug):
     """Acceso para clientes usando Celular + DNI"""
-    organization = get_object_or_404(Organization, slug=slug, is_active=True)
+    organization = get_active_organization_or_404(slug)
     
     if request.method == 'POST':
         phone = request.POST.get('phone', '').strip()
         dni = request.POST.get('dni', '').strip()
         
         if phone and dni:
-            customer = Customer.objects.filter(
-                organization=organization,
-                phone=phone,
-                dni=dni
-            ).first()
+            customer = find_by_phone(organization, phone)
+            if customer and customer.dni != dni:
+                customer = None
             
             if customer:
                 request.session['customer_id'] = customer.id
@@ -337,78 +430,31 @@ def birthday_list(request):
     tenant = getattr(request, 'tenant', None) or request.user.organization
     
     # Obtener fecha actual en la zona del tenant
-    today = timezone.localtime().date()
-    if tenant and hasattr(tenant, 'timezone') and tenant.timezone:
-        import zoneinfo
-        try:
-            today = timezone.now().astimezone(zoneinfo.ZoneInfo(tenant.timezone)).date()
-        except: pass
+    today = tenant_today(tenant)
+    celebrants = Customer.objects.filter(organization=tenant, is_active=True)
     
     # 1. CUMPLEAÑOS DE HOY
-    today_celebrants = Customer.objects.filter(
-        organization=tenant,
-        birth_month=today.month,
-        birth_day=today.day,
-        is_active=True
-    )
-    
-    # 2. PRÓXIMOS (Siguientes 30 días)
-    # Lógica simplificada: filtraremos en Python para manejar el cambio de año/mes fácilmente
-    all_customers = Customer.objects.filter(
-        organization=tenant,
-        is_active=True,
-        birth_month__isnull=False,
-        birth_day__isnull=False
-    )
+    today_celebrants = celebrants.filter(birthday_q(today))
     
+    # 2. PRÓXIMOS (Siguientes 30 días) y 3. RECIENTES (últimos 7 días):
+    # rangos de birth_ordinal sobre el índice, también al cruzar de diciembre a enero
     upcoming = []
-    recent = []
+    for customer in celebrants.filter(birthday_q(today + timedelta(days=1), today + timedelta(days=30))):
+        bday = next_birthday(customer.birth_month, customer.birth_day, today)
+        upcoming.append({
+            'customer': customer,
+            'days_to': (bday - today).days,
+            'date': bday
+        })
     
-    for customer in all_customers:
-        # Saltar si es hoy (ya está en la otra lista)
-        if customer.birth_month == today.month and customer.birth_day == today.day:
-            continue
-            
-        # Calcular fecha del cumple en el año actual
-        try:
-            # Manejar años bisiestos (29 feb -> 28 feb si no es bisiesto)
-            bday_this_year = date(today.year, customer.birth_month, 29 if customer.birth_month == 2 and customer.birth_day == 29 and today.year % 4 != 0 else customer.birth_day)
-        except ValueError:
-            bday_this_year = date(today.year, customer.birth_month, 28)
-            
-        diff = (bday_this_year - today).days
-        
-        # Si ya pasó este año, probar el próximo para "próximos"
-        if diff < 0:
-            try:
-                bday_next_year = date(today.year + 1, customer.birth_month, customer.birth_day)
-            except ValueError:
-                bday_next_year = date(today.year + 1, customer.birth_month, 28)
-            diff_next = (bday_next_year - today).days
-            
-            # Recientes (Hace 1-7 días)
-            if diff >= -7:
-                recent.append({
-                    'customer': customer,
-                    'days_ago': abs(diff),
-                    'date': bday_this_year
-                })
-            
-            # Próximos (Si cae en los primeros días del próximo año y estamos a fin de año)
-            if 0 < diff_next <= 30:
-                upcoming.append({
-                    'customer': customer,
-                    'days_to': diff_next,
-                    'date': bday_next_year
-                })
-        else:
-            # Próximos (Este año)
-            if 0 < diff <= 30:
-                upcoming.append({
-                    'customer': customer,
-                    'days_to': diff,
-                    'date': bday_this_year
-                })
+    recent = []
+    for customer in celebrants.filter(birthday_q(today - timedelta(days=7), today - timedelta(days=1))):
+        bday = last_birthday(customer.birth_month, customer.birth_day, today)
+        recent.append({
+            'customer': customer,
+            'days_ago': (today - bday).days,
+            'date': bday
+        })
 
     # Ordenar las listas
     upcoming.sort(key=lambda x: x['days_to'])
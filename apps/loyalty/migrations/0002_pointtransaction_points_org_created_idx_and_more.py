@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_organization_custom_background_color_and_more'),
+        ('customers', '0005_customer_cust_org_created_idx_and_more'),
+        ('loyalty', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pointtransaction',
+            index=models.Index(fields=['organization', 'created_at'], name='points_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pointtransaction',
+            index=models.Index(fields=['customer', 'transaction_type'], name='points_cust_type_idx'),
+        ),
+    ]
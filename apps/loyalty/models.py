@@ -29,6 +29,11 @@ class PointTransaction(TenantAwareModel):
         verbose_name = "Transacción de Puntos"
         verbose_name_plural = "Transacciones de Puntos"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['organization', 'created_at'], name='points_org_created_idx'),
+            # Saldo del cliente (sumas por tipo de transacción)
+            models.Index(fields=['customer', 'transaction_type'], name='points_cust_type_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.points} pts ({self.customer})"
@@ -1,5 +1,18 @@
+from django.utils.functional import SimpleLazyObject
+from apps.core.cache import get_context_data
 from .models import StampPromotion
 
+
+def get_active_promotions(organization):
+    """Promociones activas del negocio, cacheadas por versión de promociones"""
+    return get_context_data('promotions', organization.pk, lambda: list(
+        StampPromotion.objects.filter(
+            organization_id=organization.pk,
+            is_active=True
+        ).only('id', 'name')
+    ))
+
+
 def stamp_assets(request):
     """
     Provee datos necesarios para el modal global de sellos (base.html).
@@ -7,12 +20,11 @@ def stamp_assets(request):
     if not request.user.is_authenticated or not hasattr(request, 'tenant'):
         return {}
 
-    # Obtenemos las promociones activas para el tenant actual
-    active_promotions = StampPromotion.objects.filter(
-        organization=request.tenant,
-        is_active=True
-    ).only('id', 'name')
+    tenant = request.tenant
+    if not tenant:
+        return {'global_active_promotions': []}
 
+    # Obtenemos las promociones activas para el tenant actual (solo si se usan)
     return {
-        'global_active_promotions': active_promotions
+        'global_active_promotions': SimpleLazyObject(lambda: get_active_promotions(tenant))
     }
@@ -0,0 +1,80 @@
+"""
+Vencimiento persistido de tarjetas de sellos.
+
+`StampCard.expires_at` se calcula al crear la tarjeta y se recalcula para
+todo el negocio cuando cambia `stamps_expiration_months`. El barrido
+nocturno (`manage.py expire_stamp_cards`) marca `expired=True` con un solo
+UPDATE indexado, así las vistas filtran vencidas en SQL.
+"""
+import logging
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import StampCard
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_expired_cards(now=None):
+    """Marca como expiradas las tarjetas vencidas. Retorna cuántas se marcaron."""
+    now = now or timezone.now()
+    return StampCard.objects.filter(expired=False, expires_at__lte=now).update(expired=True)
+
+
+def _reopen_unexpired(cards, now):
+    """
+    Quita la marca de expirada a las tarjetas que ya no están vencidas. Una
+    tarjeta abierta solo se reabre si no hay otra más nueva de la misma
+    promoción (stamps_one_open_card).
+    """
+    newer_open = StampCard.objects.filter(
+        customer=models.OuterRef('customer'), promotion=models.OuterRef('promotion'),
+        is_completed=False, is_redeemed=False, pk__gt=models.OuterRef('pk'),
+    )
+    # Se leen los IDs primero: MySQL no permite subconsultas sobre la tabla que se actualiza
+    ids = list(
+        cards.filter(expired=True)
+        .filter(models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now))
+        .exclude(models.Q(is_completed=False, is_redeemed=False) & models.Exists(newer_open))
+        .values_list('pk', flat=True)
+    )
+    for start in range(0, len(ids), 500):
+        StampCard.objects.filter(pk__in=ids[start:start + 500]).update(expired=False, expiring_notified=False)
+
+
+def recompute_expiry(organization, chunk_size=1000):
+    """
+    Recalcula expires_at/expired de todas las tarjetas del negocio según su
+    vigencia actual. La suma de meses no es portable en SQL (SQLite/MySQL),
+    así que se calcula en Python y se guarda con bulk_update por lotes.
+    Retorna el número de tarjetas actualizadas.
+    """
+    months = organization.stamps_expiration_months
+    cards = StampCard.objects.filter(organization=organization)
+    now = timezone.now()
+
+    with transaction.atomic():
+        if not months:
+            # Sin límite: ninguna tarjeta vence
+            updated = cards.update(expires_at=None)
+            _reopen_unexpired(cards, now)
+            return updated
+
+        updated = 0
+        batch = []
+        for card in cards.only('pk', 'created_at').iterator(chunk_size=chunk_size):
+            card.expires_at = StampCard.compute_expires_at(card.created_at, months)
+            batch.append(card)
+            if len(batch) >= chunk_size:
+                updated += StampCard.objects.bulk_update(batch, ['expires_at'])
+                batch = []
+        if batch:
+            updated += StampCard.objects.bulk_update(batch, ['expires_at'])
+
+        # Al ampliar la vigencia algunas tarjetas dejan de estar vencidas (y al reducirla, al revés)
+        _reopen_unexpired(cards, now)
+        cards.filter(expired=False, expires_at__lte=now).update(expired=True)
+
+    logger.info(f"Vencimiento recalculado para {updated} tarjetas de {organization}")
+    return updated
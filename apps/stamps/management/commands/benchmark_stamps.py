@@ -0,0 +1,119 @@
+import random
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, models
+from django.db.models import Count
+
+from apps.core.benchmarks import environment, write_results
+from apps.core.models import Organization
+from apps.customers.models import Customer
+from apps.stamps.models import StampCard, StampPromotion
+from apps.stamps.services import grant_stamps
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el rendimiento de grant_stamps con varios threads otorgando sellos a la vez a un grupo '
+        'pequeño de clientes, y verifica que no se pierdan sellos ni se dupliquen tarjetas abiertas. '
+        'Escribe datos: usar sobre un negocio de generate_load_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, help='ID del negocio (por defecto el de más clientes)')
+        parser.add_argument('--threads', type=int, default=8, help='Threads concurrentes')
+        parser.add_argument('--grants', type=int, default=100, help='Sellos otorgados por thread')
+        parser.add_argument('--customers', type=int, default=10, help='Clientes disputados entre los threads')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark_stamps.json', help='Archivo JSON de resultados')
+
+    def handle(self, *args, **options):
+        if options['organization']:
+            organization = Organization.objects.filter(pk=options['organization']).first()
+        else:
+            organization = Organization.objects.annotate(n=Count('customer')).order_by('-n').first()
+        if organization is None:
+            raise CommandError('No hay negocios: ejecuta antes generate_load_data.')
+
+        promotion = StampPromotion.objects.filter(organization=organization, is_active=True).first()
+        customers = list(Customer.objects.filter(organization=organization).order_by('pk')[:options['customers']])
+        if promotion is None or not customers:
+            raise CommandError('El negocio necesita una promoción activa y clientes.')
+        performer = organization.owner
+
+        cards = StampCard.objects.filter(promotion=promotion, customer__in=customers)
+        stamps_before = cards.aggregate(total=models.Sum('current_stamps'))['total'] or 0
+
+        latencies, errors, lock = [], [], threading.Lock()
+
+        def worker(index):
+            rng = random.Random(f"{options['seed']}:{index}")
+            local = []
+            try:
+                for _ in range(options['grants']):
+                    customer = rng.choice(customers)
+                    start = time.perf_counter()
+                    try:
+                        grant_stamps(customer, promotion, 1, performed_by=performer, notify=False)
+                    except DatabaseError as exc:
+                        with lock:
+                            errors.append(str(exc))
+                        continue
+                    local.append((time.perf_counter() - start) * 1000)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        stamps_after = cards.aggregate(total=models.Sum('current_stamps'))['total'] or 0
+        duplicated_open = (
+            cards.filter(is_completed=False, is_redeemed=False, expired=False)
+            .values('customer_id').annotate(n=Count('pk')).filter(n__gt=1).count()
+        )
+        latencies.sort()
+        result = {
+            'name': 'grant_stamps',
+            'threads': options['threads'],
+            'customers': len(customers),
+            'grants': len(latencies),
+            'errors': len(errors),
+            'wall_s': round(elapsed, 3),
+            'grants_per_s': round(len(latencies) / elapsed, 1) if elapsed else None,
+            'latency_ms': {
+                'median': round(statistics.median(latencies), 2) if latencies else None,
+                'p95': round(latencies[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+                'max': round(latencies[-1], 2) if latencies else None,
+            },
+            'lost_stamps': len(latencies) - (stamps_after - stamps_before),
+            'duplicated_open_cards': duplicated_open,
+        }
+
+        self.stdout.write(
+            f"{result['grants']} sellos en {result['wall_s']} s ({result['grants_per_s']}/s) con {result['threads']} threads; "
+            f"mediana {result['latency_ms']['median']} ms, p95 {result['latency_ms']['p95']} ms, errores {result['errors']}"
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f"Primer error: {errors[0]}"))
+
+        write_results(options['output'], {
+            'benchmark': 'stamps',
+            'environment': environment(),
+            'organization': {'id': organization.pk, 'slug': organization.slug},
+            'results': [result],
+        })
+
+        if result['lost_stamps'] or duplicated_open:
+            raise CommandError(
+                f"Inconsistencia: {result['lost_stamps']} sellos perdidos, {duplicated_open} clientes con tarjetas abiertas duplicadas"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Sin sellos perdidos ni tarjetas duplicadas. Resultados en {options['output']}"))
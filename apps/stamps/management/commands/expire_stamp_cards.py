@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from apps.core.models import Organization
+from apps.stamps.expiry import recompute_expiry, sweep_expired_cards
+
+
+class Command(BaseCommand):
+    help = 'Marca como expiradas las tarjetas de sellos vencidas (ejecutar cada noche).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recompute', action='store_true',
+            help='Recalcula antes expires_at de todas las tarjetas según la vigencia de cada negocio'
+        )
+        parser.add_argument('--organization', type=int, action='append', help='ID del negocio para --recompute (repetible)')
+
+    def handle(self, *args, **options):
+        if options['recompute']:
+            organizations = Organization.objects.all()
+            if options['organization']:
+                organizations = organizations.filter(pk__in=options['organization'])
+            total = sum(recompute_expiry(org) for org in organizations.iterator())
+            self.stdout.write(f'Vencimientos recalculados: {total}')
+
+        expired = sweep_expired_cards()
+        self.stdout.write(self.style.SUCCESS(f'Tarjetas marcadas como expiradas: {expired}'))
@@ -1,54 +1,54 @@
+from datetime import timedelta
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
-from dateutil.relativedelta import relativedelta
 from apps.stamps.models import StampCard
-from apps.campaigns.models import NotificationConfig
-from apps.campaigns.utils import send_whatsapp_message, format_message
+from apps.campaigns.outbox import build_notification, enqueue_notifications, get_notification_config
+from apps.campaigns.utils import format_message
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Envía recordatorios de WhatsApp para tarjetas que vencen en 7 días.'
+    help = 'Encola recordatorios de WhatsApp para tarjetas que vencen en 7 días (los envía dispatch_notifications).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Días de anticipación del recordatorio')
 
     def handle(self, *args, **options):
-        # 1. Obtener tarjetas NO completadas y NO redimidas que NO hayan sido notificadas de expiración
-        # Pero primero necesitamos saber la vigencia por negocio.
-        # Como es variable, iteramos por los negocios que tienen notificaciones activas.
-        
-        configs = NotificationConfig.objects.all()
-        count = 0
-
-        for config in configs:
-            org = config.organization
-            months = org.stamps_expiration_months
-            
-            if months <= 0:
-                continue # Sin vencimiento
-            
-            # Fecha exacta en la que se cumplen (Meses - 7 días)
-            target_date_start = timezone.now().date() + relativedelta(days=7)
-            
-            # Buscamos tarjetas creadas hace (Meses - 7 días)
-            # created_at + months - 7 days == today
-            # created_at == today - months + 7 days
-            creation_target_date = timezone.now() - relativedelta(months=months) + relativedelta(days=7)
-            
-            # Buscamos tarjetas creadas en esa fecha (aproximadamente hoy)
-            cards = StampCard.objects.filter(
-                organization=org,
-                is_completed=False,
-                is_redeemed=False,
-                expiring_notified=False,
-                created_at__date=creation_target_date.date()
-            )
-
-            for card in cards:
-                if card.customer.phone:
-                    message = format_message(config.template_expiring, card.customer, promotion=card.promotion)
-                    if send_whatsapp_message(config, card.customer.phone, message):
-                        card.expiring_notified = True
-                        card.save(update_fields=['expiring_notified'])
-                        count += 1
-        
-        self.stdout.write(self.style.SUCCESS(f'Se enviaron {count} recordatorios de expiración.'))
+        now = timezone.now()
+
+        # Una sola consulta por rango sobre (expiring_notified, expires_at) para todos los negocios.
+        # Las tarjetas sin vencimiento (expires_at NULL) nunca entran en el rango.
+        cards = StampCard.objects.filter(
+            expiring_notified=False,
+            expires_at__gt=now,
+            expires_at__lte=now + timedelta(days=options['days']),
+            expired=False,
+            is_completed=False,
+            is_redeemed=False,
+        ).exclude(customer__phone='').select_related('customer__organization', 'promotion')
+
+        messages, notified = [], []
+        for card in cards.iterator(chunk_size=500):
+            config = get_notification_config(card.organization_id)
+            if config is None or not config.whatsapp_api_url or not config.template_expiring:
+                continue
+
+            message = format_message(config.template_expiring, card.customer, promotion=card.promotion)
+            messages.append(build_notification(
+                card.organization_id, 'WHATSAPP', card.customer.phone, message,
+                # Si cambia la vigencia del negocio, la nueva fecha merece su propio aviso
+                kind='card_expiring', dedupe_key=f"card_expiring:{card.pk}:{card.expires_at:%Y%m%d}",
+                customer=card.customer,
+            ))
+            notified.append(card.pk)
+
+        # Mensajes y marca en la misma transacción; en bloque (update no dispara signals)
+        with transaction.atomic():
+            for start in range(0, len(messages), 500):
+                enqueue_notifications(messages[start:start + 500])
+            for start in range(0, len(notified), 500):
+                StampCard.objects.filter(pk__in=notified[start:start + 500]).update(expiring_notified=True)
+
+        self.stdout.write(self.style.SUCCESS(f'Se encolaron {len(notified)} recordatorios de expiración.'))
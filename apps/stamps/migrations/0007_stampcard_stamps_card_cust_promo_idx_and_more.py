@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_organization_custom_background_color_and_more'),
+        ('customers', '0005_customer_cust_org_created_idx_and_more'),
+        ('stamps', '0006_stamprequest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stampcard',
+            index=models.Index(fields=['customer', 'promotion', 'is_completed', 'is_redeemed'], name='stamps_card_cust_promo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stampcard',
+            index=models.Index(fields=['organization', 'is_redeemed', 'is_completed'], name='stamps_card_org_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stamprequest',
+            index=models.Index(fields=['organization', 'status'], name='stamps_req_org_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stamprequest',
+            index=models.Index(fields=['customer', 'promotion', 'status', 'requested_at'], name='stamps_req_cust_promo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stamprequest',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['organization', '-requested_at'], name='stamps_req_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stamptransaction',
+            index=models.Index(fields=['organization', 'created_at', 'action'], name='stamps_tx_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stamptransaction',
+            index=models.Index(fields=['card', 'action', 'created_at'], name='stamps_tx_card_action_idx'),
+        ),
+    ]
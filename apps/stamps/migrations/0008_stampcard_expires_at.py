@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestmetric'),
+        ('customers', '0005_customer_cust_org_created_idx_and_more'),
+        ('stamps', '0007_stampcard_stamps_card_cust_promo_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stampcard',
+            name='expired',
+            field=models.BooleanField(default=False, verbose_name='Expirada'),
+        ),
+        migrations.AddField(
+            model_name='stampcard',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Vence el'),
+        ),
+        migrations.AddIndex(
+            model_name='stampcard',
+            index=models.Index(fields=['expired', 'expires_at'], name='stamps_card_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stampcard',
+            index=models.Index(fields=['expiring_notified', 'expires_at'], name='stamps_card_expiring_idx'),
+        ),
+    ]
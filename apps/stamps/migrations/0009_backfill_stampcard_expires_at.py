@@ -0,0 +1,37 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:22
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_expires_at(apps, schema_editor):
+    Organization = apps.get_model('core', 'Organization')
+    StampCard = apps.get_model('stamps', 'StampCard')
+    now = timezone.now()
+
+    for organization in Organization.objects.filter(stamps_expiration_months__gt=0).iterator():
+        delta = relativedelta(months=organization.stamps_expiration_months)
+        cards = StampCard.objects.filter(organization=organization)
+        batch = []
+        for card in cards.only('pk', 'created_at').iterator(chunk_size=1000):
+            card.expires_at = card.created_at + delta
+            batch.append(card)
+            if len(batch) >= 1000:
+                StampCard.objects.bulk_update(batch, ['expires_at'])
+                batch = []
+        if batch:
+            StampCard.objects.bulk_update(batch, ['expires_at'])
+        cards.filter(expires_at__lte=now).update(expired=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestmetric'),
+        ('stamps', '0008_stampcard_expires_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:24
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def merge_duplicate_open_cards(apps, schema_editor):
+    """
+    Une las tarjetas abiertas duplicadas de un mismo (cliente, promoción)
+    antes de crear la restricción stamps_one_open_card: los sellos se suman
+    en la más antigua y su historial se traslada a ella.
+    """
+    StampCard = apps.get_model('stamps', 'StampCard')
+    StampTransaction = apps.get_model('stamps', 'StampTransaction')
+
+    open_cards = StampCard.objects.filter(is_completed=False, is_redeemed=False, expired=False)
+    duplicates = (
+        open_cards.values('customer_id', 'promotion_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+    )
+    for row in list(duplicates):
+        cards = list(
+            open_cards.filter(customer_id=row['customer_id'], promotion_id=row['promotion_id'])
+            .select_related('promotion')
+            .order_by('created_at', 'id')
+        )
+        keeper, others = cards[0], cards[1:]
+        stamps = sum(card.current_stamps for card in cards)
+        # update() para conservar last_stamp_at (auto_now) del último sello real
+        StampCard.objects.filter(id=keeper.id).update(
+            current_stamps=stamps,
+            is_completed=stamps >= keeper.promotion.total_stamps_needed,
+            last_stamp_at=max(card.last_stamp_at for card in cards),
+        )
+
+        other_ids = [card.id for card in others]
+        StampTransaction.objects.filter(card_id__in=other_ids).update(card_id=keeper.id)
+        StampCard.objects.filter(id__in=other_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stamps', '0009_backfill_stampcard_expires_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_open_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestmetric'),
+        ('customers', '0005_customer_cust_org_created_idx_and_more'),
+        ('stamps', '0010_merge_duplicate_open_cards'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='stampcard',
+            constraint=models.UniqueConstraint(condition=models.Q(('expired', False), ('is_completed', False), ('is_redeemed', False)), fields=('customer', 'promotion'), name='stamps_one_open_card'),
+        ),
+    ]
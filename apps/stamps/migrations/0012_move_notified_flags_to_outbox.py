@@ -0,0 +1,47 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:33
+
+from django.db import migrations
+
+
+def flags_to_dedupe_keys(apps, schema_editor):
+    """
+    Los avisos ya enviados (completed_notified / one_stamp_reminder_sent)
+    pasan a ser mensajes SENT en la bandeja de salida con la misma
+    dedupe_key que usa stamps.services, para no repetirlos.
+    """
+    StampCard = apps.get_model('stamps', 'StampCard')
+    NotificationOutbox = apps.get_model('campaigns', 'NotificationOutbox')
+
+    for flag, kind in (('completed_notified', 'stamp_completed'), ('one_stamp_reminder_sent', 'stamp_one_left')):
+        cards = StampCard.objects.filter(**{flag: True}).values_list('id', 'organization_id', 'customer_id')
+        batch = []
+        for card_id, organization_id, customer_id in cards.iterator(chunk_size=1000):
+            batch.append(NotificationOutbox(
+                organization_id=organization_id, customer_id=customer_id, channel='WHATSAPP',
+                kind=kind, recipient='', body='', status='SENT', dedupe_key=f"{kind}:{card_id}",
+            ))
+            if len(batch) >= 1000:
+                NotificationOutbox.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            NotificationOutbox.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stamps', '0011_stampcard_one_open_card'),
+        ('campaigns', '0006_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(flags_to_dedupe_keys, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='stampcard',
+            name='completed_notified',
+        ),
+        migrations.RemoveField(
+            model_name='stampcard',
+            name='one_stamp_reminder_sent',
+        ),
+    ]
@@ -45,35 +45,79 @@ class StampCard(TenantAwareModel):
     redemption_requested = models.BooleanField(default=False, verbose_name="Canje solicitado")
     requested_at = models.DateTimeField(null=True, blank=True, verbose_name="Fecha de solicitud")
 
-    # Seguimiento de notificaciones para evitar duplicados
-    one_stamp_reminder_sent = models.BooleanField(default=False, verbose_name="Recordatorio 'Falta 1' enviado")
-    completed_notified = models.BooleanField(default=False, verbose_name="Notificación 'Completada' enviada")
+    # Recordatorio "por vencer" ya encolado (selección indexada del comando diario).
+    # Los avisos de progreso se deduplican en la bandeja de salida (campaigns.NotificationOutbox).
     expiring_notified = models.BooleanField(default=False, verbose_name="Notificación 'Por Vencer' enviada")
 
+    # Vencimiento persistido (created_at + stamps_expiration_months del negocio).
+    # `expired` lo marca el barrido nocturno (manage.py expire_stamp_cards).
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Vence el")
+    expired = models.BooleanField(default=False, verbose_name="Expirada")
+
     class Meta:
         verbose_name = "Tarjeta de Sellos"
         verbose_name_plural = "Tarjetas de Sellos"
         # Quitamos unique_together para permitir acumulación de múltiples premios (tarjetas completadas no canjeadas)
+        indexes = [
+            # Tarjeta activa de un cliente en una promoción
+            models.Index(fields=['customer', 'promotion', 'is_completed', 'is_redeemed'], name='stamps_card_cust_promo_idx'),
+            # Tarjetas vigentes del negocio (listado y dashboard)
+            models.Index(fields=['organization', 'is_redeemed', 'is_completed'], name='stamps_card_org_state_idx'),
+            # Barrido de vencidas y recordatorios "por vencer" (rangos sobre expires_at, todos los negocios)
+            models.Index(fields=['expired', 'expires_at'], name='stamps_card_expiry_idx'),
+            models.Index(fields=['expiring_notified', 'expires_at'], name='stamps_card_expiring_idx'),
+        ]
+        constraints = [
+            # Una sola tarjeta abierta por cliente y promoción (ver services.grant_stamps).
+            # MySQL no soporta restricciones parciales: ahí la garantiza el bloqueo del cliente.
+            models.UniqueConstraint(
+                fields=['customer', 'promotion'],
+                condition=models.Q(is_completed=False, is_redeemed=False, expired=False),
+                name='stamps_one_open_card',
+            ),
+        ]
+
+    @staticmethod
+    def compute_expires_at(created_at, months):
+        """Fecha de vencimiento para una vigencia en meses (None = sin límite)"""
+        if not months or months <= 0 or created_at is None:
+            return None
+        from dateutil.relativedelta import relativedelta
+        return created_at + relativedelta(months=months)
+
+    @staticmethod
+    def alive_q(now=None):
+        """
+        Filtro de tarjetas vigentes (no vencidas). Revisa también expires_at
+        para ser exacto entre dos barridos de expire_stamp_cards.
+        """
+        from django.utils import timezone
+        now = now or timezone.now()
+        return models.Q(expired=False) & (models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now))
 
     @property
     def is_expired(self):
-        """Verifica si la tarjeta ha expirado según la configuración del tenant"""
-        months = getattr(self.organization, 'stamps_expiration_months', 0)
-        if months <= 0:
+        """Verifica si la tarjeta ha expirado (según expires_at persistido)"""
+        if self.expired:
+            return True
+        if self.expires_at is None:
             return False
-        
+
         from django.utils import timezone
-        from dateutil.relativedelta import relativedelta
-        return timezone.now() > self.created_at + relativedelta(months=months)
+        return timezone.now() >= self.expires_at
 
     @property
     def expiration_date(self):
         """Retorna la fecha exacta de expiración"""
-        months = getattr(self.organization, 'stamps_expiration_months', 0)
-        if months <= 0:
-            return None
-        from dateutil.relativedelta import relativedelta
-        return self.created_at + relativedelta(months=months)
+        return self.expires_at
+
+    def save(self, *args, **kwargs):
+        # Calcular el vencimiento al crear la tarjeta (la vigencia es del negocio)
+        if self._state.adding and self.expires_at is None and self.organization_id:
+            from django.utils import timezone
+            months = getattr(self.organization, 'stamps_expiration_months', 0)
+            self.expires_at = self.compute_expires_at(self.created_at or timezone.now(), months)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.customer} - {self.current_stamps}/{self.promotion.total_stamps_needed}"
@@ -97,6 +141,12 @@ class StampTransaction(TenantAwareModel):
     class Meta:
         verbose_name = "Transacción de Sello"
         verbose_name_plural = "Transacciones de Sellos"
+        indexes = [
+            # Actividad del día y canjes por negocio
+            models.Index(fields=['organization', 'created_at', 'action'], name='stamps_tx_org_created_idx'),
+            # Historial de una tarjeta (anti-fraude, evolución del cliente)
+            models.Index(fields=['card', 'action', 'created_at'], name='stamps_tx_card_action_idx'),
+        ]
 
 class StampRequest(TenantAwareModel):
     """
@@ -120,6 +170,16 @@ class StampRequest(TenantAwareModel):
         verbose_name = "Solicitud de Sello"
         verbose_name_plural = "Solicitudes de Sellos"
         ordering = ['-requested_at']
+        indexes = [
+            models.Index(fields=['organization', 'status'], name='stamps_req_org_status_idx'),
+            # Cooldown y conteo de pendientes por cliente/promoción
+            models.Index(fields=['customer', 'promotion', 'status', 'requested_at'], name='stamps_req_cust_promo_idx'),
+            # Bandeja de pendientes (índice parcial; MySQL lo omite y usa el anterior)
+            models.Index(
+                fields=['organization', '-requested_at'], name='stamps_req_pending_idx',
+                condition=models.Q(status='PENDING')
+            ),
+        ]
 
     def __str__(self):
         return f"Solicitud: {self.customer} ({self.get_status_display()})"
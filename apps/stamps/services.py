@@ -0,0 +1,327 @@
+"""
+Servicio de sellos: única vía para otorgar sellos a un cliente.
+
+`grant_stamps` incrementa la tarjeta abierta con un UPDATE atómico
+(current_stamps = current_stamps + N), así dos barberos escaneando al mismo
+cliente no pierden sellos. La restricción `stamps_one_open_card` garantiza
+una sola tarjeta abierta por (cliente, promoción); en MySQL, que no soporta
+restricciones parciales, el bloqueo de la fila del cliente serializa la
+creación de la tarjeta.
+
+Caso común (tarjeta existente): 3 consultas (UPDATE, SELECT, INSERT), más
+un INSERT en la bandeja de salida si hay avisos que enviar y 2 del ADN del
+cliente (customers.stats, vía signal).
+`resolve_stamp_requests` resuelve un lote de solicitudes QR con un número
+fijo de consultas (más un INSERT por tarjeta nueva).
+
+Las solicitudes pendientes llevan una versión por negocio
+('stamp_requests') que el long-poll del menú usa para despertar.
+
+Las notificaciones (WhatsApp/Email) se encolan en la bandeja de salida
+dentro de la misma transacción (campaigns.outbox); ningún request espera
+al proveedor.
+"""
+import logging
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from apps.campaigns.outbox import build_notification, enqueue_notifications, get_notification_config
+from apps.core.cache import get_tenant_version, invalidate_context_on_commit
+from apps.campaigns.utils import format_message
+from apps.customers.models import Customer
+from apps.customers.stats import record_visits
+from .models import StampCard, StampRequest, StampTransaction
+
+logger = logging.getLogger(__name__)
+
+
+def open_cards(customer, promotion):
+    """Tarjetas abiertas (ni completadas, ni canjeadas, ni expiradas) de un cliente en una promoción"""
+    return StampCard.objects.filter(
+        customer=customer, promotion=promotion, is_completed=False, is_redeemed=False, expired=False
+    )
+
+
+def _increment_open_card(customer, promotion, quantity, now):
+    """UPDATE atómico de la tarjeta abierta vigente. Retorna las filas afectadas (0 o 1)."""
+    needed = promotion.total_stamps_needed
+    return open_cards(customer, promotion).filter(
+        models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now)
+    ).update(
+        # is_completed va primero: MySQL evalúa las asignaciones en orden y debe ver el valor previo
+        is_completed=models.Case(
+            models.When(current_stamps__gte=needed - quantity, then=models.Value(True)),
+            default=models.Value(False),
+        ),
+        current_stamps=models.F('current_stamps') + quantity,
+        last_stamp_at=now,
+    )
+
+
+def _create_open_card(customer, promotion, quantity, organization):
+    card = StampCard(
+        organization=organization or customer.organization,
+        customer=customer,
+        promotion=promotion,
+        current_stamps=quantity,
+        is_completed=quantity >= promotion.total_stamps_needed,
+    )
+    # Las notificaciones las encola grant_stamps
+    card._skip_notifications = True
+    card.save()
+    return card
+
+
+# Intentos de UPDATE/alta de la tarjeta abierta con el cliente bloqueado
+GRANT_ATTEMPTS = 3
+
+
+def grant_stamps(customer, promotion, quantity=1, performed_by=None, organization=None, notify=True):
+    """
+    Otorga `quantity` sellos al cliente en su tarjeta abierta de la promoción
+    (creándola si no existe) y registra la transacción ADD. `organization`
+    (opcional, ej: request.tenant) evita leer el negocio al crear la tarjeta.
+    Retorna (card, created). Las notificaciones quedan en la bandeja de salida.
+    """
+    now = timezone.now()
+    created = False
+
+    with transaction.atomic():
+        if not _increment_open_card(customer, promotion, quantity, now):
+            # Sin tarjeta abierta: serializar la creación por cliente y reintentar
+            list(Customer.objects.select_for_update().filter(pk=customer.pk).values_list('pk', flat=True))
+            # Tarjeta vencida que el barrido aún no marcó (liberar la restricción)
+            open_cards(customer, promotion).filter(expires_at__lte=now).update(expired=True)
+
+            for attempt in range(GRANT_ATTEMPTS):
+                if _increment_open_card(customer, promotion, quantity, now):
+                    break
+                try:
+                    with transaction.atomic():
+                        card = _create_open_card(customer, promotion, quantity, organization)
+                    created = True
+                    break
+                except IntegrityError:
+                    # Otra petición creó la tarjeta abierta entre medio (y puede
+                    # haberla completado ya): volver a intentar el UPDATE o el alta
+                    continue
+            else:
+                raise RuntimeError(
+                    f"No se pudo otorgar sellos al cliente {customer.pk} en la promoción {promotion.pk}: "
+                    f"la tarjeta abierta cambió en cada uno de los {GRANT_ATTEMPTS} intentos"
+                )
+
+        if not created:
+            # La fila sigue bloqueada por el UPDATE: last_stamp_at=now la identifica
+            card = StampCard.objects.filter(
+                customer=customer, promotion=promotion, last_stamp_at=now
+            ).order_by('-pk').first()
+        card.promotion = promotion
+        card.customer = customer
+
+        StampTransaction.objects.create(
+            organization_id=customer.organization_id,
+            card=card,
+            action='ADD',
+            quantity=quantity,
+            performed_by=performed_by,
+        )
+
+        if notify:
+            enqueue_stamps_granted(customer.organization_id, [(card, quantity)], organization=organization)
+
+    return card, created
+
+
+PENDING_SCOPE = 'stamp_requests'
+
+
+def touch_pending_requests(organization_id):
+    """Incrementa la versión de solicitudes pendientes al confirmar la transacción"""
+    invalidate_context_on_commit(PENDING_SCOPE, organization_id)
+
+
+def pending_requests_version(organization_id):
+    return get_tenant_version(PENDING_SCOPE, organization_id)
+
+
+def pending_requests_state(organization):
+    """
+    Huella de las solicitudes pendientes: "cantidad-último ID". Los IDs son
+    crecientes, así que cualquier alta cambia el último ID y cualquier
+    resolución cambia la cantidad.
+    """
+    row = StampRequest.objects.filter(organization=organization, status='PENDING').aggregate(
+        count=models.Count('id'), last=models.Max('id')
+    )
+    return f"{row['count']}-{row['last'] or 0}"
+
+
+def resolve_stamp_requests(organization, ids, action, user, notify=True):
+    """
+    Aprueba o rechaza en una transacción un lote de solicitudes QR del negocio.
+
+    Las aprobaciones se agrupan por (cliente, promoción) y se reparten como si
+    se resolvieran una a una: cada sello va a la tarjeta abierta y, al
+    completarse, los siguientes abren una tarjeta nueva. Tarjetas existentes
+    en un bulk_update, transacciones en un bulk_create.
+
+    Retorna una lista de resultados por ID (en el orden recibido):
+    {'id', 'status': 'APPROVED'|'REJECTED'|'SKIPPED'|'NOT_FOUND', 'request', 'card'}.
+    """
+    now = timezone.now()
+    approve = action == 'approve'
+
+    with transaction.atomic():
+        requests = {
+            r.pk: r for r in StampRequest.objects.select_for_update()
+            .filter(organization=organization, pk__in=ids)
+            .select_related('customer', 'promotion')
+        }
+        pending = sorted(
+            (r for r in requests.values() if r.status == 'PENDING'),
+            key=lambda r: (r.requested_at, r.pk)
+        )
+        card_for = {}
+
+        if approve and pending:
+            customer_ids = {r.customer_id for r in pending}
+            promotion_ids = {r.promotion_id for r in pending}
+            # Serializa la creación de tarjetas con grant_stamps (mismo bloqueo por cliente)
+            list(Customer.objects.select_for_update().filter(pk__in=customer_ids).values_list('pk', flat=True))
+
+            candidates = StampCard.objects.filter(
+                organization=organization, customer_id__in=customer_ids, promotion_id__in=promotion_ids,
+                is_completed=False, is_redeemed=False, expired=False,
+            )
+            # Vencidas que el barrido aún no marcó (liberar la restricción de tarjeta abierta)
+            candidates.filter(expires_at__lte=now).update(expired=True)
+            open_by_pair = {
+                (card.customer_id, card.promotion_id): card
+                for card in candidates.select_for_update()
+            }
+
+            # Sellos por tarjeta: {id(card): (card, cantidad)}
+            granted, new_cards = {}, []
+            for stamp_request in pending:
+                pair = (stamp_request.customer_id, stamp_request.promotion_id)
+                card = open_by_pair.get(pair)
+                if card is None:
+                    card = StampCard(organization=organization, current_stamps=0)
+                    new_cards.append(card)
+                card.customer, card.promotion = stamp_request.customer, stamp_request.promotion
+                card.current_stamps += 1
+                card.last_stamp_at = now
+                if card.current_stamps >= stamp_request.promotion.total_stamps_needed:
+                    card.is_completed = True
+                    open_by_pair.pop(pair, None)  # El siguiente sello abre otra tarjeta
+                else:
+                    open_by_pair[pair] = card
+                card_for[stamp_request.pk] = card
+                granted[id(card)] = (card, granted.get(id(card), (card, 0))[1] + 1)
+
+            existing = [card for card, _ in granted.values() if card.pk]
+            if existing:
+                StampCard.objects.bulk_update(existing, ['current_stamps', 'is_completed', 'last_stamp_at'])
+            for card in new_cards:
+                # Las notificaciones se encolan juntas (ver abajo)
+                card._skip_notifications = True
+                card.save()
+
+            transactions = StampTransaction.objects.bulk_create([
+                StampTransaction(
+                    organization=organization, card=card_for[r.pk], action='ADD', quantity=1, performed_by=user
+                )
+                for r in pending
+            ])
+            # bulk_create no dispara signals: visitas al ADN del cliente
+            record_visits([
+                (organization.pk, r.customer_id, tx.created_at, r.promotion.name)
+                for r, tx in zip(pending, transactions)
+            ])
+
+            if notify:
+                enqueue_stamps_granted(organization.pk, granted.values(), organization=organization)
+
+        if pending:
+            StampRequest.objects.filter(pk__in=[r.pk for r in pending]).update(
+                status='APPROVED' if approve else 'REJECTED', resolved_at=now, resolved_by=user
+            )
+            # update()/bulk_create no disparan signals
+            touch_pending_requests(organization.pk)
+            if approve:
+                invalidate_context_on_commit('activity', organization.pk)
+
+    resolved = {r.pk for r in pending}
+    results = []
+    for pk in ids:
+        stamp_request = requests.get(pk)
+        if stamp_request is None:
+            results.append({'id': pk, 'status': 'NOT_FOUND', 'request': None, 'card': None})
+        elif pk not in resolved:
+            results.append({'id': pk, 'status': 'SKIPPED', 'request': stamp_request, 'card': None})
+        else:
+            results.append({
+                'id': pk, 'status': 'APPROVED' if approve else 'REJECTED',
+                'request': stamp_request, 'card': card_for.get(pk),
+            })
+    return results
+
+
+def card_progress_messages(card, config):
+    """
+    WhatsApp de tarjeta completada o 'falta 1 sello'. La dedupe_key por
+    tarjeta garantiza un solo aviso de cada tipo, aunque se deshaga un sello
+    y se vuelva a otorgar.
+    """
+    customer = card.customer
+    if not customer.phone or not config.whatsapp_api_url:
+        return []
+
+    if card.is_completed and not card.is_redeemed:
+        kind, template = 'stamp_completed', config.template_completed
+    elif not card.is_completed and card.current_stamps == card.promotion.total_stamps_needed - 1:
+        kind, template = 'stamp_one_left', config.template_one_left
+    else:
+        return []
+    if not template:
+        return []
+
+    return [build_notification(
+        card.organization_id, 'WHATSAPP', customer.phone,
+        format_message(template, customer, promotion=card.promotion),
+        kind=kind, dedupe_key=f"{kind}:{card.pk}", customer=customer,
+    )]
+
+
+def enqueue_card_progress(card):
+    """Encola los avisos de progreso de una tarjeta (signal de StampCard)"""
+    config = get_notification_config(card.organization_id)
+    if config is not None:
+        enqueue_notifications(card_progress_messages(card, config))
+
+
+def enqueue_stamps_granted(organization_id, granted, organization=None):
+    """
+    Encola en un solo INSERT los avisos de sellos otorgados: progreso por
+    WhatsApp y correo de "nuevo sello". `granted` son pares (card, cantidad).
+    """
+    config = get_notification_config(organization_id)
+    if config is None:
+        return 0
+
+    messages = []
+    for card, quantity in granted:
+        customer = card.customer
+        if organization is not None:
+            customer.organization = organization  # Plantillas ({negocio}) sin otra consulta
+        messages += card_progress_messages(card, config)
+        if config.email_enabled and customer.email:
+            messages.append(build_notification(
+                organization_id, 'EMAIL', customer.email,
+                f"¡Hola {customer.first_name}! Has recibido {quantity} nuevo(s) sello(s). "
+                f"Tienes {card.current_stamps}/{card.promotion.total_stamps_needed}.",
+                subject="Nuevo Sello Recibido 💈", kind='stamps_granted', customer=customer,
+            ))
+    return enqueue_notifications(messages)
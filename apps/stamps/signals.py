@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import StampCard
-from apps.campaigns.models import NotificationConfig
-from apps.campaigns.utils import send_whatsapp_message, format_message
+from apps.core.cache import invalidate_context_on_commit
+from apps.core.models import Organization
+from .expiry import recompute_expiry
+from .models import StampCard, StampPromotion, StampRequest
+from .services import enqueue_card_progress, touch_pending_requests
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,35 +12,36 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=StampCard)
 def handle_stamp_card_notifications(sender, instance, created, **kwargs):
     """
-    Escucha cambios en las tarjetas de sellos para enviar notificaciones automáticas.
+    Escucha cambios en las tarjetas de sellos para encolar notificaciones automáticas.
+    Los sellos otorgados con services.grant_stamps se notifican desde el servicio.
     """
-    # Solo actuar si el negocio tiene la configuración de notificaciones
-    try:
-        config = NotificationConfig.objects.get(organization=instance.organization)
-    except NotificationConfig.DoesNotExist:
+    if getattr(instance, '_skip_notifications', False):
         return
 
-    customer = instance.customer
-    if not customer.phone:
+    # Solo importan los cambios de progreso (no canjes ni solicitudes de canje)
+    if not created and not instance.has_changed('current_stamps', 'is_completed'):
         return
 
-    # 1. CASO: Tarjeta Completada
-    if instance.is_completed and not instance.is_redeemed and not instance.completed_notified:
-        message = format_message(config.template_completed, customer, promotion=instance.promotion)
-        if send_whatsapp_message(config, customer.phone, message):
-            # Usamos update para evitar disparar el signal de nuevo recursivamente
-            StampCard.objects.filter(pk=instance.pk).update(completed_notified=True)
-            logger.info(f"Notificación de completion enviada a {customer.full_name}")
-
-    # 2. CASO: Falta 1 sello
-    elif not instance.is_completed:
-        needed = instance.promotion.total_stamps_needed
-        if instance.current_stamps == (needed - 1) and not instance.one_stamp_reminder_sent:
-            message = format_message(config.template_one_left, customer, promotion=instance.promotion)
-            if send_whatsapp_message(config, customer.phone, message):
-                StampCard.objects.filter(pk=instance.pk).update(one_stamp_reminder_sent=True)
-                logger.info(f"Notificación de 'falta 1' enviada a {customer.full_name}")
-        
-        # Resetear el flag si por algún motivo bajó de sellos (ej: deshacer) para que pueda volver a enviarse si sube
-        elif instance.current_stamps < (needed - 1) and instance.one_stamp_reminder_sent:
-            StampCard.objects.filter(pk=instance.pk).update(one_stamp_reminder_sent=False)
+    enqueue_card_progress(instance)
+
+
+@receiver(post_save, sender=StampPromotion)
+@receiver(post_delete, sender=StampPromotion)
+def promotion_context_invalidate(sender, instance, **kwargs):
+    """Promociones del modal global de sellos (context processor)"""
+    invalidate_context_on_commit('promotions', instance.organization_id)
+
+
+@receiver(post_save, sender=StampRequest)
+@receiver(post_delete, sender=StampRequest)
+def stamp_request_version_bump(sender, instance, **kwargs):
+    """Despierta el long-poll de solicitudes pendientes del negocio"""
+    touch_pending_requests(instance.organization_id)
+
+
+@receiver(post_save, sender=Organization)
+def recompute_card_expiry(sender, instance, created, **kwargs):
+    """Al cambiar la vigencia del negocio se recalcula expires_at de sus tarjetas"""
+    if created or not instance.has_changed('stamps_expiration_months'):
+        return
+    recompute_expiry(instance)
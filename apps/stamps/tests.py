@@ -1,3 +1,262 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core import cache
+from apps.core.models import Organization
+from apps.customers.models import Customer
+from . import services
+from .models import StampCard, StampPromotion, StampRequest, StampTransaction
+from .services import GRANT_ATTEMPTS, grant_stamps, pending_requests_state, resolve_stamp_requests
+from .views import pending_requests_updates, resolve_stamp_request
+
+User = get_user_model()
+
+
+def create_organization(name):
+    owner = User.objects.create_user(username=f'{name}-owner', email=f'{name.lower()}@example.com', password='x', is_owner=True)
+    return Organization.objects.create(name=name, owner=owner)
+
+
+@override_settings(
+    TENANT_CACHE_BACKEND=None, TENANT_VERSION_REFRESH=0,
+    STAMP_REQUESTS_LONGPOLL_TIMEOUT=5, STAMP_REQUESTS_LONGPOLL_MAX_WAITERS=1, STAMP_REQUESTS_POLL_INTERVAL=15,
+)
+class PendingRequestsLongPollTests(TestCase):
+    """Long-poll de solicitudes QR con la versión compartida de TenantVersion"""
+
+    def setUp(self):
+        self.organization = create_organization('Longpoll')
+        self.customer = Customer.objects.create(organization=self.organization, first_name='Ana', last_name='P')
+        self.promotion = StampPromotion.objects.create(
+            organization=self.organization, name='Corte', total_stamps_needed=5, reward_description='Gratis'
+        )
+        cache._stored_versions.clear()
+
+    def poll(self, state):
+        request = RequestFactory().get('/', {'state': state})
+        request.user, request.tenant = self.organization.owner, self.organization
+        return json.loads(pending_requests_updates(request).content)
+
+    def request_stamp(self):
+        # Otro proceso: la solicitud y el incremento de la versión se confirman
+        with self.captureOnCommitCallbacks(execute=True):
+            return StampRequest.objects.create(organization=self.organization, customer=self.customer, promotion=self.promotion)
+
+    def test_waits_until_the_version_changes(self):
+        state = pending_requests_state(self.organization)
+        created = []
+
+        with mock.patch('apps.stamps.views.time.sleep', side_effect=lambda seconds: created or created.append(self.request_stamp())) as sleep:
+            response = self.poll(state)
+
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual((response['changed'], response['retry_ms'], response['count']), (True, 0, 1))
+        self.assertEqual([r['id'] for r in response['requests']], [created[0].pk])
+
+    def test_without_changes_waits_for_the_timeout(self):
+        state = pending_requests_state(self.organization)
+        clock = [0]
+
+        def advance(seconds):
+            clock[0] += seconds
+
+        with mock.patch('apps.stamps.views.time.monotonic', side_effect=lambda: clock[0]), \
+                mock.patch('apps.stamps.views.time.sleep', side_effect=advance) as sleep:
+            response = self.poll(state)
+
+        self.assertEqual(sleep.call_count, 5)
+        self.assertEqual((response['changed'], response['retry_ms']), (False, 0))
+
+    @override_settings(STAMP_REQUESTS_LONGPOLL_TIMEOUT=0)
+    def test_disabled_answers_at_once_with_poll_interval(self):
+        state = pending_requests_state(self.organization)
+
+        with mock.patch('apps.stamps.views.time.sleep') as sleep:
+            response = self.poll(state)
+
+        sleep.assert_not_called()
+        self.assertEqual((response['changed'], response['retry_ms']), (False, 15000))
+
+
+class StampLedgerTests(TestCase):
+    """grant_stamps y resolve_stamp_requests: una tarjeta abierta por cliente y promoción"""
+
+    def setUp(self):
+        self.organization = create_organization('Ledger')
+        self.customer = Customer.objects.create(organization=self.organization, first_name='Ana', last_name='L')
+        self.promotion = StampPromotion.objects.create(
+            organization=self.organization, name='Corte', total_stamps_needed=3, reward_description='Gratis'
+        )
+
+    def grant(self, quantity=1):
+        return grant_stamps(self.customer, self.promotion, quantity, notify=False)
+
+    def cards(self):
+        return list(StampCard.objects.order_by('pk').values_list('current_stamps', 'is_completed', 'expired'))
+
+    def test_grants_accumulate_on_the_open_card(self):
+        first, created_first = self.grant()
+        second, created_second = self.grant()
+
+        self.assertEqual((created_first, created_second), (True, False))
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(self.cards(), [(2, False, False)])
+        self.assertEqual(list(StampTransaction.objects.values_list('card', 'quantity')), [(first.pk, 1), (first.pk, 1)])
+
+    def test_completed_card_gives_way_to_a_new_one(self):
+        self.grant(2)
+        card, created = self.grant()
+        self.assertFalse(created)
+        self.assertTrue(card.is_completed)
+
+        next_card, created = self.grant()
+
+        self.assertTrue(created)
+        self.assertNotEqual(next_card.pk, card.pk)
+        self.assertEqual(self.cards(), [(3, True, False), (1, False, False)])
+
+    def test_expired_card_not_yet_swept_is_replaced(self):
+        StampCard.objects.create(
+            organization=self.organization, customer=self.customer, promotion=self.promotion,
+            current_stamps=2, expires_at=timezone.now() - timedelta(minutes=1),
+        )
+
+        card, created = self.grant()
+
+        self.assertTrue(created)
+        self.assertEqual(self.cards(), [(2, False, True), (1, False, False)])
+
+    def test_second_open_card_violates_the_constraint(self):
+        self.grant()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            StampCard.objects.create(organization=self.organization, customer=self.customer, promotion=self.promotion)
+
+    def test_bulk_approval_spreads_stamps_like_one_by_one(self):
+        self.grant(2)
+        ids = [
+            StampRequest.objects.create(organization=self.organization, customer=self.customer, promotion=self.promotion).pk
+            for _ in range(5)
+        ]
+        owner = self.organization.owner
+
+        results = resolve_stamp_requests(self.organization, ids + [0], 'approve', owner, notify=False)
+
+        self.assertEqual([r['status'] for r in results], ['APPROVED'] * 5 + ['NOT_FOUND'])
+        # 2 + 5 sellos: completa la abierta, llena otra y abre una tercera
+        self.assertEqual(self.cards(), [(3, True, False), (3, True, False), (1, False, False)])
+        self.assertEqual(StampTransaction.objects.count(), 1 + 5)
+        self.assertEqual(set(StampRequest.objects.values_list('status', flat=True)), {'APPROVED'})
+
+        again = resolve_stamp_requests(self.organization, ids[:1], 'approve', owner, notify=False)
+        self.assertEqual(again[0]['status'], 'SKIPPED')
+        self.assertEqual(StampTransaction.objects.count(), 6)
+
+
+class GrantStampsRetryTests(TestCase):
+    """grant_stamps cuando otra petición crea la tarjeta abierta entre medio"""
+
+    def setUp(self):
+        self.organization = create_organization('Grant')
+        self.customer = Customer.objects.create(organization=self.organization, first_name='Ana', last_name='G')
+        self.promotion = StampPromotion.objects.create(
+            organization=self.organization, name='Corte', total_stamps_needed=3, reward_description='Gratis'
+        )
+
+    def test_card_completed_meanwhile_creates_a_new_one(self):
+        # La tarjeta que otra petición abrió entre medio (y que hizo fallar el alta) ya está completada
+        StampCard.objects.create(
+            organization=self.organization, customer=self.customer, promotion=self.promotion,
+            current_stamps=3, is_completed=True,
+        )
+        create = services._create_open_card
+        conflicts = [IntegrityError('stamps_one_open_card')]
+
+        def conflict_once(*args):
+            if conflicts:
+                raise conflicts.pop()
+            return create(*args)
+
+        with mock.patch('apps.stamps.services._create_open_card', side_effect=conflict_once):
+            card, created = grant_stamps(self.customer, self.promotion, 1, notify=False)
+
+        self.assertTrue(created)
+        self.assertEqual((card.current_stamps, card.is_completed), (1, False))
+        self.assertEqual(StampCard.objects.count(), 2)
+        self.assertEqual(StampTransaction.objects.get().card, card)
+
+    def test_conflict_on_every_attempt_raises_a_clear_error(self):
+        with mock.patch('apps.stamps.services._create_open_card', side_effect=IntegrityError('stamps_one_open_card')) as create, \
+                self.assertRaisesMessage(RuntimeError, 'No se pudo otorgar sellos'):
+            grant_stamps(self.customer, self.promotion, 1, notify=False)
+
+        self.assertEqual(create.call_count, GRANT_ATTEMPTS)
+        self.assertFalse(StampTransaction.objects.exists())
+
+
+class ResolveStampRequestTests(TestCase):
+    """Aprobación individual de solicitudes QR"""
+
+    def setUp(self):
+        self.organization = create_organization('Resolve')
+        customer = Customer.objects.create(organization=self.organization, first_name='Ana', last_name='R')
+        promotion = StampPromotion.objects.create(
+            organization=self.organization, name='Corte', total_stamps_needed=5, reward_description='Gratis'
+        )
+        self.stamp_request = StampRequest.objects.create(organization=self.organization, customer=customer, promotion=promotion)
+
+    def approve(self):
+        request = RequestFactory().post('/', {'action': 'approve'})
+        request.user, request.tenant = self.organization.owner, self.organization
+        return resolve_stamp_request(request, self.stamp_request.pk)
+
+    def test_request_is_locked_and_approved_once(self):
+        with mock.patch.object(StampRequest.objects, 'select_for_update', wraps=StampRequest.objects.select_for_update) as lock:
+            first = self.approve()
+        second = self.approve()
+
+        lock.assert_called_once_with()
+        self.assertEqual((first.status_code, second.status_code), (200, 400))
+        self.assertEqual(StampCard.objects.get().current_stamps, 1)
+        self.assertEqual(StampTransaction.objects.count(), 1)
+
+
+class QrRequestStampTests(TestCase):
+    """Formulario público de solicitud de sello por QR"""
+
+    def setUp(self):
+        self.organization = create_organization('Qr')
+        self.promotion = StampPromotion.objects.create(
+            organization=self.organization, name='Corte', total_stamps_needed=5, reward_description='Gratis'
+        )
+        self.customer = Customer.objects.create(organization=self.organization, first_name='Ana', last_name='Q', phone='999111222')
+
+    def scan(self):
+        url = reverse('stamps_public:qr_request', kwargs={'slug': self.organization.slug})
+        return self.client.post(url, {'phone': '999111222', 'first_name': 'Ana'})
+
+    def test_expired_card_is_not_shown_as_active(self):
+        StampCard.objects.create(
+            organization=self.organization, customer=self.customer, promotion=self.promotion,
+            current_stamps=3, expires_at=timezone.now() - timedelta(days=1),
+        )
+
+        response = self.scan()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.context['active_card'])
+
+    def test_alive_card_is_shown(self):
+        card = StampCard.objects.create(
+            organization=self.organization, customer=self.customer, promotion=self.promotion,
+            current_stamps=3, expires_at=timezone.now() + timedelta(days=30),
+        )
+
+        self.assertEqual(self.scan().context['active_card'], card)
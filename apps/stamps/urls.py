@@ -23,7 +23,9 @@ urlpatterns = [
     path('requests/', views.pending_requests_list, name='pending_requests_list'),
     path('scan/', views.qr_scanner, name='qr_scanner'),
     path('api/requests/pending/', views.get_pending_requests, name='get_pending_requests'),
+    path('api/requests/updates/', views.pending_requests_updates, name='pending_requests_updates'),
     path('api/requests/<int:pk>/resolve/', views.resolve_stamp_request, name='resolve_stamp_request'),
+    path('api/requests/resolve/', views.bulk_resolve_stamp_requests, name='bulk_resolve_stamp_requests'),
     path('api/customer-nudge/', views.api_customer_nudge, name='api_customer_nudge'),
     path('assignment-success/<int:card_id>/', views.assignment_success, name='assignment_success'),
 ]
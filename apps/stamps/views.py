@@ -8,19 +8,28 @@ from .models import StampPromotion, StampCard, StampTransaction
 from .forms import StampPromotionForm, StampAssignmentForm
 from django.core.paginator import Paginator
 from apps.customers.models import Customer
-from apps.audit.utils import log_action
-from apps.core.models import Organization, set_current_tenant
+from apps.customers.phones import find_by_phone, normalize_phone
+from apps.customers.search import search_customer_ids
+from apps.audit.models import AuditLog
+from apps.audit.utils import build_audit_log, log_action
+from apps.core.models import set_current_tenant
+from apps.core.cache import get_active_organization_or_404
 from .models import StampPromotion, StampCard, StampTransaction, StampRequest
+from .services import (
+    PENDING_SCOPE, grant_stamps, open_cards, pending_requests_state, pending_requests_version,
+    resolve_stamp_requests,
+)
 from django.utils import timezone
-from apps.core.decorators import owner_or_superuser_required
-from apps.campaigns.models import NotificationConfig
-from apps.campaigns.utils import send_email_notification, format_message
+from apps.core.decorators import owner_or_superuser_required, tenant_etag
 from django.urls import reverse
+from django.conf import settings
+import threading
+import time
 import urllib.parse
 
 def qr_request_stamp(request, slug):
     """Vista pública para solicitar un sello vía QR"""
-    organization = get_object_or_404(Organization, slug=slug, is_active=True)
+    organization = get_active_organization_or_404(slug)
     set_current_tenant(organization)
     
     # Buscar una promoción activa (la más reciente)
@@ -36,16 +45,21 @@ def qr_request_stamp(request, slug):
         phone = request.POST.get('phone', '').strip()
         first_name = request.POST.get('first_name', '').strip()
         
+        normalized_phone = normalize_phone(phone)
+        
         if not phone:
             messages.error(request, "El número de teléfono es obligatorio.")
+        elif not normalized_phone:
+            messages.error(request, "Ingresa un número de teléfono válido.")
         elif not first_name:
             messages.error(request, "El nombre es obligatorio.")
         else:
-            # Buscar o crear cliente
+            # Buscar o crear cliente por teléfono normalizado (único por negocio:
+            # escaneos simultáneos no crean duplicados, get_or_create reintenta la búsqueda)
             customer, created = Customer.objects.get_or_create(
-                phone=phone,
+                phone_normalized=normalized_phone,
                 organization=organization,
-                defaults={'first_name': first_name or 'Cliente QR'}
+                defaults={'phone': phone, 'first_name': first_name or 'Cliente QR'}
             )
             
             # NUEVO: Evitar duplicados según la configuración del negocio (Cooldown dinámico)
@@ -76,8 +90,9 @@ def qr_request_stamp(request, slug):
                 status='PENDING'
             ).count()
             
-            # Buscar tarjeta activa
+            # Buscar tarjeta activa (excluye expiradas, expires_at persistido)
             active_card = StampCard.objects.filter(
+                StampCard.alive_q(),
                 customer=customer,
                 promotion=promotion,
                 is_completed=False,
@@ -104,7 +119,7 @@ def qr_request_stamp(request, slug):
 
 def public_lookup(request, slug):
     """Vista pública para consultar sellos por teléfono (sin login)"""
-    organization = get_object_or_404(Organization, slug=slug, is_active=True)
+    organization = get_active_organization_or_404(slug)
     set_current_tenant(organization)
     
     cards = []
@@ -112,11 +127,12 @@ def public_lookup(request, slug):
     phone = request.GET.get('phone', '').strip()
     
     if phone:
-        customer = Customer.objects.filter(phone=phone, organization=organization).first()
+        customer = find_by_phone(organization, phone)
         if customer:
-            cards = StampCard.objects.filter(customer=customer, is_redeemed=False).select_related('promotion').order_by('-current_stamps')
-            # Filtrar expiradas
-            cards = [c for c in cards if not c.is_expired]
+            # Excluir expiradas en la consulta (expires_at persistido)
+            cards = list(StampCard.objects.filter(
+                StampCard.alive_q(), customer=customer, is_redeemed=False
+            ).select_related('promotion').order_by('-current_stamps'))
             
             # Buscar solicitudes pendientes
             from .models import StampRequest
@@ -142,6 +158,7 @@ def public_lookup(request, slug):
     })
 
 @login_required
+@tenant_etag(PENDING_SCOPE, 'customers', key=lambda request: request.GET.get('q', ''))
 def get_pending_requests(request):
     """API para obtener solicitudes de sellos pendientes"""
     if not hasattr(request, 'tenant'):
@@ -154,25 +171,105 @@ def get_pending_requests(request):
     ).select_related('customer', 'promotion')
     
     if query:
-        requests = requests.filter(
-            models.Q(customer__first_name__icontains=query) |
-            models.Q(customer__last_name__icontains=query) |
-            models.Q(customer__phone__icontains=query)
-        )
+        requests = requests.filter(customer_id__in=search_customer_ids(request.tenant, query))
     
-    data = []
-    for r in requests:
-        data.append({
-            'id': r.id,
-            'customer_id': r.customer.id,
-            'customer_name': r.customer.full_name,
-            'customer_phone': r.customer.phone,
-            'promotion_name': r.promotion.name,
-            'requested_at': timezone.localtime(r.requested_at).strftime('%H:%M'),
-        })
+    data = [_serialize_request(r) for r in requests]
     
     return JsonResponse({'requests': data})
 
+def _serialize_request(r):
+    return {
+        'id': r.id,
+        'customer_id': r.customer.id,
+        'customer_name': r.customer.full_name,
+        'customer_phone': r.customer.phone,
+        'promotion_name': r.promotion.name,
+        'requested_at': timezone.localtime(r.requested_at).strftime('%H:%M'),
+    }
+
+# Requests esperando en el long-poll en este proceso (tope STAMP_REQUESTS_LONGPOLL_MAX_WAITERS)
+_longpoll_lock = threading.Lock()
+_longpoll_waiters = 0
+
+
+def _longpoll_enabled():
+    return settings.STAMP_REQUESTS_LONGPOLL_TIMEOUT > 0
+
+
+def _acquire_longpoll_slot():
+    """Reserva un lugar para esperar; False si el long-poll está desactivado o lleno"""
+    global _longpoll_waiters
+    if not _longpoll_enabled():
+        return False
+    with _longpoll_lock:
+        if _longpoll_waiters >= settings.STAMP_REQUESTS_LONGPOLL_MAX_WAITERS:
+            return False
+        _longpoll_waiters += 1
+        return True
+
+
+def _release_longpoll_slot():
+    global _longpoll_waiters
+    with _longpoll_lock:
+        _longpoll_waiters -= 1
+
+
+@login_required
+def pending_requests_updates(request):
+    """
+    Long-poll de solicitudes QR pendientes (badge del menú y bandeja).
+
+    El cliente envía la huella que conoce (`state`) y el último ID recibido
+    (`after`). Si el long-poll está habilitado (timeout > 0) y hay lugar, la
+    vista espera hasta que cambie la versión 'stamp_requests' del negocio
+    (compartida entre procesos, ver apps.core.cache) o venza
+    STAMP_REQUESTS_LONGPOLL_TIMEOUT.
+    Si no, responde de inmediato y `retry_ms` indica el intervalo de polling.
+    En ambos casos responde solo el delta: solicitudes nuevas (id > after) y
+    los IDs que siguen pendientes.
+    """
+    if not getattr(request, 'tenant', None):
+        return JsonResponse({'error': 'No tenant'}, status=400)
+
+    organization = request.tenant
+    known_state = request.GET.get('state', '')
+    after = request.GET.get('after', '')
+    after = int(after) if after.isdigit() else 0
+
+    version = pending_requests_version(organization.pk)
+    state = pending_requests_state(organization)
+    waited = False
+    if known_state and state == known_state and _acquire_longpoll_slot():
+        waited = True
+        try:
+            deadline = time.monotonic() + settings.STAMP_REQUESTS_LONGPOLL_TIMEOUT
+            while time.monotonic() < deadline:
+                time.sleep(1)
+                current = pending_requests_version(organization.pk)
+                if current == version:
+                    continue
+                version = current
+                state = pending_requests_state(organization)
+                if state != known_state:
+                    break
+        finally:
+            _release_longpoll_slot()
+
+    response = {
+        'state': state,
+        'changed': state != known_state,
+        # Pausa antes del siguiente request: 0 si se usa long-poll, el intervalo de polling si no
+        'retry_ms': 0 if waited or (not known_state and _longpoll_enabled()) else settings.STAMP_REQUESTS_POLL_INTERVAL * 1000,
+    }
+    if state != known_state:
+        pending = StampRequest.objects.filter(organization=organization, status='PENDING')
+        response['pending_ids'] = list(pending.values_list('id', flat=True))
+        response['count'] = len(response['pending_ids'])
+        response['requests'] = [
+            _serialize_request(r) for r in pending.filter(id__gt=after).select_related('customer', 'promotion')
+        ]
+    return JsonResponse(response)
+
 @login_required
 @transaction.atomic
 def resolve_stamp_request(request, pk):
@@ -180,35 +277,19 @@ def resolve_stamp_request(request, pk):
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
         
-    stamp_request = get_object_or_404(StampRequest, pk=pk, organization=request.tenant)
+    # Bloqueada hasta el fin de la transacción: dos aprobaciones simultáneas
+    # (doble clic, dos pestañas) no otorgan dos sellos
+    stamp_request = get_object_or_404(StampRequest.objects.select_for_update(), pk=pk, organization=request.tenant)
     action = request.POST.get('action') # 'approve' or 'reject'
     
     if stamp_request.status != 'PENDING':
         return JsonResponse({'error': 'Solicitud ya procesada'}, status=400)
         
     if action == 'approve':
-        # Obtener o crear tarjeta
-        card, created = StampCard.objects.get_or_create(
-            customer=stamp_request.customer,
-            promotion=stamp_request.promotion,
-            organization=request.tenant,
-            is_completed=False,
-            is_redeemed=False
-        )
-        
-        # Añadir sello
-        card.current_stamps += 1
-        if card.current_stamps >= card.promotion.total_stamps_needed:
-            card.is_completed = True
-        card.save()
-        
-        # Registrar transacción
-        StampTransaction.objects.create(
-            card=card,
-            action='ADD',
-            quantity=1,
-            performed_by=request.user,
-            organization=request.tenant
+        # Otorgar el sello (tarjeta abierta o nueva) y registrar la transacción
+        card, created = grant_stamps(
+            stamp_request.customer, stamp_request.promotion, 1,
+            performed_by=request.user, organization=request.tenant
         )
         
         # Registrar auditoría
@@ -221,11 +302,6 @@ def resolve_stamp_request(request, pk):
         )
         
         stamp_request.status = 'APPROVED'
-        # NOTIFICACIÓN AUTOMÁTICA (Email)
-        config = NotificationConfig.objects.filter(organization=request.tenant).first()
-        if config and config.email_enabled and stamp_request.customer.email:
-            msg = f"¡Hola {stamp_request.customer.first_name}! Has recibido un nuevo sello. Tienes {card.current_stamps}/{card.promotion.total_stamps_needed}."
-            send_email_notification(config, stamp_request.customer.email, "Nuevo Sello Recibido 💈", msg)
     else:
         stamp_request.status = 'REJECTED'
         
@@ -241,6 +317,66 @@ def resolve_stamp_request(request, pk):
         })
     return JsonResponse({'status': 'ok', 'new_status': stamp_request.status})
 
+BULK_RESOLVE_MAX = 100
+
+@login_required
+def bulk_resolve_stamp_requests(request):
+    """Aprobar o rechazar varias solicitudes de sello en una sola transacción"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not getattr(request, 'tenant', None):
+        return JsonResponse({'error': 'No tenant'}, status=400)
+
+    action = request.POST.get('action')
+    if action not in ('approve', 'reject'):
+        return JsonResponse({'error': 'Acción inválida'}, status=400)
+
+    # ids=1&ids=2 o ids=1,2,3
+    ids = []
+    for value in request.POST.getlist('ids'):
+        ids.extend(int(part) for part in value.split(',') if part.strip().isdigit())
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return JsonResponse({'error': 'No se seleccionaron solicitudes'}, status=400)
+    if len(ids) > BULK_RESOLVE_MAX:
+        return JsonResponse({'error': f'Máximo {BULK_RESOLVE_MAX} solicitudes por lote'}, status=400)
+
+    with transaction.atomic():
+        results = resolve_stamp_requests(request.tenant, ids, action, request.user)
+
+        # Auditoría en un solo INSERT
+        entries = [
+            build_audit_log(
+                request,
+                'STAMP_REQUEST_APPROVED',
+                'Sello QR',
+                f"Sello aprobado vía QR para {item['request'].customer.full_name}",
+                customer=item['request'].customer
+            )
+            for item in results if item['status'] == 'APPROVED'
+        ]
+        AuditLog.objects.bulk_create([entry for entry in entries if entry is not None])
+
+    data = []
+    for item in results:
+        row = {'id': item['id'], 'status': item['status'].lower()}
+        card = item['card']
+        if card is not None:
+            row.update({
+                'card_id': card.pk,
+                'current_stamps': card.current_stamps,
+                'total_stamps_needed': card.promotion.total_stamps_needed,
+                'is_completed': card.is_completed,
+            })
+        if item['status'] == 'NOT_FOUND':
+            row['error'] = 'Solicitud no encontrada'
+        elif item['status'] == 'SKIPPED':
+            row['error'] = 'Solicitud ya procesada'
+        data.append(row)
+
+    resolved = sum(1 for item in results if item['status'] in ('APPROVED', 'REJECTED'))
+    return JsonResponse({'status': 'ok', 'resolved': resolved, 'results': data})
+
 def api_customer_nudge(request):
     """API para que el cliente complete su perfil (soporta actualizaciones parciales)"""
     if request.method != 'POST':
@@ -345,35 +481,10 @@ def assign_stamps(request):
                 messages.error(request, "Selecciona una promoción válida.")
                 return redirect('stamps:card_list')
             
-            with transaction.atomic():
-                # Buscamos SOLO la tarjeta que aún no está llena
-                card, created = StampCard.objects.get_or_create(
-                    customer=customer, 
-                    promotion=active_promo, 
-                    is_completed=False, # <-- Clave para acumulación
-                    is_redeemed=False,
-                    defaults={'current_stamps': 0}
-                )
-                
-                card.current_stamps += quantity
-                if card.current_stamps >= active_promo.total_stamps_needed:
-                    card.is_completed = True
-                    messages.success(request, f"¡Tarjeta completada para {customer.full_name}!")
-                
-                card.save()
-                StampTransaction.objects.create(
-                    organization=request.tenant,
-                    card=card,
-                    action='ADD',
-                    quantity=quantity,
-                    performed_by=request.user
-                )
-
-                # NOTIFICACIÓN AUTOMÁTICA (Email)
-                config = NotificationConfig.objects.filter(organization=request.tenant).first()
-                if config and config.email_enabled and customer.email:
-                    msg = f"¡Hola {customer.first_name}! Has recibido {quantity} nuevos sellos. Tienes {card.current_stamps}/{active_promo.total_stamps_needed}."
-                    send_email_notification(config, customer.email, "Nuevos Sellos Recibidos 💈", msg)
+            # Sellos en la tarjeta abierta (o una nueva); notificaciones al confirmar
+            card, created = grant_stamps(customer, active_promo, quantity, performed_by=request.user, organization=request.tenant)
+            if card.is_completed:
+                messages.success(request, f"¡Tarjeta completada para {customer.full_name}!")
 
             messages.success(request, f"Se agregaron {quantity} sellos.")
             
@@ -393,92 +504,101 @@ def assign_stamps(request):
         'next_url': request.GET.get('next')
     })
 
+CARD_LIST_PAGE_SIZE = 24
+
 @login_required
 def card_list(request):
-    """Ver estado de tarjetas con buscador y solicitudes"""
+    """Ver estado de tarjetas con buscador y solicitudes (paginado por cliente)"""
     query = request.GET.get('q', '')
-    cards = StampCard.objects.filter(organization=request.tenant, is_redeemed=False).select_related('customer', 'promotion').order_by('-redemption_requested', '-last_stamp_at')
-    
+    cards = StampCard.objects.filter(organization=request.tenant, is_redeemed=False)
+
     if query:
-        search_filter = models.Q(customer__first_name__icontains=query) | \
-                        models.Q(customer__last_name__icontains=query) | \
-                        models.Q(customer__phone__icontains=query) | \
-                        models.Q(customer__email__icontains=query)
-        
+        search_filter = models.Q(customer_id__in=search_customer_ids(request.tenant, query))
+
         # NUEVO: Búsqueda por ID numérico (Código de Canje)
         clean_query = query.replace('#', '')
         if clean_query.isdigit():
             search_filter |= models.Q(pk=clean_query)
-            
+
         cards = cards.filter(search_filter)
 
-    from django.utils import timezone
-    today = timezone.localtime().date()
-    
-    # Filtrar tarjetas expiradas del listado general (en memoria ya que depends de una property)
-    cards = [c for c in cards if not c.is_expired]
+    # Excluir tarjetas expiradas en la consulta (equivalente a card.is_expired)
+    cards = cards.filter(StampCard.alive_q())
+
+    # Un grupo por cliente: primero los que tienen canjes solicitados, luego por actividad
+    groups = cards.values('customer_id').annotate(
+        requested_count=models.Count('pk', filter=models.Q(is_completed=True, redemption_requested=True)),
+        last_activity=models.Max('last_stamp_at'),
+        has_requested=models.Case(
+            models.When(requested_count__gt=0, then=models.Value(1)),
+            default=models.Value(0),
+            output_field=models.IntegerField()
+        ),
+    ).order_by('-has_requested', '-last_activity', '-customer_id')
+
+    paginator = Paginator(groups, CARD_LIST_PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    customer_ids = [group['customer_id'] for group in page_obj]
+
+    # Solicitudes QR pendientes agregadas por (cliente, promoción), solo de la página
+    pending_map = {
+        (row['customer_id'], row['promotion_id']): row
+        for row in StampRequest.objects.filter(
+            organization=request.tenant, status='PENDING', customer_id__in=customer_ids
+        ).values('customer_id', 'promotion_id').annotate(
+            count=models.Count('id'), first_id=models.Min('id')
+        ).order_by()
+    }
+
+    customer_groups = {
+        group['customer_id']: {
+            'customer': None,
+            'active_cards': [],
+            'completed_cards': [],
+            'requested_count': group['requested_count'],
+            'total_pending_stamps': 0,
+            'last_activity': group['last_activity']
+        }
+        for group in page_obj
+    }
+    page_cards = cards.filter(customer_id__in=customer_ids).select_related(
+        'customer', 'promotion'
+    ).order_by('-redemption_requested', '-last_stamp_at')
+
+    for card in page_cards:
+        group = customer_groups[card.customer_id]
+        group['customer'] = card.customer
 
-    pending_reqs = StampRequest.objects.filter(
-        organization=request.tenant,
-        status='PENDING'
-    ).order_by('requested_at')
-    
-    pending_map = {} # (cust_id, promo_id) -> {'count': X, 'id': Y}
-    for pr in pending_reqs:
-        key = (pr.customer_id, pr.promotion_id)
-        if key not in pending_map:
-            pending_map[key] = {'count': 0, 'id': pr.id}
-        pending_map[key]['count'] += 1
-
-    # Agrupar tarjetas por cliente
-    customer_groups = {}
-    for card in cards:
-        customer_id = card.customer.id
         # Inyectar pendientes a la tarjeta
-        pd_data = pending_map.get((customer_id, card.promotion.id), {'count': 0, 'id': None})
-        card.pending_count = pd_data['count']
-        card.first_pending_request_id = pd_data['id']
-        
-        if customer_id not in customer_groups:
-            customer_groups[customer_id] = {
-                'customer': card.customer,
-                'active_cards': [],
-                'completed_cards': [],
-                'requested_count': 0,
-                'total_pending_stamps': 0,
-                'last_activity': card.last_stamp_at
-            }
-        
+        pending = pending_map.get((card.customer_id, card.promotion_id))
+        card.pending_count = pending['count'] if pending else 0
+        card.first_pending_request_id = pending['first_id'] if pending else None
+
         if card.is_completed:
-            customer_groups[customer_id]['completed_cards'].append(card)
-            if card.redemption_requested:
-                customer_groups[customer_id]['requested_count'] += 1
+            group['completed_cards'].append(card)
         else:
-            customer_groups[customer_id]['active_cards'].append(card)
-            customer_groups[customer_id]['total_pending_stamps'] += card.pending_count
-        
-        if card.last_stamp_at > customer_groups[customer_id]['last_activity']:
-            customer_groups[customer_id]['last_activity'] = card.last_stamp_at
-
-    # ... sorted algorithm stays the same ...
-    grouped_list = sorted(
-        customer_groups.values(), 
-        key=lambda x: (x['requested_count'] > 0, x['last_activity']), 
-        reverse=True
-    )
+            group['active_cards'].append(card)
+            group['total_pending_stamps'] += card.pending_count
 
-    stats = {
-        'total_active': sum(1 for c in cards if not c.is_completed),
-        'completed': sum(1 for c in cards if c.is_completed and not c.redemption_requested),
-        'requested': sum(1 for c in cards if c.redemption_requested),
-        'stamps_today': StampTransaction.objects.filter(organization=request.tenant, created_at__date=today, action='ADD').count()
-    }
+    grouped_list = list(customer_groups.values())
+
+    # Estadísticas en una sola consulta agregada
+    today_start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    stats = cards.aggregate(
+        total_active=models.Count('pk', filter=models.Q(is_completed=False)),
+        completed=models.Count('pk', filter=models.Q(is_completed=True, redemption_requested=False)),
+        requested=models.Count('pk', filter=models.Q(redemption_requested=True)),
+    )
+    stats['stamps_today'] = StampTransaction.objects.filter(
+        organization=request.tenant, created_at__gte=today_start, action='ADD'
+    ).count()
 
     from .forms import StampAssignmentForm
     form = StampAssignmentForm(tenant=request.tenant)
 
     context = {
         'grouped_customers': grouped_list, 
+        'page_obj': page_obj,
         'title': 'Tarjetas de Clientes',
         'query': query,
         'stats': stats,
@@ -544,39 +664,10 @@ def add_stamp_customer(request, customer_id):
             quantity = 2
 
         with transaction.atomic():
-            # Buscar tarjeta activa que NO esté completada ni canjeada
-            card = StampCard.objects.filter(
-                customer=customer,
-                promotion=active_promo,
-                is_completed=False,
-                is_redeemed=False
-            ).first()
-            
-            # Si existe pero está expirada, la "cerramos" implícitamente creando una nueva
-            if card and card.is_expired:
-                card = None
-                
-            if not card:
-                card = StampCard.objects.create(
-                    customer=customer,
-                    promotion=active_promo,
-                    organization=request.tenant,
-                    current_stamps=0
-                )
-            
-            card.current_stamps += quantity
-            if card.current_stamps >= active_promo.total_stamps_needed:
-                card.is_completed = True
+            # Tarjeta abierta (o una nueva si no hay o venció); notificaciones al confirmar
+            card, created = grant_stamps(customer, active_promo, quantity, performed_by=request.user, organization=request.tenant)
+            if card.is_completed:
                 messages.success(request, f"¡Tarjeta completada para {customer.full_name}!")
-            
-            card.save()
-            StampTransaction.objects.create(
-                organization=request.tenant,
-                card=card,
-                action='ADD',
-                quantity=quantity,
-                performed_by=request.user
-            )
 
             # Log de auditoría
             log_action(
@@ -586,12 +677,6 @@ def add_stamp_customer(request, customer_id):
                 f"Sello(s) agregado(s): {quantity} - Promo: {card.promotion.name}",
                 customer=customer
             )
-            
-            # NOTIFICACIÓN AUTOMÁTICA (Email)
-            config = NotificationConfig.objects.filter(organization=request.tenant).first()
-            if config and config.email_enabled and customer.email:
-                msg = f"¡Hola {customer.first_name}! Has recibido {quantity} nuevo(s) sello(s). Tienes {card.current_stamps}/{card.promotion.total_stamps_needed}."
-                send_email_notification(config, customer.email, "Nuevo Sello Recibido 💈", msg)
 
             msg = f"Sello añadido correctamente."
             if quantity == 2:
@@ -662,10 +747,10 @@ def my_stamps(request):
             return redirect('customers:customer_login', slug=request.tenant.slug)
         return render(request, 'stamps/no_customer_profile.html')
         
-    cards = StampCard.objects.filter(customer=customer, is_redeemed=False).select_related('promotion').order_by('-current_stamps')
-    
-    # Filtrar expiradas
-    cards = [c for c in cards if not c.is_expired]
+    # Excluir expiradas en la consulta (expires_at persistido)
+    cards = list(StampCard.objects.filter(
+        StampCard.alive_q(), customer=customer, is_redeemed=False
+    ).select_related('promotion').order_by('-current_stamps'))
     
     # NUEVO: Buscar solicitudes pendientes
     pending_all = StampRequest.objects.filter(
@@ -831,6 +916,11 @@ def undo_transaction(request, pk):
                 if card.is_redeemed:
                     messages.error(request, "No se puede deshacer un sello de una tarjeta ya canjeada.")
                     return redirect('stamps:card_list')
+
+                # Reabrir una tarjeta completada no puede dejar dos abiertas para la misma promoción
+                if card.is_completed and open_cards(card.customer_id, card.promotion_id).exclude(pk=card.pk).exists():
+                    messages.error(request, "El cliente ya tiene otra tarjeta abierta en esta promoción.")
+                    return redirect('stamps:card_list')
                 
                 card.current_stamps = max(0, card.current_stamps - tx.quantity)
                 card.is_completed = False
@@ -1,5 +1,8 @@
 from django.db import models
 from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 class SystemAnnouncement(models.Model):
     """
@@ -82,14 +85,14 @@ class Plan(models.Model):
         
         # Sincronizar automáticamente todos los negocios suscritos a este plan
         # para que los cambios en límites o funcionalidades se apliquen de inmediato.
+        # (Upsert masivo por bloques; ver también `manage.py sync_plans`)
         try:
-            from apps.core.models import Organization
-            for org in self.organizations.all():
-                org.sync_with_plan()
-        except:
+            from apps.core.plan_sync import sync_plan
+            sync_plan(self)
+        except Exception:
             # Evitar que fallos en la sincronización bloqueen el guardado del plan
             # (Útil durante migraciones o instalaciones iniciales)
-            pass
+            logger.exception("Error sincronizando los negocios del plan %s", self.pk)
 
     class Meta:
         verbose_name = "Plan"
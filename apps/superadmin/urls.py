@@ -25,6 +25,8 @@ urlpatterns = [
     
     # Monitor y Uso
     path('usage/', views.usage_monitor, name='usage_monitor'),
+    path('performance/', views.performance_monitor, name='performance_monitor'),
+    path('providers/', views.provider_health, name='provider_health'),
     
     # Auditoría Global
     path('audit/', views.global_audit_list, name='global_audit'),
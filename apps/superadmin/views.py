@@ -9,6 +9,7 @@ from .models import SystemAnnouncement, Plan
 from .forms import OrganizationForm, SystemAnnouncementForm, PlanForm
 
 from apps.customers.models import Customer
+from apps.customers.search import search_customers
 
 def is_superuser(user):
     return user.is_superuser
@@ -25,13 +26,9 @@ def master_search(request):
     
     if len(query) >= 3:
         # Buscar Clientes
-        results['customers'] = Customer.objects.filter(
-            Q(first_name__icontains=query) | 
-            Q(last_name__icontains=query) |
-            Q(phone__icontains=query) |
-            Q(email__icontains=query) |
-            Q(dni__icontains=query)
-        ).select_related('organization')[:15]
+        results['customers'] = search_customers(
+            None, query, limit=15, queryset=Customer.objects.select_related('organization')
+        )
         
         # Buscar Usuarios (Staff/Dueños)
         results['users'] = User.objects.filter(
@@ -209,6 +206,83 @@ def usage_monitor(request):
         'title': 'Monitor de Consumo y Límites'
     })
 
+PERFORMANCE_ORDERINGS = {
+    'total_ms': 'Tiempo total',
+    'p95': 'Latencia p95',
+    'avg_queries': 'Consultas promedio',
+    'n_plus_one': 'Requests con N+1',
+    'requests': 'Requests',
+}
+
+@user_passes_test(is_superuser)
+def performance_monitor(request):
+    """Ranking de las vistas más costosas según RequestMetricsMiddleware"""
+    from datetime import timedelta
+    from django.conf import settings
+    from django.utils import timezone
+    from apps.core.decorators import etag_stats
+    from apps.core.metrics import flush_metrics, summarize
+    from apps.core.models import RequestMetric
+
+    # Incluir lo acumulado en memoria por este proceso
+    flush_metrics()
+
+    try:
+        hours = min(max(int(request.GET.get('hours', 24)), 1), 24 * 14)
+    except ValueError:
+        hours = 24
+    order = request.GET.get('order', 'total_ms')
+    if order not in PERFORMANCE_ORDERINGS:
+        order = 'total_ms'
+
+    rows = RequestMetric.objects.filter(period_start__gte=timezone.now() - timedelta(hours=hours))
+    views = sorted(summarize(rows), key=lambda item: item[order] or 0, reverse=True)
+
+    return render(request, 'superadmin/performance_monitor.html', {
+        'views': views,
+        'hours': hours,
+        'order': order,
+        'orderings': PERFORMANCE_ORDERINGS,
+        'metrics_enabled': settings.REQUEST_METRICS_ENABLED,
+        'n_plus_one_threshold': settings.REQUEST_METRICS_N_PLUS_ONE_THRESHOLD,
+        'etag_views': etag_stats(),
+        'title': 'Monitor de Rendimiento'
+    })
+
+@user_passes_test(is_superuser)
+def provider_health(request):
+    """Proveedores de envío (WhatsApp/SMTP) por negocio: latencia, errores y circuit breaker"""
+    from django.conf import settings
+    from apps.campaigns.health import is_unhealthy, summarize_health
+    from apps.campaigns.models import NotificationOutbox, ProviderHealth
+
+    show_all = request.GET.get('all') == '1'
+    providers = []
+    for row in ProviderHealth.objects.select_related('organization').order_by('organization__name', 'channel'):
+        item = summarize_health(row)
+        item['unhealthy'] = is_unhealthy(item)
+        if show_all or item['unhealthy']:
+            providers.append(item)
+
+    # Mensajes pendientes en la bandeja de salida por negocio y canal
+    pending = {
+        (row['organization_id'], row['channel']): row['n']
+        for row in NotificationOutbox.objects.filter(status='PENDING')
+        .values('organization_id', 'channel').annotate(n=Count('id'))
+    }
+    for item in providers:
+        item['pending'] = pending.get((item['row'].organization_id, item['row'].channel), 0)
+
+    return render(request, 'superadmin/provider_health.html', {
+        'providers': providers,
+        'show_all': show_all,
+        'circuit_threshold': settings.NOTIFICATION_CIRCUIT_THRESHOLD,
+        'circuit_error_rate': settings.NOTIFICATION_CIRCUIT_ERROR_RATE,
+        'health_error_rate': settings.NOTIFICATION_HEALTH_ERROR_RATE,
+        'slow_ms': settings.NOTIFICATION_HEALTH_SLOW_MS,
+        'title': 'Salud de Proveedores de Envío'
+    })
+
 @user_passes_test(is_superuser)
 def announcement_delete(request, pk):
     """Eliminar comunicado"""
@@ -1,9 +1,10 @@
 
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from apps.core.models import FieldTrackerMixin
 
 
-class User(AbstractUser):
+class User(FieldTrackerMixin, AbstractUser):
     """
     Usuario personalizado que puede pertenecer a una organización.
     """
@@ -46,16 +47,25 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    @property
+    def enabled_features(self):
+        """Snapshot de features de la organización (se carga una sola vez por request)"""
+        if not hasattr(self, '_enabled_features'):
+            from apps.core.cache import get_enabled_features
+            self._enabled_features = get_enabled_features(self.organization_id)
+        return self._enabled_features
+
     def has_feature(self, feature_key):
         """Verifica si la organización del usuario tiene habilitada una feature específica"""
         # El Superadmin siempre ve todo (Maestro)
         if self.is_superuser:
             return True
             
-        if not self.organization:
+        if not self.organization_id:
             return False
             
-        return self.organization.feature_flags.filter(feature_key=feature_key, is_enabled=True).exists()
+        return feature_key in self.enabled_features
+
     @property
     def has_feature_notifications(self):
         return self.has_feature('campaigns.auto_notifications')
@@ -1,6 +1,8 @@
 
 import os
 from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -53,6 +55,7 @@ INSTALLED_APPS = [
 ] + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'apps.core.middleware.RequestMetricsMiddleware', # Opcional: ver REQUEST_METRICS_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -113,6 +116,95 @@ if os.getenv('DB_ENGINE') == 'mysql':
         },
     }
 
+# Cachés de Django. 'default' es memoria local de cada proceso.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Caché compartida entre procesos de Passenger (opcional):
+# TENANT_CACHE_URL=redis://host:6379/1 (requiere el paquete redis) o
+# memcached://host:11211 (requiere pymemcache) define CACHES['tenant'].
+TENANT_CACHE_URL = os.getenv('TENANT_CACHE_URL', '')
+if TENANT_CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES['tenant'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': TENANT_CACHE_URL,
+    }
+elif TENANT_CACHE_URL.startswith('memcached://'):
+    CACHES['tenant'] = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': TENANT_CACHE_URL.removeprefix('memcached://'),
+    }
+elif TENANT_CACHE_URL:
+    raise ImproperlyConfigured('TENANT_CACHE_URL debe empezar con redis://, rediss:// o memcached://')
+
+# Caché de resolución de Tenants (dominio/slug -> organización)
+# TENANT_CACHE_BACKEND: alias de CACHES compartido (por defecto 'tenant' si hay
+# TENANT_CACHE_URL) para que todos los procesos vean las invalidaciones. Un
+# alias de memoria local (LocMemCache/DummyCache) se ignora con un warning de
+# `manage.py check`. Vacío = solo memoria local (cada proceso refresca al
+# vencer el TTL).
+TENANT_CACHE_BACKEND = os.getenv('TENANT_CACHE_BACKEND') or ('tenant' if 'tenant' in CACHES else None)
+TENANT_CACHE_TIMEOUT = int(os.getenv('TENANT_CACHE_TIMEOUT', '60'))
+# Sin TENANT_CACHE_BACKEND las versiones de cambios por tenant (invalidación
+# de cachés y ETags) se leen de la tabla TenantVersion y cada proceso las
+# reutiliza este tiempo: máximo retraso con el que ve cambios de otro proceso.
+TENANT_VERSION_REFRESH = float(os.getenv('TENANT_VERSION_REFRESH', '2'))  # segundos
+
+# Métricas por request (latencia, consultas SQL, N+1) para el reporte de
+# rendimiento del superadmin. Desactivado por defecto.
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'False') == 'True'
+REQUEST_METRICS_FLUSH_INTERVAL = int(os.getenv('REQUEST_METRICS_FLUSH_INTERVAL', '60'))  # segundos
+REQUEST_METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv('REQUEST_METRICS_N_PLUS_ONE_THRESHOLD', '10'))
+REQUEST_METRICS_RETENTION_DAYS = int(os.getenv('REQUEST_METRICS_RETENTION_DAYS', '14'))
+
+# Long-poll de solicitudes QR pendientes (badge del menú). Cada pestaña mantiene
+# un request abierto (y un worker ocupado) hasta que cambian las solicitudes del
+# negocio o vence el timeout. Por defecto 0 = polling clásico: los navegadores
+# vuelven a consultar cada STAMP_REQUESTS_POLL_INTERVAL segundos. Mientras
+# espera, el request revisa la versión compartida del negocio (TENANT_CACHE_BACKEND
+# o TenantVersion, una consulta cada TENANT_VERSION_REFRESH por proceso). Como
+# máximo STAMP_REQUESTS_LONGPOLL_MAX_WAITERS requests esperan por proceso; los
+# demás responden de inmediato.
+STAMP_REQUESTS_LONGPOLL_TIMEOUT = int(os.getenv('STAMP_REQUESTS_LONGPOLL_TIMEOUT', '0'))  # segundos
+STAMP_REQUESTS_LONGPOLL_MAX_WAITERS = int(os.getenv('STAMP_REQUESTS_LONGPOLL_MAX_WAITERS', '4'))
+STAMP_REQUESTS_POLL_INTERVAL = int(os.getenv('STAMP_REQUESTS_POLL_INTERVAL', '15'))  # segundos
+
+# Bandeja de salida de notificaciones (WhatsApp/Email). Los mensajes se
+# encolan en la transacción del evento y los envía el worker:
+#   python manage.py dispatch_notifications --loop   (o por cron cada minuto)
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('NOTIFICATION_MAX_ATTEMPTS', '6'))
+NOTIFICATION_RETRY_BASE = int(os.getenv('NOTIFICATION_RETRY_BASE', '60'))  # segundos, se duplica por intento
+NOTIFICATION_RETRY_MAX = int(os.getenv('NOTIFICATION_RETRY_MAX', '3600'))  # segundos
+NOTIFICATION_CLAIM_LEASE = int(os.getenv('NOTIFICATION_CLAIM_LEASE', '300'))  # segundos
+# Timeout de la conexión SMTP del worker (muy por debajo del lease)
+NOTIFICATION_SMTP_TIMEOUT = int(os.getenv('NOTIFICATION_SMTP_TIMEOUT', '20'))  # segundos
+# Envíos en paralelo por lote (threads) y límite por negocio y canal (token
+# bucket: mensajes/segundo y ráfaga). 0 = sin límite. El límite es por proceso.
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', '8'))
+NOTIFICATION_RATE_LIMIT = float(os.getenv('NOTIFICATION_RATE_LIMIT', '5'))
+NOTIFICATION_RATE_BURST = int(os.getenv('NOTIFICATION_RATE_BURST', '20'))
+# Circuit breaker por negocio y canal: tras THRESHOLD fallos consecutivos (o con
+# una tasa de error reciente >= ERROR_RATE) los envíos se difieren COOLDOWN
+# segundos sin intentarlos; luego un envío de prueba.
+# El monitor del superadmin marca como no saludables los proveedores con
+# circuito abierto, tasa de error reciente >= ERROR_RATE o p95 >= SLOW_MS.
+NOTIFICATION_HTTP_TIMEOUT = float(os.getenv('NOTIFICATION_HTTP_TIMEOUT', '10'))  # segundos
+NOTIFICATION_CIRCUIT_THRESHOLD = int(os.getenv('NOTIFICATION_CIRCUIT_THRESHOLD', '5'))
+NOTIFICATION_CIRCUIT_ERROR_RATE = float(os.getenv('NOTIFICATION_CIRCUIT_ERROR_RATE', '0.5'))
+NOTIFICATION_CIRCUIT_COOLDOWN = int(os.getenv('NOTIFICATION_CIRCUIT_COOLDOWN', '60'))  # segundos
+NOTIFICATION_CIRCUIT_PROBE_WAIT = int(os.getenv('NOTIFICATION_CIRCUIT_PROBE_WAIT', '5'))  # segundos
+NOTIFICATION_HEALTH_WINDOW = int(os.getenv('NOTIFICATION_HEALTH_WINDOW', '3600'))  # segundos
+NOTIFICATION_HEALTH_ERROR_RATE = float(os.getenv('NOTIFICATION_HEALTH_ERROR_RATE', '0.2'))
+NOTIFICATION_HEALTH_SLOW_MS = int(os.getenv('NOTIFICATION_HEALTH_SLOW_MS', '5000'))
+
+# Teléfonos de clientes: prefijo de país que se antepone a los números
+# nacionales de PHONE_NATIONAL_LENGTH dígitos al normalizar (vacío = solo dígitos)
+PHONE_COUNTRY_CODE = os.getenv('PHONE_COUNTRY_CODE', '51')
+PHONE_NATIONAL_LENGTH = int(os.getenv('PHONE_NATIONAL_LENGTH', '9'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 